@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, List, Optional
 
 class Settings(BaseSettings):
     MONGODB_URL: str = "mongodb://localhost:27017"
@@ -9,6 +9,167 @@ class Settings(BaseSettings):
     HOST: Optional[str] = "http://localhost"
     PORT: Optional[int] = 8000
 
+    # MongoDB connection pool
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 0
+    MONGO_MAX_IDLE_TIME_MS: Optional[int] = 60_000
+    MONGO_CONNECT_TIMEOUT_MS: int = 5_000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 5_000
+    MONGO_SOCKET_TIMEOUT_MS: Optional[int] = 30_000
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: Optional[int] = 10_000  # max wait for a free pooled connection
+    MONGO_READ_PREFERENCE: str = "primary"  # primary | primaryPreferred | secondary | secondaryPreferred | nearest
+
+    # Gemini HTTP connection pool
+    GEMINI_MAX_CONNECTIONS: int = 100
+    GEMINI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    GEMINI_KEEPALIVE_EXPIRY: float = 60.0  # seconds
+    GEMINI_TIMEOUT_MS: Optional[int] = 120_000
+    GEMINI_BASE_URL: Optional[str] = None  # point at a fake model server for testing
+
+    # Startup and health checks; model clients are otherwise created on the first model call
+    PREWARM_ENABLED: bool = False  # load the model SDK and open connections in the background at startup
+    HEALTH_CHECK_TIMEOUT: float = 2.0  # seconds
+
+    # Client-side rate limiting, retries and circuit breaking for model calls
+    MODEL_RATE_LIMITS: Dict[str, Dict[str, float]] = {}  # {"gemini-2.0-flash": {"rpm": 2000, "tpm": 4000000}}
+    DEFAULT_MODEL_RPM: float = 1000
+    DEFAULT_MODEL_TPM: float = 1_000_000
+    MODEL_RATE_FLOOR: float = 0.1  # lowest fraction of the limit a 429 can throttle down to
+    MODEL_MAX_RETRIES: int = 4
+    MODEL_RETRY_BASE_DELAY: float = 0.5  # seconds
+    MODEL_RETRY_MAX_DELAY: float = 20.0  # seconds
+    MODEL_RETRY_BUDGET_RATIO: float = 0.2  # retries allowed per successful call
+    CIRCUIT_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_RESET_TIMEOUT: float = 30.0  # seconds
+
+    # Observability: Prometheus /metrics, logging and optional OpenTelemetry tracing
+    METRICS_ENABLED: bool = True
+    MODEL_PRICES: Dict[str, Dict[str, float]] = {
+        # USD per million tokens; "cached" is the price of cached input tokens
+        "gemini-2.0-flash": {"input": 0.10, "output": 0.40, "cached": 0.025},
+        "gemini-2.0-flash-lite": {"input": 0.075, "output": 0.30, "cached": 0.01875},
+    }
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "text"  # text | json
+    TRACING_ENABLED: bool = False  # needs opentelemetry-sdk
+    TRACING_EXPORTER: str = "otlp"  # otlp (OTEL_EXPORTER_OTLP_* variables) | console
+    TRACING_SERVICE_NAME: str = "chatbot-api"
+
+    # Context assembly for chat replies (token counts are estimates, ~4 characters per token)
+    CONTEXT_TOKEN_BUDGET: int = 3000  # max input tokens per reply, prompts included
+    CONTEXT_PRODUCT_TOKEN_BUDGET: int = 1200
+    CONTEXT_MESSAGE_MAX_TOKENS: int = 400  # longer messages are truncated in the context
+    CONTEXT_HISTORY_WINDOW: int = 20  # most recent messages considered for the history
+    CONTEXT_SUMMARY_ENABLED: bool = True
+    CONTEXT_SUMMARY_MAX_TOKENS: int = 200
+    CONTEXT_SUMMARY_MIN_MESSAGES: int = 4  # unsummarized messages outside the history before a refresh
+
+    # Chat names, generated in the background after the first exchange
+    CHAT_NAME_ENABLED: bool = True
+    CHAT_NAME_MAX_TOKENS: int = 16
+    CHAT_NAME_PUSH_TIMEOUT: float = 5.0  # seconds the reply stream stays open for the name event
+
+    # Model-side context caching of each chat's system prompt (product information)
+    CONTEXT_CACHE_ENABLED: bool = True
+    CONTEXT_CACHE_TTL: int = 3600  # seconds
+    CONTEXT_CACHE_REFRESH_MARGIN: int = 120  # recreate this long before expiry
+    CONTEXT_CACHE_MIN_TOKENS: int = 4096  # explicit caching minimum on Gemini 2.x; smaller prompts are not sent
+    CONTEXT_CACHE_PRODUCT_TOKEN_BUDGET: int = 16000  # product text in a cached prompt, outside CONTEXT_TOKEN_BUDGET
+    CONTEXT_CACHE_RETRY_AFTER: int = 600  # seconds to stop trying after the API refuses to cache
+
+    # Ingredient knowledge base (synonyms, E-numbers, allergens); empty uses the bundled app/data/ingredients.json
+    INGREDIENT_INDEX_PATH: str = ""
+
+    # Answer questions about label fields (expiry date, origin, "does it contain X") without the model
+    ANSWER_RULES_ENABLED: bool = True
+
+    # Semantic answer cache for repeated questions about the same product
+    ANSWER_CACHE_ENABLED: bool = False
+    ANSWER_CACHE_THRESHOLD: float = 0.9  # cosine similarity between questions
+    ANSWER_CACHE_DIMENSIONS: int = 512  # hashed n-gram vector size
+    ANSWER_CACHE_MAX_ENTRIES: int = 20_000
+    ANSWER_CACHE_MAX_PER_PRODUCT: int = 64
+    ANSWER_CACHE_TTL: int = 7 * 24 * 3600  # seconds
+
+    # Extraction strategy: "parallel" sends two requests per image, "combined" one
+    EXTRACTION_MODE: str = "parallel"
+
+    # Vision backends for extraction, tried in routing order with failover to the next one
+    VISION_BACKENDS: List[str] = ["gemini"]  # gemini | openai | fake
+    VISION_ROUTING: str = "latency"  # latency | priority (the order of VISION_BACKENDS)
+    VISION_GEMINI_MODEL: str = "gemini-2.0-flash"
+    VISION_OPENAI_BASE_URL: str = "https://openrouter.ai/api/v1"  # any OpenAI-compatible server, e.g. vLLM
+    VISION_OPENAI_API_KEY: Optional[str] = None  # falls back to OPENROUTER_API_KEY
+    VISION_OPENAI_MODEL: str = "qwen/qwen2.5-vl-32b-instruct"
+    VISION_OPENAI_TIMEOUT: float = 120.0  # seconds
+    VISION_FAKE_LATENCY_MS: float = 200.0
+    VISION_LATENCY_ALPHA: float = 0.2  # weight of the newest call in the latency average
+    VISION_EXPLORE_RATIO: float = 0.05  # share of requests sent to a slower backend to refresh its latency
+
+    # Image preprocessing before upload to the model
+    IMAGE_PREPROCESS_ENABLED: bool = True
+    IMAGE_MAX_EDGE: int = 1600  # pixels
+    IMAGE_OUTPUT_FORMAT: str = "JPEG"  # JPEG | WEBP
+    IMAGE_QUALITY: int = 85
+    IMAGE_PROCESS_WORKERS: int = 2
+
+    # Local OCR pass that crops the ingredient panel before the ingredients call (needs pytesseract + tesseract)
+    OCR_ENABLED: bool = False
+    OCR_LANGUAGES: str = "eng+vie"  # tesseract language packs
+    OCR_TIMEOUT: int = 10  # seconds
+    OCR_CROP_PADDING: float = 0.03  # fraction of the image added around the panel
+    OCR_MAX_CROP_RATIO: float = 0.8  # bigger crops save too little to be worth it
+    OCR_LOCAL_EXTRACTION: bool = False  # skip the ingredients call when OCR is confident
+    OCR_MIN_CONFIDENCE: float = 85.0  # mean word confidence, 0-100
+
+    # Uploaded product photos, stored once per SHA-256 with resized renditions
+    UPLOAD_STORAGE_BACKEND: str = "local"  # local | s3
+    UPLOAD_DIR: str = "uploads"  # served by /api/extractor/uploads only, not the static mount
+    UPLOAD_MAX_BYTES: int = 20 * 1024 * 1024
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+    UPLOAD_THUMBNAIL_EDGE: int = 256  # pixels
+    UPLOAD_PREVIEW_EDGE: int = 1024  # pixels
+    UPLOAD_RENDITION_FORMAT: str = "WEBP"  # JPEG | WEBP
+    UPLOAD_RENDITION_QUALITY: int = 80
+    UPLOAD_PUBLIC_BASE_URL: Optional[str] = None  # serve uploads from a CDN or bucket URL instead of the API
+    UPLOAD_S3_BUCKET: str = "uploads"
+    UPLOAD_S3_ENDPOINT_URL: Optional[str] = None  # e.g. http://127.0.0.1:9000 for MinIO
+    UPLOAD_S3_REGION: Optional[str] = None
+    UPLOAD_S3_ACCESS_KEY: Optional[str] = None
+    UPLOAD_S3_SECRET_KEY: Optional[str] = None
+
+    # Asynchronous extraction jobs
+    JOB_WORKERS_ENABLED: bool = True
+    JOB_WORKERS: int = 4  # max concurrent jobs per API process
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BACKOFF: float = 5.0  # seconds, doubled per attempt
+    JOB_LEASE_SECONDS: int = 300
+    JOB_POLL_INTERVAL: float = 1.0  # seconds
+    JOB_MAX_QUEUED: int = 1000
+    JOB_MAX_IMAGE_BYTES: int = 15 * 1024 * 1024
+    JOB_RETENTION: int = 24 * 3600  # seconds to keep finished jobs
+
+    # Batch extraction
+    BATCH_CONCURRENCY: int = 8  # shared by all batch requests in a process
+    BATCH_MAX_ITEMS: int = 500
+    BATCH_MAX_IMAGE_BYTES: int = 20 * 1024 * 1024
+    BATCH_MAX_TOTAL_BYTES: int = 200 * 1024 * 1024  # all parts of one request, archives included
+
+    # Extraction cache
+    EXTRACTION_CACHE_BACKEND: str = "memory"  # memory | mongo | none
+    EXTRACTION_CACHE_MAX_SIZE: int = 1024
+    EXTRACTION_CACHE_TTL: int = 7 * 24 * 3600  # seconds
+    # Perceptual-hash fallback: only safe for re-encodes of one photo, distinct labels with the same layout collide
+    EXTRACTION_CACHE_PHASH: bool = False
+    EXTRACTION_CACHE_PHASH_DISTANCE: int = 2
+
+    # Translation cache, keyed by (string, target language)
+    TRANSLATION_CACHE_BACKEND: str = "tiered"  # tiered | memory | mongo | none
+    TRANSLATION_CACHE_MAX_SIZE: int = 200_000
+    TRANSLATION_MEMORY_CACHE_SIZE: int = 20_000
+    TRANSLATION_CACHE_TTL: int = 30 * 24 * 3600  # seconds
+    TRANSLATION_BATCH_SIZE: int = 200  # strings per model call
+
     class Config:
         env_file = ".env"
 
@@ -1,22 +1,45 @@
-from pymongo import MongoClient
+import logging
+from pymongo import AsyncMongoClient
 from .config import settings
+from .metrics import MongoCommandMetrics
+
+logger = logging.getLogger(__name__)
 
 class Database:
-    client: MongoClient = None
+    client: AsyncMongoClient = None
 
 db = Database()
 
 def get_database():
     return db.client[settings.DATABASE_NAME]
 
-def connect_to_mongo():
+def create_client() -> AsyncMongoClient:
+    return AsyncMongoClient(
+        settings.MONGODB_URL,
+        maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+        minPoolSize=settings.MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=settings.MONGO_MAX_IDLE_TIME_MS,
+        connectTimeoutMS=settings.MONGO_CONNECT_TIMEOUT_MS,
+        serverSelectionTimeoutMS=settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        socketTimeoutMS=settings.MONGO_SOCKET_TIMEOUT_MS,
+        waitQueueTimeoutMS=settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        readPreference=settings.MONGO_READ_PREFERENCE,
+        event_listeners=[MongoCommandMetrics()],
+    )
+
+async def connect_to_mongo():
     try:
-        db.client = MongoClient(settings.MONGODB_URL)
+        db.client = create_client()
         # Ping the server
-        db.client.admin.command('ping')
-        print("✅ Successfully connected to MongoDB!")
-        print(f"📦 Database: {settings.DATABASE_NAME}")
+        await db.client.admin.command('ping')
+        logger.info("Connected to MongoDB", extra={"database": settings.DATABASE_NAME, "pool_size": settings.MONGO_MAX_POOL_SIZE})
     except Exception as e:
-        print("❌ Failed to connect to MongoDB!")
-        print(f"Error: {str(e)}")
+        logger.error("Failed to connect to MongoDB: %s", e)
         raise e
+
+
+async def close_mongo_connection():
+    if db.client is not None:
+        await db.client.close()
+        db.client = None
+        logger.info("MongoDB connection closed")
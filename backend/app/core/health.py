@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from .config import settings
+from .database import db
+from .model_client import clients, prewarm_model_clients
+
+logger = logging.getLogger(__name__)
+
+
+class Startup:
+    # Taken when the app is imported, so startup time includes the app's own imports
+    started: float = time.monotonic()
+    ready_after: Optional[float] = None
+    prewarm_task: asyncio.Task = None
+    prewarm_error: Optional[str] = None
+
+
+startup = Startup()
+
+
+async def _prewarm():
+    try:
+        await prewarm_model_clients()
+        startup.prewarm_error = None
+    except Exception as e:
+        startup.prewarm_error = str(e)
+        logger.warning("Prewarming model clients failed: %s", e)
+
+
+async def start_prewarm():
+    # Runs in the background: the server accepts connections (and answers liveness) while it warms up
+    if settings.PREWARM_ENABLED and not clients.warm and (startup.prewarm_task is None or startup.prewarm_task.done()):
+        startup.prewarm_task = asyncio.create_task(_prewarm())
+
+
+async def stop_prewarm():
+    if startup.prewarm_task is not None:
+        startup.prewarm_task.cancel()
+
+
+async def check_mongo() -> str:
+    if db.client is None:
+        return "disconnected"
+    try:
+        await asyncio.wait_for(db.client.admin.command("ping"), settings.HEALTH_CHECK_TIMEOUT)
+        return "ok"
+    except Exception as e:
+        logger.warning("MongoDB readiness check failed: %s", e)
+        return "unavailable"
+
+
+def model_status() -> str:
+    if clients.warm:
+        return "warm"
+    if startup.prewarm_task is not None and not startup.prewarm_task.done():
+        return "warming"
+    if startup.prewarm_error is not None:
+        return "failed"
+    # Without prewarming the clients are created on the first model call
+    return "ready" if clients.gemini is not None else "lazy"
+
+
+async def readiness() -> Dict[str, Any]:
+    mongo = await check_mongo()
+    if settings.PREWARM_ENABLED and model_status() == "failed":
+        # Readiness probes are periodic, so each one retries a failed prewarm
+        await start_prewarm()
+    models = model_status()
+    ready = mongo == "ok" and (not settings.PREWARM_ENABLED or models == "warm")
+    if ready and startup.ready_after is None:
+        startup.ready_after = time.monotonic() - startup.started
+        logger.info("Ready", extra={"startup_seconds": round(startup.ready_after, 3)})
+    return {
+        "ready": ready,
+        "mongo": mongo,
+        "models": models,
+        "startupSeconds": startup.ready_after,
+        "uptimeSeconds": time.monotonic() - startup.started,
+    }
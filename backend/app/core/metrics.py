@@ -0,0 +1,142 @@
+import time
+from typing import Any, Dict
+
+from fastapi import Request
+from fastapi.responses import Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily
+from pymongo import monitoring
+
+from .config import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+MODEL_CALL_SECONDS = Histogram(
+    "model_call_duration_seconds",
+    "Model calls, including retries and rate-limit waits",
+    ["model", "operation", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+MODEL_FIRST_CHUNK_SECONDS = Histogram(
+    "model_stream_first_chunk_seconds",
+    "Time until a streamed model call yields its first chunk",
+    ["model", "operation"],
+    buckets=LATENCY_BUCKETS,
+)
+MODEL_CALL_ERRORS = Counter("model_call_errors_total", "Failed model call attempts", ["model", "operation", "status"])
+MODEL_TOKENS = Counter("model_tokens_total", "Tokens reported by the model API", ["model", "operation", "kind"])
+MODEL_COST = Counter("model_cost_usd_total", "Estimated model spend, from MODEL_PRICES", ["model", "operation"])
+MONGO_COMMAND_SECONDS = Histogram(
+    "mongo_command_duration_seconds",
+    "MongoDB commands as seen by the driver",
+    ["command", "collection", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "HTTP requests until the response starts",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+CHAT_ANSWERS = Counter("chat_answers_total", "Chat answers by where they came from", ["source"])
+
+
+def usage_tokens(response: Any) -> Dict[str, int]:
+    # Gemini responses carry usage_metadata; OpenAI-compatible ones a "usage" object
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        # Created caches report only total_token_count, which is what the cache stores
+        return {
+            "input": getattr(usage, "prompt_token_count", None) or getattr(usage, "total_token_count", None) or 0,
+            "output": getattr(usage, "candidates_token_count", None) or 0,
+            "cached": getattr(usage, "cached_content_token_count", None) or 0,
+        }
+    if isinstance(response, dict) and isinstance(response.get("usage"), dict):
+        usage = response["usage"]
+        return {"input": usage.get("prompt_tokens") or 0, "output": usage.get("completion_tokens") or 0, "cached": 0}
+    return {}
+
+
+def record_usage(model: str, operation: str, response: Any) -> Dict[str, int]:
+    tokens = usage_tokens(response)
+    if not tokens:
+        return tokens
+    for kind, count in tokens.items():
+        if count:
+            MODEL_TOKENS.labels(model, operation, kind).inc(count)
+    prices = settings.MODEL_PRICES.get(model)
+    if prices:
+        # Prices are per million tokens; cached input is billed at its own rate when one is given
+        uncached = tokens["input"] - tokens["cached"]
+        cost = uncached * prices.get("input", 0) + tokens["output"] * prices.get("output", 0)
+        cost += tokens["cached"] * prices.get("cached", prices.get("input", 0))
+        MODEL_COST.labels(model, operation).inc(cost / 1_000_000)
+    return tokens
+
+
+def record_model_call(model: str, operation: str, outcome: str, started: float):
+    MODEL_CALL_SECONDS.labels(model, operation, outcome).observe(time.perf_counter() - started)
+
+
+def record_model_error(model: str, operation: str, status: Any):
+    MODEL_CALL_ERRORS.labels(model, operation, str(status)).inc()
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    def __init__(self):
+        self._collections: Dict[Any, str] = {}
+
+    def started(self, event):
+        # Only the started event has the command document, and with it the collection name
+        collection = event.command.get(event.command_name)
+        self._collections[(event.connection_id, event.request_id)] = collection if isinstance(collection, str) else ""
+
+    def _observe(self, event, outcome: str):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMAND_SECONDS.labels(event.command_name, collection, outcome).observe(event.duration_micros / 1_000_000)
+
+    def succeeded(self, event):
+        self._observe(event, "success")
+
+    def failed(self, event):
+        self._observe(event, "failure")
+
+
+class CacheCollector:
+    # Reads the hit/miss counters the caches already keep, at scrape time
+    def __init__(self):
+        self.caches: Dict[str, Any] = {}
+
+    def collect(self):
+        hits = CounterMetricFamily("cache_hits", "Cache lookups that found an entry", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Cache lookups that found nothing", labels=["cache"])
+        evictions = CounterMetricFamily("cache_evictions", "Entries evicted to stay within the size limit", labels=["cache"])
+        for name, stats in self.caches.items():
+            hits.add_metric([name], stats.hits)
+            misses.add_metric([name], stats.misses)
+            evictions.add_metric([name], stats.evictions)
+        yield hits
+        yield misses
+        yield evictions
+
+
+cache_collector = CacheCollector()
+REGISTRY.register(cache_collector)
+
+
+def register_cache_stats(name: str, stats: Any):
+    cache_collector.caches[name] = stats
+
+
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # The route template, so /chats/{chat_id} is one series rather than one per chat
+    route = request.scope.get("route")
+    path = getattr(route, "path", "unmatched")
+    HTTP_REQUEST_SECONDS.labels(request.method, path, str(response.status_code)).observe(time.perf_counter() - started)
+    return response
+
+
+def metrics_response() -> Response:
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,118 @@
+import logging
+import sys
+from typing import TYPE_CHECKING, Optional
+import httpx
+from fastapi.concurrency import run_in_threadpool
+from .config import settings
+
+if TYPE_CHECKING:
+    from google import genai
+
+logger = logging.getLogger(__name__)
+
+GEMINI_DEFAULT_BASE_URL = "https://generativelanguage.googleapis.com/"
+
+class ModelClients:
+    gemini: "genai.Client" = None
+    # The Gemini client's connection pools; owned here because genai.Client has no close()
+    gemini_transport: httpx.HTTPTransport = None
+    gemini_async_transport: httpx.AsyncHTTPTransport = None
+    openai: httpx.AsyncClient = None
+    # Set once prewarm_model_clients() has opened connections to the model APIs
+    warm: bool = False
+
+clients = ModelClients()
+
+def get_gemini_client() -> "genai.Client":
+    # Fall back to lazy creation for scripts that don't run the app's startup hook
+    if clients.gemini is None:
+        connect_to_gemini()
+    return clients.gemini
+
+def get_openai_client() -> httpx.AsyncClient:
+    # Only created when an OpenAI-compatible vision backend is configured
+    if clients.openai is None:
+        clients.openai = httpx.AsyncClient(
+            base_url=settings.VISION_OPENAI_BASE_URL,
+            headers={"Authorization": f"Bearer {settings.VISION_OPENAI_API_KEY or settings.OPENROUTER_API_KEY}"},
+            timeout=settings.VISION_OPENAI_TIMEOUT,
+            limits=_http_limits(),
+        )
+    return clients.openai
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.GEMINI_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.GEMINI_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.GEMINI_KEEPALIVE_EXPIRY,
+    )
+
+def connect_to_gemini():
+    if clients.gemini is not None:
+        return
+    # The SDK takes about half a second to import, so it is loaded on first use rather than at startup
+    from google import genai
+    from google.genai import types
+
+    # The SDK builds its httpx clients on our transports, so prewarming and shutdown need no SDK internals
+    clients.gemini_transport = httpx.HTTPTransport(limits=_http_limits())
+    clients.gemini_async_transport = httpx.AsyncHTTPTransport(limits=_http_limits())
+    http_options = types.HttpOptions(
+        base_url=settings.GEMINI_BASE_URL,
+        timeout=settings.GEMINI_TIMEOUT_MS,
+        client_args={"transport": clients.gemini_transport},
+        async_client_args={"transport": clients.gemini_async_transport},
+    )
+    clients.gemini = genai.Client(api_key=settings.GEMINI_API_KEY, http_options=http_options)
+    logger.info("Gemini client ready", extra={"pool_size": settings.GEMINI_MAX_CONNECTIONS})
+
+def is_gemini_api_error(error: Exception) -> bool:
+    # Without importing the SDK: if it was never loaded, no error can have come from it
+    errors = sys.modules.get("google.genai.errors")
+    return errors is not None and isinstance(error, errors.APIError)
+
+async def _open_connection(client: httpx.AsyncClient, url: Optional[str] = None):
+    # Any response will do: it leaves a TCP/TLS connection in the pool for the first real request
+    try:
+        await client.get(url or "/")
+    except httpx.HTTPError as e:
+        logger.warning("Prewarming %s failed: %s", url or client.base_url, e)
+        raise
+
+async def _open_transport_connection(transport: httpx.AsyncHTTPTransport, url: str):
+    try:
+        response = await transport.handle_async_request(httpx.Request("GET", url))
+        # Drain the body so the connection goes back to the pool instead of being dropped
+        await response.aread()
+        await response.aclose()
+    except httpx.HTTPError as e:
+        logger.warning("Prewarming %s failed: %s", url, e)
+        raise
+
+async def prewarm_model_clients():
+    # Importing the SDK is CPU-bound, keep it off the event loop
+    await run_in_threadpool(connect_to_gemini)
+    await _open_transport_connection(clients.gemini_async_transport, settings.GEMINI_BASE_URL or GEMINI_DEFAULT_BASE_URL)
+    if "openai" in settings.VISION_BACKENDS:
+        await _open_connection(get_openai_client())
+    clients.warm = True
+    logger.info("Model clients prewarmed")
+
+async def close_gemini():
+    if clients.gemini is None:
+        return
+    transport, async_transport = clients.gemini_transport, clients.gemini_async_transport
+    clients.gemini = clients.gemini_transport = clients.gemini_async_transport = None
+    clients.warm = False
+    # genai.Client has no close(); release the pooled connections through the transports it was given
+    transport.close()
+    await async_transport.aclose()
+    logger.info("Gemini client closed")
+
+async def close_openai():
+    client = clients.openai
+    if client is None:
+        return
+    clients.openai = None
+    await client.aclose()
+    logger.info("OpenAI-compatible client closed")
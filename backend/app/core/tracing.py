@@ -0,0 +1,92 @@
+import logging
+from contextlib import nullcontext
+from typing import Any, Dict, Optional
+
+from fastapi import Request
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Tracing:
+    tracer: Any = None
+    provider: Any = None
+
+
+tracing = Tracing()
+
+
+def setup_tracing():
+    # OpenTelemetry is optional: without the SDK installed, spans are no-ops
+    if not settings.TRACING_ENABLED or tracing.tracer is not None:
+        return
+    try:
+        from opentelemetry import trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    except ImportError:
+        logger.warning("Tracing disabled: opentelemetry-sdk is not installed")
+        return
+
+    if settings.TRACING_EXPORTER == "console":
+        exporter = ConsoleSpanExporter()
+    else:
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            logger.warning("Tracing disabled: opentelemetry-exporter-otlp-proto-http is not installed")
+            return
+        # Endpoint and headers come from the standard OTEL_EXPORTER_OTLP_* variables
+        exporter = OTLPSpanExporter()
+
+    tracing.provider = TracerProvider(resource=Resource.create({"service.name": settings.TRACING_SERVICE_NAME}))
+    tracing.provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(tracing.provider)
+    tracing.tracer = trace.get_tracer("app")
+    logger.info("Tracing enabled", extra={"exporter": settings.TRACING_EXPORTER})
+
+
+def shutdown_tracing():
+    if tracing.provider is not None:
+        tracing.provider.shutdown()
+        tracing.provider = None
+        tracing.tracer = None
+
+
+def _attributes(attributes: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {key: value for key, value in (attributes or {}).items() if value is not None}
+
+
+def span(name: str, attributes: Optional[Dict[str, Any]] = None):
+    # Context manager yielding the span (or None), made current so nested spans and model calls link to it
+    if tracing.tracer is None:
+        return nullcontext(None)
+    return tracing.tracer.start_as_current_span(name, attributes=_attributes(attributes))
+
+
+def start_span(name: str, attributes: Optional[Dict[str, Any]] = None):
+    # For async generators: a span that is not made current, since a generator can resume in another context
+    if tracing.tracer is None:
+        return None
+    return tracing.tracer.start_span(name, attributes=_attributes(attributes))
+
+
+async def trace_requests(request: Request, call_next):
+    if tracing.tracer is None:
+        return await call_next(request)
+    from opentelemetry.trace import SpanKind
+
+    with tracing.tracer.start_as_current_span(
+        f"{request.method} {request.url.path}",
+        kind=SpanKind.SERVER,
+        attributes={"http.request.method": request.method, "url.path": request.url.path},
+    ) as current:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        if route is not None:
+            current.update_name(f"{request.method} {route.path}")
+            current.set_attribute("http.route", route.path)
+        current.set_attribute("http.response.status_code", response.status_code)
+        return response
@@ -20,6 +20,10 @@ class OtherInfoOutputFormat(BaseModel):
     nutritional_info: str
 
 
+class CombinedOutputFormat(IngredientsOutputFormat, OtherInfoOutputFormat):
+    pass
+
+
 class TranslateRequest(BaseModel):
     info: Dict[str, Any]
     language: str
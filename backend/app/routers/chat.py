@@ -1,18 +1,29 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import List, Literal, Optional
 from bson import ObjectId
 from datetime import datetime
 
 from app.models.chat import ChatCreate, ChatUpdate
 from app.core.database import get_database
-from app.services.gemini import generate_chat_name
+from app.services.chats import is_naming, list_chats, schedule_chat_naming
+from app.services.context_cache import delete_context_cache
+from app.services.gemini import prepare_context_cache
+from app.services.ingredients import analyze_ingredients, with_allergens
+from app.services.messages import (
+    append_messages,
+    delete_chat_messages,
+    get_first_messages,
+    list_messages,
+)
 
 router = APIRouter()
 
+CHAT_PAGE_SIZE = 50
+MESSAGE_PAGE_SIZE = 50
+
 @router.post("/chat", response_model=dict)
-def create_chat(chat: ChatCreate, db=Depends(get_database)):
+async def create_chat(chat: ChatCreate, db=Depends(get_database)):
     chat_dict = chat.model_dump()
-    print(chat_dict)
     chat_dict["userId"] = "user123"  # In a real app, this would come from authentication
     chat_dict["createdAt"] = datetime.now().replace(microsecond=0).isoformat()
     chat_dict["name"] = "New Chat" 
@@ -20,47 +31,80 @@ def create_chat(chat: ChatCreate, db=Depends(get_database)):
     if chat_dict.get("productInformation") == {}:
         raise HTTPException(status_code=400, detail="Product information is required")
     
- 
-    result = db.chats.insert_one(chat_dict)
+    # Messages live in their own collection, not inside the chat document
+    messages = chat_dict.pop("messages", [])
+    chat_dict["messageCount"] = 0
+    # Allergens are worked out once here instead of by the model on every question
+    chat_dict["ingredientAnalysis"] = analyze_ingredients(chat_dict["productInformation"])
+    result = await db.chats.insert_one(chat_dict)
     chat_dict["_id"] = str(result.inserted_id)
+    if messages:
+        await append_messages(db, chat_dict["_id"], messages)
+    chat_dict["messages"] = messages
+    prepare_context_cache(chat_dict["_id"], with_allergens(chat_dict["productInformation"], chat_dict["ingredientAnalysis"]))
     
     return {"status": "success", "data": chat_dict}
 
 
 @router.get("/chats", response_model=dict)
-def get_chats(db=Depends(get_database)):
-    chats = []
-    for chat in db.chats.find().sort("createdAt", -1):  # Changed to -1 for descending order (newest first)
-        chat["_id"] = str(chat["_id"])
-        chats.append(chat)
-    
-    return {"status": "success", "data": chats}
+async def get_chats(
+    view: Literal["summary", "full"] = Query("summary", description="summary: id, name, createdAt and status only"),
+    userId: Optional[str] = None,
+    before: Optional[str] = Query(None, description="nextCursor from the previous page"),
+    limit: int = Query(CHAT_PAGE_SIZE, ge=1, le=200),
+    db=Depends(get_database),
+):
+    # Newest first, paged by (createdAt, _id) so pages stay stable as chats are added
+    try:
+        page = await list_chats(db, view, userId, before, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {"status": "success", "data": page}
 
  
 @router.get("/chats/{chat_id}", response_model=dict)
-def get_chat(chat_id: str, db=Depends(get_database)):
-    chat = db.chats.find_one({"_id": ObjectId(chat_id)})
+async def get_chat(chat_id: str, db=Depends(get_database)):
+    chat = await db.chats.find_one({"_id": ObjectId(chat_id)}, {"messages": 0})
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
     
+    # Include the latest page of messages; older ones come from /chats/{chat_id}/messages
+    page = await list_messages(db, chat_id, None, MESSAGE_PAGE_SIZE)
     chat["_id"] = str(chat["_id"])
+    chat["messages"] = page["messages"]
+    chat["nextCursor"] = page["nextCursor"]
     return {"status": "success", "data": chat}
 
 
+@router.get("/chats/{chat_id}/messages", response_model=dict)
+async def get_chat_messages(
+    chat_id: str,
+    before: Optional[int] = Query(None, description="Return messages older than this sequence number"),
+    limit: int = Query(MESSAGE_PAGE_SIZE, ge=1, le=200),
+    db=Depends(get_database),
+):
+    if not await db.chats.find_one({"_id": ObjectId(chat_id)}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Chat not found")
+
+    return {"status": "success", "data": await list_messages(db, chat_id, before, limit)}
+
+
 @router.patch("/chats/{chat_id}/rename", response_model=dict)
-def rename_chat(chat_id: str, chat_update: ChatUpdate, db=Depends(get_database)):
+async def rename_chat(chat_id: str, chat_update: ChatUpdate, db=Depends(get_database)):
     if not chat_update.name:
         raise HTTPException(status_code=400, detail="New chat name is required")
     
     # Get the chat
-    chat = db.chats.find_one({"_id": ObjectId(chat_id)})
+    chat = await db.chats.find_one({"_id": ObjectId(chat_id)}, {"_id": 1})
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
     
     # Update the chat name
-    result = db.chats.update_one(
+    result = await db.chats.update_one(
         {"_id": ObjectId(chat_id)},
-        {"$set": {"name": chat_update.name}}
+        # A user's name is final, background naming won't replace it
+        {"$set": {"name": chat_update.name, "nameSource": "user"}}
     )
     
     if result.modified_count == 0:
@@ -70,43 +114,32 @@ def rename_chat(chat_id: str, chat_update: ChatUpdate, db=Depends(get_database))
 
 
 @router.delete("/chats/{chat_id}", response_model=dict)
-def delete_chat(chat_id: str, db=Depends(get_database)):
-    result = db.chats.delete_one({"_id": ObjectId(chat_id)})
-    if result.deleted_count == 0:
+async def delete_chat(chat_id: str, db=Depends(get_database)):
+    chat = await db.chats.find_one_and_delete({"_id": ObjectId(chat_id)}, projection={"contextCache": 1})
+    if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
+    await delete_chat_messages(db, chat_id)
+    await delete_context_cache(chat.get("contextCache"))
     
     return {"status": "success", "message": "Chat deleted successfully"}
 
 
 @router.get("/chats/{chat_id}/get-name", response_model=dict)
-def get_chat_name(chat_id: str, db=Depends(get_database)):
-    chat = db.chats.find_one({"_id": ObjectId(chat_id)})
+async def get_chat_name(chat_id: str, db=Depends(get_database)):
+    # Names are generated in the background after the first exchange; this only reads the stored one
+    chat = await db.chats.find_one({"_id": ObjectId(chat_id)}, {"name": 1, "nameSource": 1, "productInformation": 1})
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
-    
-    product_information = chat.get("productInformation")
-    
-    # Get the first user message and bot response
-    messages = chat.get("messages", [])
-    if len(messages) < 2:
-        raise HTTPException(status_code=400, detail="Need at least one user message and one bot response")
-    
-    first_user_message = None
-    first_bot_response = None
-    
-    for msg in messages:
-        if msg["sender"] == "user" and first_user_message is None:
-            first_user_message = msg["text"]
-        elif msg["sender"] == "bot" and first_bot_response is None:
-            first_bot_response = msg["text"]
-        
-        if first_user_message and first_bot_response:
-            break
-    
-    if not first_user_message or not first_bot_response:
-        raise HTTPException(status_code=400, detail="Could not find both user message and bot response")
-    
-    # Generate chat name using Gemini
-    chat_name = generate_chat_name(first_user_message, first_bot_response, product_information)
-    
-    return {"status": "success", "data": {"chatName": chat_name}}
\ No newline at end of file
+
+    pending = False
+    if not chat.get("nameSource"):
+        pending = is_naming(chat_id)
+        if not pending:
+            # Chats from before background naming: name them now from the first exchange
+            messages = await get_first_messages(db, chat_id, 2)
+            if [msg["sender"] for msg in messages] == ["user", "bot"]:
+                pending = schedule_chat_naming(
+                    db, chat_id, chat.get("productInformation", {}), messages[0]["text"], messages[1]["text"]
+                ) is not None
+
+    return {"status": "success", "data": {"chatName": chat.get("name"), "pending": pending}}
@@ -1,58 +1,84 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import Dict, Any
-from app.services.extractor import extract_image_info, translate_info
-from app.core.config import settings
-import os
-import uuid
-from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor
+from fastapi import APIRouter, UploadFile, File, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import Dict, Any, List, Optional
+import json
+from app.services.extractor import EXTRACTION_MODES
+from app.services.translation import translate_info, translation_cache_stats
+from app.services.pipeline import run_extraction
+from app.services.batch import BatchTooLargeError, expand_uploads, read_uploads, run_batch
+from app.services.cache import cache_stats
+from app.services.resilience import ModelUnavailableError
+from app.services.uploads import StorageUnavailableError, UploadTooLargeError, store_upload, upload_response
+from app.services.vision import vision_backend_stats, vision_registry
 from app.models.extractor import TranslateRequest
 
 router = APIRouter()
 
 @router.post("/extractor/extract", response_model=dict)
-async def extract_info(file: UploadFile = File(...)):
+async def extract_info(file: UploadFile = File(...), mode: Optional[str] = None, backend: Optional[str] = None):
     try:
         if not file.content_type.startswith('image/'):
             raise HTTPException(status_code=400, detail="File must be an image")
+        if mode is not None and mode not in EXTRACTION_MODES:
+            raise HTTPException(status_code=400, detail=f"Mode must be one of: {', '.join(EXTRACTION_MODES)}")
+        if backend is not None and backend not in vision_registry.backends:
+            raise HTTPException(status_code=400, detail=f"Backend must be one of: {', '.join(vision_registry.backends)}")
         
-        image = file.file.read()
-        
-        # Process both info types in parallel using ThreadPoolExecutor
-        with ThreadPoolExecutor() as executor:
-            # Submit both tasks
-            ingredients_future = executor.submit(extract_image_info, image, "ingredients")
-            other_info_future = executor.submit(extract_image_info, image, "other_info")
-            
-            # Get results
-            ingredients_result = ingredients_future.result()
-            other_info_result = other_info_future.result()
-            
-        # Combine results
-        combined_result = {
-            "Ingredients": ingredients_result["ingredients"],
-            "Product name": other_info_result["product_name"],
-            "Brand": other_info_result["brand"],
-            "Net content": other_info_result["net_content"],
-            "Manufacturing date": other_info_result["manufacturing_date"],
-            "Expiry date": other_info_result["expiry_date"],
-            "Country of origin": other_info_result["country_of_origin"],
-            "Manufacturer": other_info_result["manufacturer"],
-            "Usage instructions": other_info_result["usage_instructions"],
-            "Storage instructions": other_info_result["storage_instructions"],
-            "Nutritional info": other_info_result["nutritional_info"],
-        }
-        
-        return {"status": "success", "data": combined_result}
+        image = await file.read()
+
+        result, cached = await run_extraction(image, file.content_type, mode, backend)
+        return {"status": "success", "data": result, "cached": cached}
+    except (HTTPException, ModelUnavailableError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/extractor/batch")
+async def extract_batch(files: List[UploadFile] = File(...), mode: Optional[str] = None, backend: Optional[str] = None):
+    if mode is not None and mode not in EXTRACTION_MODES:
+        raise HTTPException(status_code=400, detail=f"Mode must be one of: {', '.join(EXTRACTION_MODES)}")
+    if backend is not None and backend not in vision_registry.backends:
+        raise HTTPException(status_code=400, detail=f"Backend must be one of: {', '.join(vision_registry.backends)}")
+
+    try:
+        uploads = await read_uploads(files)
+        items = await run_in_threadpool(expand_uploads, uploads)
+    except BatchTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not read archive: {str(e)}")
+
+    async def lines():
+        async for result in run_batch(items, mode, backend):
+            yield json.dumps(result, ensure_ascii=False, default=str) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.get("/extractor/cache/stats", response_model=dict)
+async def get_extraction_cache_stats():
+    return {"status": "success", "data": await cache_stats()}
+
+
+@router.get("/extractor/backends", response_model=dict)
+def get_vision_backends():
+    return {"status": "success", "data": vision_backend_stats()}
+
+
+@router.get("/extractor/translate/cache/stats", response_model=dict)
+def get_translation_cache_stats():
+    return {"status": "success", "data": translation_cache_stats()}
+
+
 @router.post("/extractor/translate")
 async def translate_extracted_info(request: TranslateRequest):
     try:
-        translated_info = translate_info(request.info, request.language)
+        translated_info = await translate_info(request.info, request.language)
         return {"status": "success", "data": translated_info}
+    except ModelUnavailableError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -62,21 +88,28 @@ async def translate_extracted_info(request: TranslateRequest):
 async def upload_image(file: UploadFile = File(...)):
     if not file.content_type.startswith('image/'):
         raise HTTPException(status_code=400, detail="File must be an image")
-    
-    image = file.file.read()
-
-    # Generate unique filename
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    unique_id = str(uuid.uuid4())[:8]
-    file_extension = os.path.splitext(file.filename)[1]
-    filename = f"{timestamp}_{unique_id}{file_extension}"
-    
-    # Save file to static/uploads directory
-    upload_path = os.path.join("static", "uploads", filename)
-    with open(upload_path, "wb") as f:
-        f.write(image)
-    
-    # Generate static URL for the file
-    static_url = f"{settings.HOST}:{settings.PORT}/static/uploads/{filename}"
-    return {"status": "success", "data": static_url}
 
+    try:
+        upload = await store_upload(file)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except StorageUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    # "data" stays the original's URL; the UI shows the smaller renditions when there are any
+    return {
+        "status": "success",
+        "data": upload["url"],
+        "renditions": upload["renditions"],
+        "sha256": upload["sha256"],
+        "size": upload["size"],
+        "deduplicated": upload["deduplicated"],
+    }
+
+
+@router.get("/extractor/uploads/{key:path}")
+async def get_upload(key: str, if_none_match: Optional[str] = Header(None)):
+    try:
+        return await upload_response(key, if_none_match)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload not found")
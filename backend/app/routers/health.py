@@ -0,0 +1,18 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.core.health import readiness
+
+router = APIRouter()
+
+
+@router.get("/health/live", response_model=dict)
+def live():
+    # The process is up and serving; says nothing about its dependencies
+    return {"status": "success"}
+
+
+@router.get("/health/ready")
+async def ready():
+    data = await readiness()
+    return JSONResponse(status_code=200 if data["ready"] else 503, content={"status": "success", "data": data})
@@ -0,0 +1,63 @@
+from fastapi import APIRouter, UploadFile, File, HTTPException
+from typing import Optional
+import asyncio
+
+from app.core.config import settings
+from app.core.sse import format_sse, sse_response
+from app.services.extractor import EXTRACTION_MODES
+from app.services.jobs import FINISHED_STATUSES, QueueFullError, enqueue_job, get_job
+from app.services.vision import vision_registry
+
+router = APIRouter()
+
+
+@router.post("/extractor/jobs", response_model=dict, status_code=202)
+async def create_extraction_job(file: UploadFile = File(...), mode: Optional[str] = None, backend: Optional[str] = None):
+    if not file.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    if mode is not None and mode not in EXTRACTION_MODES:
+        raise HTTPException(status_code=400, detail=f"Mode must be one of: {', '.join(EXTRACTION_MODES)}")
+    if backend is not None and backend not in vision_registry.backends:
+        raise HTTPException(status_code=400, detail=f"Backend must be one of: {', '.join(vision_registry.backends)}")
+
+    image = await file.read()
+    if len(image) > settings.JOB_MAX_IMAGE_BYTES:
+        raise HTTPException(status_code=413, detail="Image is too large")
+
+    try:
+        job = await enqueue_job(image, file.content_type, mode, backend)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(settings.JOB_RETRY_BACKOFF))})
+
+    return {"status": "success", "data": job}
+
+
+@router.get("/extractor/jobs/{job_id}", response_model=dict)
+async def get_extraction_job(job_id: str):
+    job = await get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"status": "success", "data": job}
+
+
+@router.get("/extractor/jobs/{job_id}/events")
+async def subscribe_extraction_job(job_id: str):
+    job = await get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        current = job
+        last_status = None
+        while True:
+            if current["status"] != last_status:
+                last_status = current["status"]
+                yield format_sse("status", current)
+            if current["status"] in FINISHED_STATUSES:
+                break
+            await asyncio.sleep(settings.JOB_POLL_INTERVAL)
+            current = await get_job(job_id)
+            if current is None:
+                break
+
+    return sse_response(events())
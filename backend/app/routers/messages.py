@@ -1,101 +1,221 @@
+import logging
 from fastapi import APIRouter, HTTPException, Depends
-from typing import Dict
+from typing import Any, Dict, Optional
 from bson import ObjectId
-from datetime import datetime, timezone
+import asyncio
 
+from app.core.config import settings
 from app.core.database import get_database
-from app.services.gemini import generate_response
+from app.core.metrics import CHAT_ANSWERS
+from app.core.sse import format_sse, sse_response
+from app.services.answer_cache import answer_cache_stats, find_cached_answer, store_answer
+from app.services.chats import schedule_chat_naming
+from app.services.context import ChatContext, build_context, schedule_summary_refresh
+from app.services.gemini import RESPONSE_PROMPT_TOKENS, cacheable_product_text, generate_response, stream_response
+from app.services.ingredients import with_allergens
+from app.services.messages import append_messages, delete_last_messages, get_recent_messages, new_message
+from app.services.rules import answer_question
 from app.models.chat import SentMessage
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
+# Keep references to generation tasks so they outlive a disconnected client
+_generation_tasks = set()
+
+
+async def _get_chat(db, chat_id: str) -> Dict[str, Any]:
+    # Only the product data, the running summary and the context cache handle are needed to answer
+    projection = {
+        "productInformation": 1, "ingredientAnalysis": 1, "contextSummary": 1, "contextCache": 1, "nameSource": 1, "messageCount": 1,
+    }
+    chat = await db.chats.find_one({"_id": ObjectId(chat_id)}, projection)
+    if not chat:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    return chat
+
+
+async def _load_context(db, chat: Dict[str, Any], content: str, skip_last: int = 0) -> ChatContext:
+    chat_id = str(chat["_id"])
+    history_messages = await get_recent_messages(db, chat_id, settings.CONTEXT_HISTORY_WINDOW + skip_last)
+    if skip_last:
+        history_messages = history_messages[:-skip_last]
+
+    summary = chat.get("contextSummary")
+    product_information = with_allergens(chat.get("productInformation", {}), chat.get("ingredientAnalysis"))
+    context = build_context(
+        content, history_messages, product_information, summary, RESPONSE_PROMPT_TOKENS,
+        cacheable_product_text(product_information),
+    )
+    context.chat_id = chat_id
+    context.cache = chat.get("contextCache")
+    schedule_summary_refresh(db, chat_id, summary, context)
+    return context
+
+
+def _schedule_naming(db, chat: Dict[str, Any], user_message: Dict[str, Any], bot_message: Dict[str, Any]) -> Optional[asyncio.Task]:
+    # The first exchange names the chat, unless the user already renamed it
+    if user_message.get("seq") != 1 or chat.get("nameSource"):
+        return None
+    return schedule_chat_naming(
+        db, str(chat["_id"]), chat.get("productInformation", {}), user_message["text"], bot_message["text"]
+    )
+
+
+def _is_standalone(chat: Dict[str, Any], skip_last: int = 0) -> bool:
+    # Only a chat's opening question is answered without context; a cached answer to a follow-up
+    # ("is it suitable for my son?") would carry one user's conversation into another's chat
+    return (chat.get("messageCount") or 0) <= skip_last and not chat.get("contextSummary")
+
+
+def _store_answer(chat: Dict[str, Any], content: str, answer: str, skip_last: int = 0):
+    if _is_standalone(chat, skip_last):
+        store_answer(chat.get("productInformation", {}), content, answer)
+
+
+def _fast_answer(chat: Dict[str, Any], content: str) -> Optional[Dict[str, Any]]:
+    # Answers that don't need a model call; None falls through to Gemini
+    if settings.ANSWER_RULES_ENABLED:
+        answered = answer_question(chat.get("productInformation", {}), content, chat.get("ingredientAnalysis"))
+        if answered:
+            answer, intent = answered
+            CHAT_ANSWERS.labels("rule").inc()
+            return {"content": answer, "cached": False, "rule": intent, "inputTokens": 0}
+
+    cached = find_cached_answer(chat.get("productInformation", {}), content) if _is_standalone(chat) else None
+    if cached:
+        answer, similarity = cached
+        CHAT_ANSWERS.labels("cache").inc()
+        return {"content": answer, "cached": True, "similarity": round(similarity, 4), "inputTokens": 0}
+    return None
+
 
 @router.post("/messages/send", response_model=dict)
-def send_message(message: SentMessage, db=Depends(get_database)):
+async def send_message(message: SentMessage, db=Depends(get_database)):
     chat_id = message.chat_id
     content = message.content
-    
+
     if content == "":
         raise HTTPException(status_code=400, detail="Content is required")
 
     # Get the chat
-    chat = db.chats.find_one({"_id": ObjectId(chat_id)})
-    if not chat:
-        raise HTTPException(status_code=404, detail="Chat not found")
-    
-    history_messages = chat["messages"]
-    product_information = chat["productInformation"]
-    bot_response = generate_response(content, history_messages, product_information)
-
-    # Add user message
-    user_message = {
-        "sender": "user",
-        "text": content,
-        "timestamp": datetime.now(timezone.utc)
-    }
+    chat = await _get_chat(db, chat_id)
+    user_message = new_message("user", content)
 
-    # Add bot message
-    bot_message = {
-        "sender": "bot",
-        "text": bot_response,
-        "timestamp": datetime.now(timezone.utc)
-    }
+    data = _fast_answer(chat, content)
+    if data is None:
+        context = await _load_context(db, chat, content)
+        bot_response = await generate_response(context)
+        CHAT_ANSWERS.labels("model").inc()
+        _store_answer(chat, content, bot_response)
+        data = {"content": bot_response, "cached": False, "inputTokens": context.tokens}
+    bot_message = new_message("bot", data["content"])
 
-    # Update chat with new messages
-    db.chats.update_one(
-        {"_id": ObjectId(chat_id)},
-        {"$push": {"messages": {"$each": [user_message, bot_message]}}}
-    )
+    # Append the new messages to the chat
+    await append_messages(db, chat_id, [user_message, bot_message])
+    _schedule_naming(db, chat, user_message, bot_message)
 
     return {
         "status": "success",
-        "data": {
-            "content": bot_response
-        }
+        "data": data
     }
 
 
+@router.post("/messages/send/stream")
+async def send_message_stream(message: SentMessage, db=Depends(get_database)):
+    chat_id = message.chat_id
+    content = message.content
+
+    if content == "":
+        raise HTTPException(status_code=400, detail="Content is required")
+
+    chat = await _get_chat(db, chat_id)
+    fast_answer = _fast_answer(chat, content)
+    context = None if fast_answer else await _load_context(db, chat, content)
+
+    user_message = new_message("user", content)
+    queue: asyncio.Queue = asyncio.Queue()
+
+    # Generation runs in its own task so the reply is still saved if the client goes away
+    async def generate():
+        try:
+            if fast_answer:
+                data = fast_answer
+                queue.put_nowait(format_sse("token", {"content": data["content"]}))
+            else:
+                chunks = []
+                async for chunk in stream_response(context):
+                    chunks.append(chunk)
+                    queue.put_nowait(format_sse("token", {"content": chunk}))
+                bot_response = "".join(chunks).strip()
+                CHAT_ANSWERS.labels("model").inc()
+                _store_answer(chat, content, bot_response)
+                data = {"content": bot_response, "cached": False, "inputTokens": context.tokens}
+
+            bot_message = new_message("bot", data["content"])
+            await append_messages(db, chat_id, [user_message, bot_message])
+            queue.put_nowait(format_sse("done", data))
+
+            # Hold the stream open briefly so the client gets the chat's new name without polling
+            naming = _schedule_naming(db, chat, user_message, bot_message)
+            if naming is not None:
+                try:
+                    name = await asyncio.wait_for(asyncio.shield(naming), settings.CHAT_NAME_PUSH_TIMEOUT)
+                except asyncio.TimeoutError:
+                    name = None
+                if name:
+                    queue.put_nowait(format_sse("name", {"chatName": name}))
+        except Exception as e:
+            logger.error("Streaming response failed: %s", e, extra={"chat_id": chat_id})
+            queue.put_nowait(format_sse("error", {"detail": str(e)}))
+        finally:
+            queue.put_nowait(None)
+
+    task = asyncio.create_task(generate())
+    _generation_tasks.add(task)
+    task.add_done_callback(_generation_tasks.discard)
+
+    async def events():
+        while True:
+            event = await queue.get()
+            if event is None:
+                break
+            yield event
+
+    return sse_response(events())
+
+
 @router.post("/messages/resend", response_model=dict)
-def resend_message(message: SentMessage, db=Depends(get_database)):
+async def resend_message(message: SentMessage, db=Depends(get_database)):
     chat_id = message.chat_id
     content = message.content
 
-    # Get chat history
-    chat = db.chats.find_one({"_id": ObjectId(chat_id)})
-    if not chat:
-        raise HTTPException(status_code=404, detail="Chat not found")
-    
-    # Remove two last messages in chat history in chat history
-
-    # Get chat history
-    history_messages = chat["messages"][:-2]
-    product_information = chat["productInformation"]
-
-    # Generate new bot response
-    bot_response = generate_response(content, history_messages, product_information)
-    bot_message = {
-        "sender": "bot",
-        "text": bot_response,
-        "timestamp": datetime.now(timezone.utc)
-    }
+    # Get chat history without the exchange being replaced
+    chat = await _get_chat(db, chat_id)
+    context = await _load_context(db, chat, content, 2)
+
+    # Generate new bot response; the user asked for a new answer, so it also replaces any cached one
+    bot_response = await generate_response(context)
+    CHAT_ANSWERS.labels("model").inc()
+    _store_answer(chat, content, bot_response, skip_last=2)
+    bot_message = new_message("bot", bot_response)
+    user_message = new_message("user", message.content)
+
+    # Replace the last exchange with the new one
+    await delete_last_messages(db, chat_id, 2)
+    await append_messages(db, chat_id, [user_message, bot_message])
 
-    user_message = {
-        "sender": "user",
-        "text": message.content,
-        "timestamp": datetime.now(timezone.utc)
-    }
-    history_messages.append(user_message)
-    history_messages.append(bot_message)
-    
-    # Update chat with new bot message
-    db.chats.update_one(
-        {"_id": ObjectId(chat_id)},
-        {"$set": {"messages": history_messages}}
-    )
-    
     return {
         "status": "success",
         "data": {
-            "content": bot_response
+            "content": bot_response,
+            "cached": False,
+            "inputTokens": context.tokens
         }
-    } 
\ No newline at end of file
+    }
+
+
+@router.get("/messages/answer-cache/stats", response_model=dict)
+def get_answer_cache_stats():
+    return {"status": "success", "data": answer_cache_stats()}
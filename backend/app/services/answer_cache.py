@@ -0,0 +1,174 @@
+import hashlib
+import json
+import re
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import register_cache_stats
+from app.services.cache import CacheStats
+
+WORD_PATTERN = re.compile(r"\w+")
+NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+def product_fingerprint(product_information: Dict[str, Any]) -> str:
+    text = json.dumps(product_information or {}, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def normalize_question(question: str) -> str:
+    text = unicodedata.normalize("NFC", question).casefold()
+    return " ".join(WORD_PATTERN.findall(text))
+
+
+def _bucket(fingerprint: str, question: str) -> str:
+    # "under 3" and "under 5" are near-identical vectors with different answers, so numbers must match exactly
+    return f"{fingerprint}:{','.join(NUMBER_PATTERN.findall(question))}"
+
+
+def _features(text: str) -> List[str]:
+    # Whole words plus character trigrams, so small typos and word order changes still match
+    words = text.split()
+    features = [f"w:{word}" for word in words]
+    for word in words:
+        padded = f" {word} "
+        features.extend(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+    return features
+
+
+def embed_question(question: str, dims: int) -> np.ndarray:
+    # Signed feature hashing; crc32 is stable across processes, unlike hash()
+    vector = np.zeros(dims, dtype=np.float32)
+    for feature in _features(normalize_question(question)):
+        digest = zlib.crc32(feature.encode("utf-8"))
+        vector[digest % dims] += 1.0 if digest & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class ProductAnswers:
+    def __init__(self):
+        self.vectors: List[np.ndarray] = []
+        self.answers: List[Tuple[str, str, float]] = []  # (question, answer, expires_at)
+        self._matrix: Optional[np.ndarray] = None
+
+    def matrix(self) -> np.ndarray:
+        if self._matrix is None or len(self._matrix) != len(self.vectors):
+            self._matrix = np.vstack(self.vectors)
+        return self._matrix
+
+    def nearest(self, vector: np.ndarray) -> Tuple[int, float]:
+        scores = self.matrix() @ vector
+        index = int(np.argmax(scores))
+        return index, float(scores[index])
+
+    def add(self, vector: np.ndarray, question: str, answer: str, expires_at: float):
+        self.vectors.append(vector)
+        self.answers.append((question, answer, expires_at))
+
+    def replace(self, index: int, question: str, answer: str, expires_at: float):
+        self.answers[index] = (question, answer, expires_at)
+
+    def drop_oldest(self):
+        self.vectors.pop(0)
+        self.answers.pop(0)
+        self._matrix = None
+
+    def __len__(self):
+        return len(self.vectors)
+
+
+class AnswerCache:
+    def __init__(self, threshold: float, dims: int, max_entries: int, max_per_product: int, ttl: int):
+        self.threshold = threshold
+        self.dims = dims
+        self.max_entries = max_entries
+        self.max_per_product = max_per_product
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self.size = 0
+        # product fingerprint and question numbers -> answers, least recently used first
+        self._products: "OrderedDict[str, ProductAnswers]" = OrderedDict()
+
+    def lookup(self, fingerprint: str, question: str) -> Optional[Tuple[str, float]]:
+        fingerprint = _bucket(fingerprint, question)
+        product = self._products.get(fingerprint)
+        found = None
+        if product:
+            index, similarity = product.nearest(embed_question(question, self.dims))
+            _, answer, expires_at = product.answers[index]
+            if similarity >= self.threshold and expires_at > time.monotonic():
+                self._products.move_to_end(fingerprint)
+                found = (answer, similarity)
+        self.stats.record(found is not None)
+        return found
+
+    def store(self, fingerprint: str, question: str, answer: str):
+        vector = embed_question(question, self.dims)
+        if not vector.any():
+            return
+        expires_at = time.monotonic() + self.ttl
+        fingerprint = _bucket(fingerprint, question)
+        product = self._products.setdefault(fingerprint, ProductAnswers())
+        self._products.move_to_end(fingerprint)
+
+        if len(product):
+            index, similarity = product.nearest(vector)
+            if similarity >= self.threshold:
+                # Same question again: keep one entry with the freshest answer
+                product.replace(index, question, answer, expires_at)
+                return
+
+        product.add(vector, question, answer, expires_at)
+        self.size += 1
+        if len(product) > self.max_per_product:
+            product.drop_oldest()
+            self._evicted(1)
+        while self.size > self.max_entries and self._products:
+            _, oldest = self._products.popitem(last=False)
+            self._evicted(len(oldest))
+
+    def _evicted(self, count: int):
+        self.size -= count
+        self.stats.evictions += count
+
+    def clear(self):
+        self._products.clear()
+        self.size = 0
+
+
+answer_cache = AnswerCache(
+    settings.ANSWER_CACHE_THRESHOLD,
+    settings.ANSWER_CACHE_DIMENSIONS,
+    settings.ANSWER_CACHE_MAX_ENTRIES,
+    settings.ANSWER_CACHE_MAX_PER_PRODUCT,
+    settings.ANSWER_CACHE_TTL,
+)
+register_cache_stats("answer", answer_cache.stats)
+
+
+def find_cached_answer(product_information: Dict[str, Any], question: str) -> Optional[Tuple[str, float]]:
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+    return answer_cache.lookup(product_fingerprint(product_information), question)
+
+
+def store_answer(product_information: Dict[str, Any], question: str, answer: str):
+    if settings.ANSWER_CACHE_ENABLED and answer:
+        answer_cache.store(product_fingerprint(product_information), question, answer)
+
+
+def answer_cache_stats() -> Dict[str, Any]:
+    return {
+        "enabled": settings.ANSWER_CACHE_ENABLED,
+        "size": answer_cache.size,
+        "buckets": len(answer_cache._products),
+        "threshold": answer_cache.threshold,
+        **answer_cache.stats.as_dict(),
+    }
@@ -0,0 +1,164 @@
+import asyncio
+import io
+import mimetypes
+import os
+import tarfile
+import threading
+import zipfile
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from fastapi import UploadFile
+
+from app.core.config import settings
+from app.services.pipeline import run_extraction
+
+ARCHIVE_CONTENT_TYPES = {
+    "application/zip",
+    "application/x-zip-compressed",
+    "application/x-tar",
+    "application/gzip",
+    "application/x-gzip",
+    "application/x-compressed-tar",
+}
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz")
+
+BatchUpload = Tuple[str, bytes, Optional[str]]
+# (filename, read, content type): archive members are only decompressed when their turn comes
+BatchItem = Tuple[str, Callable[[], bytes], Optional[str]]
+
+
+class BatchTooLargeError(Exception):
+    pass
+
+
+class Batch:
+    # Shared by every batch request so concurrent batches can't multiply model load
+    slots: Optional[asyncio.Semaphore] = None
+
+
+batch = Batch()
+
+
+def _slots() -> asyncio.Semaphore:
+    if batch.slots is None:
+        batch.slots = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+    return batch.slots
+
+
+def is_archive(filename: str, content_type: Optional[str]) -> bool:
+    return content_type in ARCHIVE_CONTENT_TYPES or filename.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def _is_image_name(name: str) -> bool:
+    basename = os.path.basename(name)
+    if basename.startswith(".") or "__MACOSX" in name:
+        return False
+    content_type, _ = mimetypes.guess_type(basename)
+    return bool(content_type and content_type.startswith("image/"))
+
+
+def _archive_members(filename: str, data: bytes) -> List[BatchItem]:
+    # The archive stays open for the items' readers; one lock per archive, as they share its file object
+    lock = threading.Lock()
+    members = []
+    if zipfile.is_zipfile(io.BytesIO(data)):
+        archive = zipfile.ZipFile(io.BytesIO(data))
+        for info in archive.infolist():
+            if not info.is_dir() and _is_image_name(info.filename):
+                members.append((info.filename, info.file_size, lambda info=info: archive.read(info)))
+    else:
+        archive = tarfile.open(fileobj=io.BytesIO(data), mode="r:*")
+        for info in archive.getmembers():
+            if info.isfile() and _is_image_name(info.name):
+                members.append((info.name, info.size, lambda info=info: archive.extractfile(info).read()))
+
+    items = []
+    for name, size, read in members:
+        if len(items) >= settings.BATCH_MAX_ITEMS:
+            raise BatchTooLargeError(f"Batch is limited to {settings.BATCH_MAX_ITEMS} images")
+        if size > settings.BATCH_MAX_IMAGE_BYTES:
+            raise BatchTooLargeError(f"{filename}:{name} is larger than {settings.BATCH_MAX_IMAGE_BYTES} bytes")
+        items.append((f"{filename}:{name}", _locked(lock, read), mimetypes.guess_type(name)[0]))
+    return items
+
+
+def _locked(lock: threading.Lock, read: Callable[[], bytes]) -> Callable[[], bytes]:
+    def locked_read() -> bytes:
+        with lock:
+            return read()
+    return locked_read
+
+
+async def read_uploads(files: List[UploadFile]) -> List[BatchUpload]:
+    # Parts are read in chunks so an oversized one is refused before it is held in memory
+    uploads = []
+    total = 0
+    for i, file in enumerate(files):
+        filename = file.filename or f"file-{i}"
+        limit = None if is_archive(filename, file.content_type) else settings.BATCH_MAX_IMAGE_BYTES
+        chunks = []
+        size = 0
+        while chunk := await file.read(settings.UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            total += len(chunk)
+            if limit is not None and size > limit:
+                raise BatchTooLargeError(f"{filename} is larger than {limit} bytes")
+            if total > settings.BATCH_MAX_TOTAL_BYTES:
+                raise BatchTooLargeError(f"Batch is limited to {settings.BATCH_MAX_TOTAL_BYTES} bytes")
+            chunks.append(chunk)
+        uploads.append((filename, b"".join(chunks), file.content_type))
+    return uploads
+
+
+def expand_uploads(uploads: List[BatchUpload]) -> List[BatchItem]:
+    items = []
+    for filename, data, content_type in uploads:
+        if is_archive(filename, content_type):
+            items.extend(_archive_members(filename, data))
+        else:
+            items.append((filename, lambda data=data: data, content_type))
+        if len(items) > settings.BATCH_MAX_ITEMS:
+            raise BatchTooLargeError(f"Batch is limited to {settings.BATCH_MAX_ITEMS} images")
+    return items
+
+
+async def _extract_item(
+    index: int,
+    filename: str,
+    read: Callable[[], bytes],
+    content_type: Optional[str],
+    mode: Optional[str],
+    backend: Optional[str],
+) -> Dict[str, Any]:
+    item = {"index": index, "filename": filename}
+    if not content_type or not content_type.startswith("image/"):
+        return {**item, "status": "error", "detail": "File must be an image"}
+    try:
+        async with _slots():
+            image = await asyncio.to_thread(read)
+            result, cached = await run_extraction(image, content_type, mode, backend)
+    except Exception as e:
+        return {**item, "status": "error", "detail": str(e)}
+    return {**item, "status": "success", "data": result, "cached": cached}
+
+
+async def run_batch(items: List[BatchItem], mode: Optional[str] = None, backend: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+    tasks = [
+        asyncio.create_task(_extract_item(index, filename, read, content_type, mode, backend))
+        for index, (filename, read, content_type) in enumerate(items)
+    ]
+    succeeded = failed = 0
+    try:
+        # Results are emitted in completion order; "index" maps them back to the upload order
+        for next_result in asyncio.as_completed(tasks):
+            result = await next_result
+            if result["status"] == "success":
+                succeeded += 1
+            else:
+                failed += 1
+            yield result
+    finally:
+        # The client went away: don't keep spending quota on a batch nobody reads
+        for task in tasks:
+            task.cancel()
+    yield {"status": "done", "total": len(items), "succeeded": succeeded, "failed": failed}
@@ -0,0 +1,349 @@
+import hashlib
+import io
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image
+from pymongo import ASCENDING, ReplaceOne
+
+from app.core.config import settings
+from app.core.database import get_database
+from app.core.metrics import register_cache_stats
+from app.core.tracing import span
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def record(self, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hitRate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def perceptual_hash(data: bytes, hash_size: int = 8) -> Optional[str]:
+    # Difference hash: survives re-encoding and resizing of the same photo
+    try:
+        image = Image.open(io.BytesIO(data)).convert("L")
+    except Exception:
+        return None
+    image = image.resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = list(image.getdata())
+    bits = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:0{hash_size * hash_size // 4}x}"
+
+
+def hamming_distance(a: str, b: str) -> Optional[int]:
+    # Hashes are "<variant>:<hex>"; results of a different extraction variant never match
+    variant_a, _, bits_a = a.rpartition(":")
+    variant_b, _, bits_b = b.rpartition(":")
+    if variant_a != variant_b:
+        return None
+    return bin(int(bits_a, 16) ^ int(bits_b, 16)).count("1")
+
+
+class MemoryCache:
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stats = CacheStats()
+        # key -> (expires_at, phash, value), ordered from least to most recently used
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def _lookup(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, _, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = self._lookup(key)
+        self.stats.record(value is not None)
+        return value
+
+    async def get_similar(self, key: str, phash: Optional[str], max_distance: int) -> Optional[Any]:
+        value = self._lookup(key)
+        if value is None and phash:
+            for other_key, (_, other_phash, _) in list(self._entries.items()):
+                distance = hamming_distance(phash, other_phash) if other_phash else None
+                if distance is not None and distance <= max_distance:
+                    value = self._lookup(other_key)
+                    if value is not None:
+                        break
+        self.stats.record(value is not None)
+        return value
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        found = {}
+        for key in keys:
+            value = await self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    async def set(self, key: str, value: Any, phash: Optional[str] = None):
+        self._entries[key] = (time.monotonic() + self.ttl, phash, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    async def set_many(self, items: Dict[str, Any]):
+        for key, value in items.items():
+            await self.set(key, value)
+
+    async def clear(self):
+        self._entries.clear()
+
+    async def size(self) -> int:
+        return len(self._entries)
+
+
+class MongoCache:
+    def __init__(self, collection_name: str, max_size: int, ttl: int):
+        self.collection_name = collection_name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._indexes_ready = False
+
+    async def collection(self):
+        collection = get_database()[self.collection_name]
+        if not self._indexes_ready:
+            await collection.create_index([("key", ASCENDING)], unique=True)
+            await collection.create_index([("phash", ASCENDING)], sparse=True)
+            await collection.create_index([("lastAccess", ASCENDING)])
+            await collection.create_index([("expiresAt", ASCENDING)], expireAfterSeconds=0)
+            self._indexes_ready = True
+        return collection
+
+    async def _find(self, query: Dict[str, Any]) -> Optional[Any]:
+        now = datetime.now(timezone.utc)
+        collection = await self.collection()
+        doc = await collection.find_one_and_update(
+            {**query, "expiresAt": {"$gt": now}},
+            {"$set": {"lastAccess": now}},
+            projection={"value": 1},
+        )
+        return doc["value"] if doc else None
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = await self._find({"key": key})
+        self.stats.record(value is not None)
+        return value
+
+    async def get_similar(self, key: str, phash: Optional[str], max_distance: int) -> Optional[Any]:
+        # Only exact perceptual matches can use the index
+        value = await self._find({"key": key})
+        if value is None and phash:
+            value = await self._find({"phash": phash})
+        self.stats.record(value is not None)
+        return value
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        if not keys:
+            return {}
+        now = datetime.now(timezone.utc)
+        collection = await self.collection()
+        query = {"key": {"$in": keys}, "expiresAt": {"$gt": now}}
+        found = {doc["key"]: doc["value"] async for doc in collection.find(query, {"key": 1, "value": 1})}
+        if found:
+            await collection.update_many({"key": {"$in": list(found)}}, {"$set": {"lastAccess": now}})
+        self.stats.hits += len(found)
+        self.stats.misses += len(keys) - len(found)
+        return found
+
+    def _document(self, key: str, value: Any, phash: Optional[str] = None) -> Dict[str, Any]:
+        now = datetime.now(timezone.utc)
+        doc = {
+            "key": key,
+            "value": value,
+            "lastAccess": now,
+            "expiresAt": now + timedelta(seconds=self.ttl),
+        }
+        if phash:
+            doc["phash"] = phash
+        return doc
+
+    async def set(self, key: str, value: Any, phash: Optional[str] = None):
+        collection = await self.collection()
+        await collection.replace_one({"key": key}, self._document(key, value, phash), upsert=True)
+        await self._evict()
+
+    async def set_many(self, items: Dict[str, Any]):
+        if not items:
+            return
+        collection = await self.collection()
+        await collection.bulk_write(
+            [ReplaceOne({"key": key}, self._document(key, value), upsert=True) for key, value in items.items()],
+            ordered=False,
+        )
+        await self._evict()
+
+    async def _evict(self):
+        collection = await self.collection()
+        excess = await collection.estimated_document_count() - self.max_size
+        if excess <= 0:
+            return
+        stale = collection.find({}, {"_id": 1}).sort("lastAccess", ASCENDING).limit(excess)
+        ids = [doc["_id"] async for doc in stale]
+        if ids:
+            result = await collection.delete_many({"_id": {"$in": ids}})
+            self.stats.evictions += result.deleted_count
+
+    async def clear(self):
+        collection = await self.collection()
+        await collection.delete_many({})
+
+    async def size(self) -> int:
+        collection = await self.collection()
+        return await collection.estimated_document_count()
+
+
+class NullCache:
+    def __init__(self):
+        self.stats = CacheStats()
+
+    async def get(self, key: str) -> Optional[Any]:
+        self.stats.record(False)
+        return None
+
+    async def get_similar(self, key: str, phash: Optional[str], max_distance: int) -> Optional[Any]:
+        self.stats.record(False)
+        return None
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        self.stats.misses += len(keys)
+        return {}
+
+    async def set(self, key: str, value: Any, phash: Optional[str] = None):
+        pass
+
+    async def set_many(self, items: Dict[str, Any]):
+        pass
+
+    async def clear(self):
+        pass
+
+    async def size(self) -> int:
+        return 0
+
+
+class TieredCache:
+    # A small in-process LRU in front of the shared MongoDB cache
+    def __init__(self, front: MemoryCache, back: MongoCache):
+        self.front = front
+        self.back = back
+        self.stats = CacheStats()
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = await self.front.get(key)
+        if value is None:
+            value = await self.back.get(key)
+            if value is not None:
+                await self.front.set(key, value)
+        self.stats.record(value is not None)
+        return value
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        found = await self.front.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            from_back = await self.back.get_many(missing)
+            await self.front.set_many(from_back)
+            found.update(from_back)
+        self.stats.hits += len(found)
+        self.stats.misses += len(keys) - len(found)
+        return found
+
+    async def set(self, key: str, value: Any, phash: Optional[str] = None):
+        await self.front.set(key, value, phash)
+        await self.back.set(key, value, phash)
+
+    async def set_many(self, items: Dict[str, Any]):
+        await self.front.set_many(items)
+        await self.back.set_many(items)
+
+    async def clear(self):
+        await self.front.clear()
+        await self.back.clear()
+
+    async def size(self) -> int:
+        return await self.back.size()
+
+
+def build_cache(backend: str, collection_name: str, max_size: int, ttl: int, memory_size: Optional[int] = None):
+    if backend == "memory":
+        return MemoryCache(max_size, ttl)
+    if backend == "mongo":
+        return MongoCache(collection_name, max_size, ttl)
+    if backend == "tiered":
+        return TieredCache(MemoryCache(memory_size or max_size, ttl), MongoCache(collection_name, max_size, ttl))
+    if backend == "none":
+        return NullCache()
+    raise ValueError(f"Unknown cache backend: {backend}")
+
+
+extraction_cache = build_cache(
+    settings.EXTRACTION_CACHE_BACKEND,
+    "extraction_cache",
+    settings.EXTRACTION_CACHE_MAX_SIZE,
+    settings.EXTRACTION_CACHE_TTL,
+)
+register_cache_stats("extraction", extraction_cache.stats)
+
+
+def image_cache_keys(image: bytes, mode: str, backend: Optional[str] = None):
+    # Combined and parallel extraction, and each vision backend, give different results for one image
+    variant = f"{mode}:{backend or 'auto'}"
+    phash = perceptual_hash(image) if settings.EXTRACTION_CACHE_PHASH else None
+    return f"{content_hash(image)}:{variant}", f"{variant}:{phash}" if phash else None
+
+
+async def get_cached_extraction(image: bytes, mode: str, backend: Optional[str] = None):
+    # Hashing decodes the image, keep it off the event loop
+    with span("extraction_cache.lookup", {"cache.backend": settings.EXTRACTION_CACHE_BACKEND}) as current:
+        key, phash = await run_in_threadpool(image_cache_keys, image, mode, backend)
+        result = await extraction_cache.get_similar(key, phash, settings.EXTRACTION_CACHE_PHASH_DISTANCE)
+        if current is not None:
+            current.set_attribute("cache.hit", result is not None)
+    return result, key, phash
+
+
+async def cache_stats() -> Dict[str, Any]:
+    return {
+        "backend": settings.EXTRACTION_CACHE_BACKEND,
+        "size": await extraction_cache.size(),
+        "maxSize": settings.EXTRACTION_CACHE_MAX_SIZE,
+        **extraction_cache.stats.as_dict(),
+    }
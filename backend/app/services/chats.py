@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING
+
+from app.core.config import settings
+from app.core.database import get_database
+from app.services.gemini import generate_chat_name
+
+logger = logging.getLogger(__name__)
+
+CHAT_VIEWS = {
+    "summary": {"name": 1, "createdAt": 1, "status": 1},
+    "full": {"messages": 0},
+}
+LISTING_SORT = [("createdAt", DESCENDING), ("_id", DESCENDING)]
+
+# In-flight naming tasks by chat id, so a chat is named once and callers can await the result
+_naming_tasks: Dict[str, asyncio.Task] = {}
+
+
+async def ensure_chat_indexes():
+    collection = get_database().chats
+    await collection.create_index(LISTING_SORT)
+    await collection.create_index([("userId", ASCENDING)] + LISTING_SORT)
+
+
+def encode_cursor(chat: Dict[str, Any]) -> str:
+    # createdAt only has second precision, so the id breaks ties
+    return f"{chat['createdAt']}_{chat['_id']}"
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    created_at, _, chat_id = cursor.rpartition("_")
+    try:
+        chat_id = ObjectId(chat_id)
+    except InvalidId:
+        raise ValueError("Invalid cursor")
+    return {
+        "$or": [
+            {"createdAt": {"$lt": created_at}},
+            {"createdAt": created_at, "_id": {"$lt": chat_id}},
+        ]
+    }
+
+
+async def list_chats(db, view: str, user_id: Optional[str], before: Optional[str], limit: int) -> Dict[str, Any]:
+    query: Dict[str, Any] = {}
+    if user_id:
+        query["userId"] = user_id
+    if before:
+        query.update(decode_cursor(before))
+
+    cursor = db.chats.find(query, CHAT_VIEWS[view]).sort(LISTING_SORT).limit(limit + 1)
+    chats = await cursor.to_list()
+    has_more = len(chats) > limit
+    chats = chats[:limit]
+
+    next_cursor = encode_cursor(chats[-1]) if has_more else None
+    for chat in chats:
+        chat["_id"] = str(chat["_id"])
+    return {"chats": chats, "nextCursor": next_cursor}
+
+
+async def name_chat(db, chat_id: str, product_information: Dict[str, Any], user_text: str, bot_text: str) -> Optional[str]:
+    try:
+        name = await generate_chat_name(user_text, bot_text, product_information)
+        if not name:
+            return None
+        # nameSource is set once: a generated name never overwrites a user's rename, or an earlier name
+        result = await db.chats.update_one(
+            {"_id": ObjectId(chat_id), "nameSource": {"$exists": False}},
+            {"$set": {"name": name, "nameSource": "generated"}},
+        )
+        return name if result.modified_count else None
+    except Exception as e:
+        logger.error("Naming chat failed: %s", e, extra={"chat_id": chat_id})
+        return None
+
+
+def schedule_chat_naming(
+    db, chat_id: str, product_information: Dict[str, Any], user_text: str, bot_text: str
+) -> Optional[asyncio.Task]:
+    # Names are generated after the reply so they never add latency to a turn
+    if not settings.CHAT_NAME_ENABLED:
+        return None
+    if chat_id in _naming_tasks:
+        return _naming_tasks[chat_id]
+    task = asyncio.create_task(name_chat(db, chat_id, product_information, user_text, bot_text))
+    _naming_tasks[chat_id] = task
+    task.add_done_callback(lambda _: _naming_tasks.pop(chat_id, None))
+    return task
+
+
+def is_naming(chat_id: str) -> bool:
+    return chat_id in _naming_tasks
@@ -0,0 +1,192 @@
+import logging
+import asyncio
+import json
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+
+from app.core.config import settings
+from app.core.model_client import get_gemini_client
+from app.services.messages import get_messages_between
+from app.services.resilience import call_model, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_MODEL = "gemini-2.0-flash-lite"
+
+SUMMARY_PROMPT = """
+You maintain a running summary of a conversation between a user and an assistant about a product.
+Update the summary with the new messages. Keep facts the user stated, questions asked and answers given.
+Write at most {max_words} words, in the language of the conversation. Return only the summary.
+"""
+
+# Fields that never help answer questions about the product
+PRODUCT_SKIP_KEYS = {"image", "_id"}
+
+# Keep references to summary tasks so they are not garbage collected mid-flight
+_summary_tasks = set()
+_summarizing_chats = set()
+
+
+class ChatContext:
+    def __init__(self, message: str, product_text: str, summary: str, history: List[Dict[str, Any]], tokens: int, summarize_up_to: Optional[int]):
+        self.message = message
+        self.product_text = product_text
+        self.summary = summary
+        self.history = history
+        self.tokens = tokens
+        # Messages up to this sequence number fell out of the history and are not summarized yet
+        self.summarize_up_to = summarize_up_to
+        # Set by the caller when the chat may have a model-side context cache
+        self.chat_id: Optional[str] = None
+        self.cache: Optional[Dict[str, Any]] = None
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rstrip() + "…"
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def _compact(value: Any, max_chars: int, max_items: int) -> Any:
+    if isinstance(value, dict):
+        compacted = {}
+        for key, item in value.items():
+            if key in PRODUCT_SKIP_KEYS or _is_empty(item):
+                continue
+            compacted[key] = _compact(item, max_chars, max_items)
+        return compacted
+    if isinstance(value, list):
+        items = [_compact(item, max_chars, max_items) for item in value if not _is_empty(item)]
+        if len(items) > max_items:
+            items = items[:max_items] + [f"+{len(items) - max_items} more"]
+        return items
+    if isinstance(value, str):
+        value = " ".join(value.split())
+        return value if len(value) <= max_chars else value[:max_chars].rstrip() + "…"
+    return value
+
+
+def serialize_product_info(
+    product_information: Dict[str, Any], max_tokens: int, max_chars: int = 2000, max_items: int = 200
+) -> str:
+    # Sorted keys and no whitespace give the same text, and tokens, for the same product every time
+    while True:
+        compacted = _compact(product_information or {}, max_chars, max_items)
+        text = json.dumps(compacted, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        if estimate_tokens(text) <= max_tokens or max_chars <= 40:
+            return truncate_to_tokens(text, max_tokens)
+        # Shorten long free-text fields and lists first, they carry the least per token
+        max_chars //= 2
+        max_items = max(10, max_items // 2)
+
+
+def build_context(
+    message: str,
+    history_messages: List[Dict[str, Any]],
+    product_information: Dict[str, Any],
+    summary: Optional[Dict[str, Any]] = None,
+    fixed_tokens: int = 0,
+    cached_product_text: Optional[str] = None,
+) -> ChatContext:
+    # A pasted wall of text must not be able to push the turn over budget on its own
+    message = truncate_to_tokens(message, settings.CONTEXT_TOKEN_BUDGET // 2)
+    summary_text = (summary or {}).get("text", "")
+    summary_seq = (summary or {}).get("seq", 0)
+    remaining = settings.CONTEXT_TOKEN_BUDGET - fixed_tokens - estimate_tokens(message) - estimate_tokens(summary_text)
+
+    if cached_product_text is not None:
+        # The whole product lives in the model-side cache: it is not part of the turn's budget, and
+        # must be the same text every turn for the cached prompt to match
+        product_text = cached_product_text
+    else:
+        # Product facts come before history, but never take more than their own budget
+        product_budget = max(0, min(settings.CONTEXT_PRODUCT_TOKEN_BUDGET, remaining))
+        product_text = serialize_product_info(product_information, product_budget)
+        remaining -= estimate_tokens(product_text)
+
+    # Newest messages first, until the budget runs out
+    history = []
+    for msg in reversed(history_messages):
+        text = truncate_to_tokens(msg["text"], settings.CONTEXT_MESSAGE_MAX_TOKENS)
+        cost = estimate_tokens(msg["sender"], text) + 2
+        if cost > remaining:
+            break
+        history.append({**msg, "text": text})
+        remaining -= cost
+    history.reverse()
+
+    summarize_up_to = None
+    if history_messages:
+        oldest_included = history[0]["seq"] if history else history_messages[-1]["seq"] + 1
+        if oldest_included - 1 - summary_seq >= settings.CONTEXT_SUMMARY_MIN_MESSAGES:
+            summarize_up_to = oldest_included - 1
+
+    tokens = settings.CONTEXT_TOKEN_BUDGET - remaining
+    if cached_product_text is not None:
+        tokens += estimate_tokens(product_text)
+    return ChatContext(message, product_text, summary_text, history, tokens, summarize_up_to)
+
+
+async def summarize_messages(previous_summary: str, messages: List[Dict[str, Any]]) -> str:
+    client = get_gemini_client()
+    prompt = SUMMARY_PROMPT.format(max_words=settings.CONTEXT_SUMMARY_MAX_TOKENS * 3 // 4)
+    conversation = "\n".join(
+        f"{msg['sender']}: {truncate_to_tokens(msg['text'], settings.CONTEXT_MESSAGE_MAX_TOKENS)}"
+        for msg in messages
+    )
+    contents = f"Current summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{conversation}"
+
+    response = await call_model(
+        SUMMARY_MODEL,
+        lambda: client.aio.models.generate_content(
+            model=SUMMARY_MODEL,
+            contents=[contents],
+            config={
+                "temperature": 0,
+                "max_output_tokens": settings.CONTEXT_SUMMARY_MAX_TOKENS,
+                "system_instruction": prompt
+            }
+        ),
+        estimate_tokens(prompt, contents) + settings.CONTEXT_SUMMARY_MAX_TOKENS,
+        operation="summarize",
+    )
+    return (response.text or "").strip()
+
+
+async def refresh_summary(db, chat_id: str, summary: Optional[Dict[str, Any]], up_to_seq: int):
+    summary_text = (summary or {}).get("text", "")
+    summary_seq = (summary or {}).get("seq", 0)
+    try:
+        messages = await get_messages_between(db, chat_id, summary_seq, up_to_seq)
+        if not messages:
+            return
+        new_text = await summarize_messages(summary_text, messages)
+        # Only move forward; a concurrent refresh may already have covered more messages
+        await db.chats.update_one(
+            {"_id": ObjectId(chat_id), "$or": [
+                {"contextSummary": {"$exists": False}},
+                {"contextSummary.seq": {"$lt": messages[-1]["seq"]}},
+            ]},
+            {"$set": {"contextSummary": {"text": new_text, "seq": messages[-1]["seq"]}}},
+        )
+    except Exception as e:
+        logger.error("Summarizing chat failed: %s", e, extra={"chat_id": chat_id})
+
+
+def schedule_summary_refresh(db, chat_id: str, summary: Optional[Dict[str, Any]], context: ChatContext):
+    # Summaries are refreshed after the reply so they never add latency to a turn
+    if not settings.CONTEXT_SUMMARY_ENABLED or context.summarize_up_to is None:
+        return
+    if chat_id in _summarizing_chats:
+        return
+    _summarizing_chats.add(chat_id)
+    task = asyncio.create_task(refresh_summary(db, chat_id, summary, context.summarize_up_to))
+    _summary_tasks.add(task)
+    task.add_done_callback(_summary_tasks.discard)
+    task.add_done_callback(lambda _: _summarizing_chats.discard(chat_id))
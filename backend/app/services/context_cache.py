@@ -0,0 +1,139 @@
+import logging
+import asyncio
+import hashlib
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from bson import ObjectId
+
+from app.core.config import settings
+from app.core.database import get_database
+from app.core.model_client import get_gemini_client, is_gemini_api_error
+from app.services.resilience import call_model, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Errors the API returns for a cache that expired, was deleted or never fit the model
+CACHE_MISS_STATUS_CODES = {400, 403, 404}
+
+
+class ContextCaches:
+    # Creation failed for a reason that is not specific to one chat (e.g. the model has no caching)
+    disabled_until: float = 0.0
+    tasks = set()
+    pending = set()
+
+
+caches = ContextCaches()
+
+
+def caching_available() -> bool:
+    return settings.CONTEXT_CACHE_ENABLED and time.monotonic() >= caches.disabled_until
+
+
+def prompt_hash(system_prompt: str) -> str:
+    return hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def is_stale(record: Optional[Dict[str, Any]], model: str) -> bool:
+    if not record or record.get("model") != model:
+        return True
+    margin = timedelta(seconds=settings.CONTEXT_CACHE_REFRESH_MARGIN)
+    return _as_utc(record["expiresAt"]) - margin <= datetime.now(timezone.utc)
+
+
+def usable_cache(record: Optional[Dict[str, Any]], model: str, system_prompt: str) -> Optional[str]:
+    if not settings.CONTEXT_CACHE_ENABLED or is_stale(record, model):
+        return None
+    # A turn whose product text was squeezed by a long message can't use the cached prompt
+    if record.get("promptHash") != prompt_hash(system_prompt):
+        return None
+    return record["name"]
+
+
+def is_cache_miss(error: Exception) -> bool:
+    return is_gemini_api_error(error) and error.code in CACHE_MISS_STATUS_CODES
+
+
+async def create_context_cache(chat_id: str, model: str, system_prompt: str) -> Dict[str, Any]:
+    client = get_gemini_client()
+    cached = await call_model(
+        model,
+        lambda: client.aio.caches.create(
+            model=model,
+            config={
+                "system_instruction": system_prompt,
+                "ttl": f"{settings.CONTEXT_CACHE_TTL}s",
+                "display_name": f"chat-{chat_id}",
+            }
+        ),
+        estimate_tokens(system_prompt),
+        operation="context_cache",
+    )
+    expires_at = cached.expire_time or datetime.now(timezone.utc) + timedelta(seconds=settings.CONTEXT_CACHE_TTL)
+    return {
+        "name": cached.name,
+        "model": model,
+        "promptHash": prompt_hash(system_prompt),
+        "expiresAt": _as_utc(expires_at),
+    }
+
+
+async def delete_context_cache(record: Optional[Dict[str, Any]]):
+    if not record:
+        return
+    try:
+        await get_gemini_client().aio.caches.delete(name=record["name"])
+    except Exception:
+        # Expired caches are already gone; anything else expires with its TTL
+        pass
+
+
+async def refresh_context_cache(chat_id: str, model: str, system_prompt: str):
+    db = get_database()
+    try:
+        record = await create_context_cache(chat_id, model, system_prompt)
+    except Exception as e:
+        if is_cache_miss(e):
+            caches.disabled_until = time.monotonic() + settings.CONTEXT_CACHE_RETRY_AFTER
+        logger.warning("Context cache unavailable: %s", e, extra={"chat_id": chat_id, "model": model})
+        return
+
+    previous = await db.chats.find_one_and_update(
+        {"_id": ObjectId(chat_id)},
+        {"$set": {"contextCache": record}},
+        projection={"contextCache": 1},
+    )
+    if previous is None:
+        # The chat was deleted while the cache was being created
+        await delete_context_cache(record)
+        return
+    if previous.get("contextCache") and previous["contextCache"]["name"] != record["name"]:
+        await delete_context_cache(previous["contextCache"])
+
+
+def schedule_cache_refresh(chat_id: Optional[str], model: str, system_prompt: str):
+    # Created in the background: the turn that notices a missing cache answers without it
+    if not caching_available() or chat_id is None or chat_id in caches.pending:
+        return
+    if estimate_tokens(system_prompt) < settings.CONTEXT_CACHE_MIN_TOKENS:
+        return
+    caches.pending.add(chat_id)
+    task = asyncio.create_task(refresh_context_cache(chat_id, model, system_prompt))
+    caches.tasks.add(task)
+    task.add_done_callback(caches.tasks.discard)
+    task.add_done_callback(lambda _: caches.pending.discard(chat_id))
+
+
+async def forget_context_cache(chat_id: str, record: Optional[Dict[str, Any]]):
+    # The API no longer knows this cache; drop it so the next turn recreates it
+    if record:
+        await get_database().chats.update_one(
+            {"_id": ObjectId(chat_id), "contextCache.name": record["name"]},
+            {"$unset": {"contextCache": ""}},
+        )
@@ -1,16 +1,18 @@
+import logging
 from fastapi import UploadFile
-from google import genai
 from app.core.config import settings
-from typing import Dict, Any
-from app.models.extractor import IngredientsOutputFormat, OtherInfoOutputFormat
-from google.genai.types import Part
-import io
-from PIL import Image
+from typing import Dict, Any, Optional
+from app.models.extractor import IngredientsOutputFormat, OtherInfoOutputFormat, CombinedOutputFormat
+from app.services.ocr import parse_ingredients
+from app.services.vision import GeminiBackend, vision_registry
 import os
 import uuid
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor
+import asyncio
 
+logger = logging.getLogger(__name__)
+
+EXTRACTION_MODES = ("parallel", "combined")
 
 EXTRACT_INGREDIENTS_PROMPT = """
 You are a vision-language model tasked with reading the ingredient declaration on a product's packaging and outputting a JSON object with two parallel arrays: one for ingredient names and one for their amounts.
@@ -79,91 +81,106 @@ Output format:
 }
 """
 
-client = genai.Client(api_key=settings.GEMINI_API_KEY)
+EXTRACT_COMBINED_PROMPT = """
+You are a vision-language model tasked with reading a product's packaging and outputting a single JSON object that contains both the ingredient declaration and the key product information.
 
-def extract_image_info(image: bytes, info_type: str) -> Dict[str, Any]:
-    # Read image data
-    
-    if info_type == "ingredients":
-        prompt = EXTRACT_INGREDIENTS_PROMPT
-        output_format = IngredientsOutputFormat
-    elif info_type == "other_info":
-        prompt = EXTRACT_OTHER_INFO_PROMPT
-        output_format = OtherInfoOutputFormat
+Instructions for the ingredient declaration:
+1. Identify each ingredient name as printed on the packaging and list them in "ingredients".
+2. Capture the corresponding amount (weight, volume, percentage, etc.) in "amounts", in the same order. Amounts must be a number followed by a unit (e.g., 12%, 100g, 0.5L), without parentheses or descriptions. If an ingredient has no amount listed, use an empty string.
+3. Determine the language used in the ingredient declaration and put it in "language" (in English, e.g., "Vietnamese", "French", "Japanese").
 
-    try:
-        # Create image part
-        image_part = Part.from_bytes(data=image, mime_type="image/jpeg")
-        
-        # Generate content with both text and image
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=[
-                "Extract the informationfrom the image.",
-                image_part,
-            ],
-            config={
-                'response_mime_type': 'application/json',
-                'response_schema': output_format,
-                "temperature": 0,
-                "system_instruction": prompt
-            }
-        )
-        
-        return response.parsed.__dict__
-    
-    except Exception as e:
-        print(f"Error processing image: {str(e)}")
-        raise e
+Instructions for the other product information:
+4. Extract the product name, brand, net content (e.g., 500g, 250ml, 1L), manufacturing date, expiry or best-before date, country of origin, manufacturer, usage instructions (short description), storage instructions and nutritional information (only if clearly structured).
+5. Dates must follow the format YYYY-MM-DD. If not clearly structured, return the date string as-is.
+6. Units for content and nutritional values must be preserved exactly as written (e.g., kcal, g, mg).
+7. Do not repeat the ingredient list in the other fields.
+8. If a field is not present or legible, use an empty string for that field (or an empty array for "ingredients" and "amounts").
 
-def translate_info(info: Dict[str, Any], language: str) -> Dict[str, Any]:
-    # Use Gemini to translate the information
-    prompt = f"""
-You are a helpful translator.
+Return ONLY a JSON object in the exact format below. Do not include any extra text, explanations, or notes.
+Output format:
+{
+  "ingredients": ["Ingredient1", "Ingredient2", "..."],
+  "amounts": ["Amount1", "Amount2", "..."],
+  "language": "Language",
+  "product_name": "",
+  "brand": "",
+  "net_content": "",
+  "manufacturing_date": "",
+  "expiry_date": "",
+  "country_of_origin": "",
+  "manufacturer": "",
+  "usage_instructions": "",
+  "storage_instructions": "",
+  "nutritional_info": ""
+}
+"""
 
-Translate the following JSON dictionary into {language}.
-Instructions:
-- Translate ALL keys, values, and any nested objects or arrays into {language}.
-- Do NOT modify the structure — only translate human-readable strings.
-- Keys may contain spaces — do NOT change their format.
-- Return a valid JSON object with only the translated dictionary (no extra text or explanation).
-IMPORTANT: If a value is a dictionary or list, recursively translate all keys and strings inside it.
+EXTRACTION_REQUESTS = {
+    "ingredients": (EXTRACT_INGREDIENTS_PROMPT, IngredientsOutputFormat),
+    "other_info": (EXTRACT_OTHER_INFO_PROMPT, OtherInfoOutputFormat),
+    "combined": (EXTRACT_COMBINED_PROMPT, CombinedOutputFormat),
+}
 
-Example:
-Input:
-{{
-  "greeting": "Hello",
-  "details": {{
-    "user name": "Alice",
-    "hobbies": ["Reading", "Cooking"]
-  }}
-}}
-
-Output (if target language is Vietnamese):
-{{
-  "lời chào": "Xin chào",
-  "chi tiết": {{
-    "tên người dùng": "Alice",
-    "sở thích": ["Đọc sách", "Nấu ăn"]
-  }}
-}}
-
-Now translate this:
+async def generate_extraction(image: bytes, info_type: str, mime_type: str = "image/jpeg"):
+    # Raw Gemini response, with usage metadata, for benchmarks
+    prompt, output_format = EXTRACTION_REQUESTS[info_type]
+    return await GeminiBackend().generate(image, mime_type, prompt, output_format)
 
-"""
-    print(prompt)
+async def extract_image_info(image: bytes, info_type: str, mime_type: str = "image/jpeg", backend: Optional[str] = None) -> Dict[str, Any]:
+    prompt, output_format = EXTRACTION_REQUESTS[info_type]
+    try:
+        return await vision_registry.extract(image, mime_type, prompt, output_format, backend, operation=f"extract_{info_type}")
     
-    response = client.models.generate_content(
-        model="gemini-2.5-flash-preview-04-17",
-        contents=[
-            "Translate the following JSON dictionary into {language}."
-            f"Input: {info}"
-        ],
-        config={
-            'response_mime_type': 'application/json',
-            "temperature": 0,
-            "system_instruction": prompt
-        }
-    )
-    print(response.text)
-    return eval(response.text)
\ No newline at end of file
+    except Exception as e:
+        logger.error("Extraction failed: %s", e, extra={"info_type": info_type, "backend": backend})
+        raise e
+
+def combine_results(ingredients_result: Dict[str, Any], other_info_result: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "Ingredients": ingredients_result["ingredients"],
+        "Product name": other_info_result["product_name"],
+        "Brand": other_info_result["brand"],
+        "Net content": other_info_result["net_content"],
+        "Manufacturing date": other_info_result["manufacturing_date"],
+        "Expiry date": other_info_result["expiry_date"],
+        "Country of origin": other_info_result["country_of_origin"],
+        "Manufacturer": other_info_result["manufacturer"],
+        "Usage instructions": other_info_result["usage_instructions"],
+        "Storage instructions": other_info_result["storage_instructions"],
+        "Nutritional info": other_info_result["nutritional_info"],
+    }
+
+async def extract_ingredients(
+    image: bytes,
+    mime_type: str,
+    ocr: Optional[Dict[str, Any]] = None,
+    backend: Optional[str] = None,
+) -> Dict[str, Any]:
+    if ocr is None:
+        return await extract_image_info(image, "ingredients", mime_type, backend)
+    if settings.OCR_LOCAL_EXTRACTION and ocr["confidence"] >= settings.OCR_MIN_CONFIDENCE:
+        parsed = parse_ingredients(ocr["text"])
+        if parsed["ingredients"]:
+            return parsed
+    # The ingredients prompt only needs the panel, not the whole package
+    return await extract_image_info(ocr["crop"], "ingredients", ocr["mimeType"], backend)
+
+async def extract_product_info(
+    image: bytes,
+    mode: Optional[str] = None,
+    mime_type: str = "image/jpeg",
+    ocr: Optional[Dict[str, Any]] = None,
+    backend: Optional[str] = None,
+) -> Dict[str, Any]:
+    mode = mode or settings.EXTRACTION_MODE
+    if mode == "combined":
+        # One request returns both schemas, so the image is uploaded once
+        result = await extract_image_info(image, "combined", mime_type, backend)
+        return combine_results(result, result)
+    if mode == "parallel":
+        ingredients_result, other_info_result = await asyncio.gather(
+            extract_ingredients(image, mime_type, ocr, backend),
+            extract_image_info(image, "other_info", mime_type, backend),
+        )
+        return combine_results(ingredients_result, other_info_result)
+    raise ValueError(f"Unknown extraction mode: {mode}")
@@ -1,40 +1,60 @@
-from google import genai
+from app.core.model_client import get_gemini_client
 from app.core.config import settings
-from typing import List, Dict
-
-# Configure Gemini
-def generate_chat_name(user_message: str, bot_response: str, production_information: dict) -> str:
-    client = genai.Client(api_key=settings.GEMINI_API_KEY)
-
-    prompt = f"""
-        Generate a short, descriptive name (max 5 words) for a chat based on the following conversation and contextual information. 
-        The name should reflect the main topic or purpose of the conversation. 
-        Avoid generic titles if the user message is vague — instead, use the provided production information to determine intent. 
-        Use the same language as the user and bot messages.
-        Conversation:
-        User: {user_message}
-        Bot: {bot_response}
-
-        Production Information:
-        {production_information}
-    """
-    
-    response = client.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=[
-            prompt,
-        ],
-        config={
-            "temperature": 0,
-            "system_instruction": prompt
-        }
+from app.services.context import ChatContext, serialize_product_info, truncate_to_tokens
+from app.services.context_cache import (
+    caching_available,
+    forget_context_cache,
+    is_cache_miss,
+    is_stale,
+    schedule_cache_refresh,
+    usable_cache,
+)
+from app.services.resilience import call_model, estimate_tokens, stream_model
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+CHAT_NAME_MODEL = "gemini-2.0-flash-lite"
+CHAT_NAME_PRODUCT_TOKENS = 150  # the product name and a few fields are enough to name a chat
+CHAT_NAME_MESSAGE_TOKENS = 150
+CHAT_NAME_MAX_LENGTH = 60
+
+CHAT_NAME_PROMPT = """
+Generate a short, descriptive name (max 5 words) for a chat based on the following conversation and contextual information.
+The name should reflect the main topic or purpose of the conversation.
+Avoid generic titles if the user message is vague — instead, use the provided product information to determine intent.
+Use the same language as the user and bot messages.
+Return only the name, without quotes or trailing punctuation.
+"""
+
+async def generate_chat_name(user_message: str, bot_response: str, production_information: dict) -> str:
+    client = get_gemini_client()
+    contents = (
+        f"Conversation:\nUser: {truncate_to_tokens(user_message, CHAT_NAME_MESSAGE_TOKENS)}\n"
+        f"Bot: {truncate_to_tokens(bot_response, CHAT_NAME_MESSAGE_TOKENS)}\n\n"
+        f"Product information:\n{serialize_product_info(production_information or {}, CHAT_NAME_PRODUCT_TOKENS)}"
     )
-    return response.text.strip()
 
-def generate_response(message: str, history_messages: list, product_information: dict) -> str:
-    client = genai.Client(api_key=settings.GEMINI_API_KEY)
-    
-    SYSTEM_PROMPT = f"""
+    response = await call_model(
+        CHAT_NAME_MODEL,
+        lambda: client.aio.models.generate_content(
+            model=CHAT_NAME_MODEL,
+            contents=[contents],
+            config={
+                "temperature": 0,
+                "max_output_tokens": settings.CHAT_NAME_MAX_TOKENS,
+                "system_instruction": CHAT_NAME_PROMPT
+            }
+        ),
+        estimate_tokens(CHAT_NAME_PROMPT, contents) + settings.CHAT_NAME_MAX_TOKENS,
+        operation="chat_name",
+    )
+    # Keep the first line only, without the quotes or markdown a model sometimes adds
+    lines = (response.text or "").strip().splitlines()
+    return lines[0].strip(" \"'*.").strip()[:CHAT_NAME_MAX_LENGTH] if lines else ""
+
+RESPONSE_MODEL = "gemini-2.0-flash-lite"
+RESPONSE_TEMPERATURE = 0.7
+
+RESPONSE_SYSTEM_PROMPT = """
 You are an AI assistant that answers user questions using both prior conversation and structured data extracted from a product's packaging image.
 
 Here is the context extracted from the packaging:
@@ -63,31 +83,124 @@ Your responsibilities:
 
 **IMPORTANT**: Always respond in the same language as the user’s input (Vietnamese or English).
 """
-    
+
+RESPONSE_USER_PROMPT = """
+{summary}Previous conversation:
+{history_text}
+
+User: {message}
+
+Assistant:"""
+
+# Prompt text that is sent every turn regardless of the conversation
+RESPONSE_PROMPT_TOKENS = estimate_tokens(RESPONSE_SYSTEM_PROMPT, RESPONSE_USER_PROMPT)
+
+def build_response_prompts(context: ChatContext) -> Tuple[str, str]:
+    system_prompt = RESPONSE_SYSTEM_PROMPT.format(product_information=context.product_text)
 
     # Format chat history
     history_text = "\n".join([
         f"{msg['sender']}: {msg['text']}"
-        for msg in history_messages[-5:]  # Only use last 5 messages for context
+        for msg in context.history
     ])
-    
-    user_prompt = f"""
-Previous conversation:
-{history_text}
+    summary = f"Summary of earlier conversation:\n{context.summary}\n\n" if context.summary else ""
 
-User: {message}
+    user_prompt = RESPONSE_USER_PROMPT.format(summary=summary, history_text=history_text, message=context.message)
+    return system_prompt, user_prompt
 
-Assistant:"""
-    
-    
-    response = client.models.generate_content(
-        model="gemini-2.0-flash-lite",
-        contents=[
-            user_prompt,
-        ],
-        config={
-            "temperature": 0.7,
-            "system_instruction": SYSTEM_PROMPT
-        }
-    )
-    return response.text.strip() 
\ No newline at end of file
+def _response_config(system_prompt: str, cached_content: Optional[str]) -> Dict[str, Any]:
+    config = {"temperature": RESPONSE_TEMPERATURE}
+    if cached_content:
+        # The system prompt with the product information already lives in the cache
+        config["cached_content"] = cached_content
+    else:
+        config["system_instruction"] = system_prompt
+    return config
+
+def _resolve_cache(context: ChatContext, system_prompt: str) -> Optional[str]:
+    if is_stale(context.cache, RESPONSE_MODEL):
+        schedule_cache_refresh(context.chat_id, RESPONSE_MODEL, system_prompt)
+    return usable_cache(context.cache, RESPONSE_MODEL, system_prompt)
+
+async def generate_response(context: ChatContext) -> str:
+    client = get_gemini_client()
+    system_prompt, user_prompt = build_response_prompts(context)
+    cached_content = _resolve_cache(context, system_prompt)
+
+    async def generate(cached_content: Optional[str]):
+        return await call_model(
+            RESPONSE_MODEL,
+            lambda: client.aio.models.generate_content(
+                model=RESPONSE_MODEL,
+                contents=[
+                    user_prompt,
+                ],
+                config=_response_config(system_prompt, cached_content)
+            ),
+            estimate_tokens(system_prompt, user_prompt),
+            operation="chat_response",
+        )
+
+    try:
+        response = await generate(cached_content)
+    except Exception as e:
+        if not cached_content or not is_cache_miss(e):
+            raise
+        # The cache expired or was deleted on the API side: answer without it and recreate it
+        await forget_context_cache(context.chat_id, context.cache)
+        schedule_cache_refresh(context.chat_id, RESPONSE_MODEL, system_prompt)
+        response = await generate(None)
+    return response.text.strip()
+
+async def stream_response(context: ChatContext) -> AsyncIterator[str]:
+    client = get_gemini_client()
+    system_prompt, user_prompt = build_response_prompts(context)
+    cached_content = _resolve_cache(context, system_prompt)
+
+    def stream(cached_content: Optional[str]):
+        return stream_model(
+            RESPONSE_MODEL,
+            lambda: client.aio.models.generate_content_stream(
+                model=RESPONSE_MODEL,
+                contents=[
+                    user_prompt,
+                ],
+                config=_response_config(system_prompt, cached_content)
+            ),
+            estimate_tokens(system_prompt, user_prompt),
+            operation="chat_response_stream",
+        )
+
+    started = False
+    try:
+        async for chunk in stream(cached_content):
+            started = True
+            if chunk.text:
+                yield chunk.text
+        return
+    except Exception as e:
+        if started or not cached_content or not is_cache_miss(e):
+            raise
+        await forget_context_cache(context.chat_id, context.cache)
+        schedule_cache_refresh(context.chat_id, RESPONSE_MODEL, system_prompt)
+
+    async for chunk in stream(None):
+        if chunk.text:
+            yield chunk.text
+
+def cacheable_product_text(product_information: dict) -> Optional[str]:
+    # The whole product when its prompt reaches the cache minimum; smaller products fit each turn's budget
+    if not caching_available():
+        return None
+    # Long fields are only shortened when the whole product doesn't fit the cache budget
+    budget = settings.CONTEXT_CACHE_PRODUCT_TOKEN_BUDGET
+    product_text = serialize_product_info(product_information, budget, max_chars=budget * 4, max_items=budget)
+    if estimate_tokens(RESPONSE_SYSTEM_PROMPT.format(product_information=product_text)) < settings.CONTEXT_CACHE_MIN_TOKENS:
+        return None
+    return product_text
+
+def prepare_context_cache(chat_id: str, product_information: dict):
+    # Warm the cache when the chat is created so the first question can already use it
+    product_text = cacheable_product_text(product_information)
+    if product_text is not None:
+        schedule_cache_refresh(chat_id, RESPONSE_MODEL, RESPONSE_SYSTEM_PROMPT.format(product_information=product_text))
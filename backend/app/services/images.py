@@ -0,0 +1,112 @@
+import logging
+import asyncio
+import io
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional, Tuple, TypeVar
+
+from PIL import Image, ImageOps
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+# Formats the model accepts as-is, used when re-encoding would not help
+PASSTHROUGH_MIME_TYPES = {**OUTPUT_MIME_TYPES, "PNG": "image/png"}
+
+T = TypeVar("T")
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_image_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.IMAGE_PROCESS_WORKERS)
+    return _pool
+
+
+async def run_in_image_pool(func: Callable[..., T], *args: Any) -> T:
+    pool = get_image_pool()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, func, *args)
+    except BrokenProcessPool:
+        # A worker died (out of memory, a crash inside Pillow) and the pool refuses all work from now on:
+        # replace it, unless a concurrent call already did
+        global _pool
+        logger.error("Image process pool broke, starting a new one", extra={"function": func.__name__})
+        if _pool is pool:
+            _pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+        raise
+
+
+def shutdown_image_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+def detect_mime_type(data: bytes, fallback: str = "image/jpeg") -> str:
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return Image.MIME.get(image.format, fallback)
+    except Exception:
+        return fallback
+
+
+def flatten_image(image: Image.Image) -> Image.Image:
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    if image.mode != "RGB":
+        return image.convert("RGB")
+    return image
+
+
+def preprocess_image(data: bytes, max_edge: int, output_format: str, quality: int) -> Tuple[bytes, str]:
+    # Runs in a worker process: keep it free of app state
+    image = Image.open(io.BytesIO(data))
+    source_format = image.format
+    transposed = ImageOps.exif_transpose(image)
+    rotated = transposed is not image
+    image = transposed
+
+    resized = max(image.size) > max_edge
+    if resized:
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    buffer = io.BytesIO()
+    flatten_image(image).save(buffer, format=output_format, quality=quality, optimize=True)
+    encoded = buffer.getvalue()
+
+    # Small, upright images in a supported format are already as cheap as they get
+    if not resized and not rotated and source_format in PASSTHROUGH_MIME_TYPES and len(encoded) >= len(data):
+        return data, PASSTHROUGH_MIME_TYPES[source_format]
+    return encoded, OUTPUT_MIME_TYPES[output_format]
+
+
+async def prepare_image(data: bytes, content_type: Optional[str] = None) -> Tuple[bytes, str]:
+    fallback = content_type or "image/jpeg"
+    if not settings.IMAGE_PREPROCESS_ENABLED:
+        return data, detect_mime_type(data, fallback)
+
+    try:
+        return await run_in_image_pool(
+            preprocess_image,
+            data,
+            settings.IMAGE_MAX_EDGE,
+            settings.IMAGE_OUTPUT_FORMAT.upper(),
+            settings.IMAGE_QUALITY,
+        )
+    except BrokenProcessPool:
+        # Already logged; this image goes untouched, the next one gets the new pool
+        return data, fallback
+    except Exception as e:
+        # Formats Pillow can't decode (e.g. HEIC) are sent to the model untouched
+        logger.warning("Image preprocessing skipped: %s", e)
+        return data, fallback
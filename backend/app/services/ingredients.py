@@ -0,0 +1,225 @@
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.services.text import find_field, normalize, strip_accents, tokenize
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "ingredients.json")
+INGREDIENT_FIELD_NAMES = ("ingredients", "thành phần", "nguyên liệu")
+
+# "(471, 407)" after a category name, as Vietnamese labels write INS codes
+BARE_CODES_PATTERN = re.compile(r"\(((?:\s*\d{3,4}[a-z]?(?:\s*\([ivx]+\))?\s*[,;]?)+)\)")
+CODE_TOKEN_PATTERN = re.compile(r"^e?(\d{3,4}[a-z]?)$")
+TRACE_PATTERN = re.compile(r"\b(?:may contain|traces? of|co the chua|co the co)\b")
+UNITS = {"mg", "mcg", "ug", "kg", "ml", "iu", "kcal", "kj"}
+
+# Typos shorter than this are too likely to be a different word
+FUZZY_MIN_LENGTH = 5
+TERMINAL = "$"
+
+
+def _deletes(token: str) -> Set[str]:
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diff = [i for i in range(len(a)) if a[i] != b[i]]
+        # One substitution, or two swapped neighbours
+        return len(diff) == 1 or (len(diff) == 2 and diff[1] == diff[0] + 1 and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]])
+    shorter, longer = (a, b) if len(a) < len(b) else (b, a)
+    return any(longer[:i] + longer[i + 1:] == shorter for i in range(len(longer)))
+
+
+class IngredientIndex:
+    def __init__(self, data: Dict[str, Any]):
+        self.version = data.get("version", 1)
+        self.allergens = data["allergens"]
+        self.entries = {entry["id"]: entry for entry in data["ingredients"]}
+        # Word-level trie over normalized synonyms; the terminal holds the entry id ("" for words to skip)
+        self._trie: Dict[str, Any] = {}
+        self._codes: Dict[str, str] = {}
+        self._fuzzy: Dict[str, Set[str]] = {}
+        self._allergen_terms: Dict[str, str] = {}
+        for key, allergen in self.allergens.items():
+            for synonym in allergen["synonyms"]:
+                self._allergen_terms.setdefault(" ".join(tokenize(synonym)), key)
+                self._allergen_terms.setdefault(normalize(synonym), key)
+        for entry in data["ingredients"]:
+            for code in entry.get("codes", []):
+                self._codes[code] = entry["id"]
+
+        # Accented spellings first, then unaccented ones for labels and questions typed without accents.
+        # Real ingredients go before filler words, so they win when two spellings collide.
+        phrases = [(synonym, entry["id"]) for entry in data["ingredients"] for synonym in entry["synonyms"]]
+        phrases += [(phrase, "") for phrase in data.get("ignore", [])]
+        for phrase, entry_id in phrases:
+            self._insert(tokenize(phrase), entry_id)
+        for phrase, entry_id in phrases:
+            self._insert(normalize(phrase).split(), entry_id)
+
+    @classmethod
+    def load(cls, path: str) -> "IngredientIndex":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _insert(self, tokens: List[str], entry_id: str):
+        if not tokens:
+            return
+        node = self._trie
+        for token in tokens:
+            node = node.setdefault(token, {})
+        node.setdefault(TERMINAL, entry_id)
+        # Vietnamese syllables are a letter apart from each other ("hương", "đường"), so only ASCII names get typo matching
+        if entry_id and len(tokens) == 1 and len(tokens[0]) >= FUZZY_MIN_LENGTH and tokens[0].isascii():
+            for variant in _deletes(tokens[0]) | {tokens[0]}:
+                self._fuzzy.setdefault(variant, set()).add(tokens[0])
+
+    def _longest(self, tokens: List[str], start: int) -> Tuple[int, Optional[str]]:
+        node, best = self._trie, (0, None)
+        for i in range(start, len(tokens)):
+            node = node.get(tokens[i])
+            if node is None:
+                break
+            if TERMINAL in node:
+                best = (i - start + 1, node[TERMINAL])
+        return best
+
+    def _fuzzy_match(self, token: str) -> Optional[str]:
+        if len(token) < FUZZY_MIN_LENGTH or not token.isascii():
+            return None
+        candidates = set()
+        for variant in _deletes(token) | {token}:
+            candidates |= self._fuzzy.get(variant, set())
+        ids = {self._trie[word][TERMINAL] for word in candidates if _within_one_edit(token, word)}
+        # Two different ingredients one typo away: don't guess
+        return ids.pop() if len(ids) == 1 else None
+
+    def match(self, text: str) -> Tuple[List[str], bool]:
+        # (entry ids found in the text, whether every word was accounted for)
+        bare_codes = {code for group in BARE_CODES_PATTERN.findall(text.casefold()) for code in re.findall(r"\d{3,4}[a-z]?", group)}
+        tokens = tokenize(text)
+        plain = [strip_accents(token) for token in tokens]
+        ids: List[str] = []
+        recognized = True
+        i = 0
+        while i < len(tokens):
+            length, entry_id = self._longest(tokens, i)
+            if not length:
+                length, entry_id = self._longest(plain, i)
+            if length:
+                if entry_id:
+                    ids.append(entry_id)
+                i += length
+                continue
+
+            token = plain[i]
+            code = None
+            if token == "ins" and i + 1 < len(plain) and CODE_TOKEN_PATTERN.match(plain[i + 1]):
+                i += 1
+                code = CODE_TOKEN_PATTERN.match(plain[i]).group(1)
+            elif CODE_TOKEN_PATTERN.match(token) and (token.startswith("e") or token in bare_codes):
+                code = CODE_TOKEN_PATTERN.match(token).group(1)
+
+            if code:
+                entry_id = self._codes.get(f"e{code}")
+                if entry_id:
+                    ids.append(entry_id)
+                else:
+                    recognized = False
+            elif token.isdigit() or len(token) <= 2 or token in UNITS:
+                # Quantities, percentages and sub-codes like "(ii)"
+                pass
+            else:
+                entry_id = self._fuzzy_match(token)
+                if entry_id:
+                    ids.append(entry_id)
+                else:
+                    recognized = False
+            i += 1
+        return list(dict.fromkeys(ids)), recognized
+
+    def resolve(self, term: str) -> Optional[Tuple[str, str]]:
+        # What a user asks about: ("allergen", key) or ("ingredient", id)
+        tokens = tokenize(term)
+        plain = [strip_accents(token) for token in tokens]
+        for key in (" ".join(tokens), " ".join(plain)):
+            if key in self._allergen_terms:
+                return "allergen", self._allergen_terms[key]
+        for words in (tokens, plain):
+            length, entry_id = self._longest(words, 0)
+            if words and length == len(words):
+                # A filler word ("của") is not its unaccented twin ("cua", crab)
+                return ("ingredient", entry_id) if entry_id else None
+        code = CODE_TOKEN_PATTERN.match("".join(plain).removeprefix("ins"))
+        if code and self._codes.get(f"e{code.group(1)}"):
+            return "ingredient", self._codes[f"e{code.group(1)}"]
+        if len(tokens) == 1:
+            entry_id = self._fuzzy_match(tokens[0])
+            if entry_id:
+                return "ingredient", entry_id
+        return None
+
+    def allergen_name(self, key: str, language: str) -> str:
+        return self.allergens[key]["names"][language]
+
+    def analyze(self, ingredients: List[str]) -> Dict[str, Any]:
+        annotated = []
+        allergens, possible, traces = set(), set(), set()
+        unrecognized = []
+        for text in ingredients:
+            if not isinstance(text, str) or not text.strip():
+                continue
+            ids, recognized = self.match(text)
+            item_allergens = sorted({key for entry_id in ids for key in self.entries[entry_id]["allergens"]})
+            item_possible = sorted({key for entry_id in ids for key in self.entries[entry_id].get("possible", [])})
+            is_trace = bool(TRACE_PATTERN.search(normalize(text)))
+            annotated.append({
+                "text": text,
+                "ids": ids,
+                "allergens": item_allergens,
+                "possible": item_possible,
+                "traces": is_trace,
+                "recognized": recognized,
+            })
+            (traces if is_trace else allergens).update(item_allergens)
+            possible.update(item_possible)
+            if not recognized:
+                unrecognized.append(text)
+
+        return {
+            "version": self.version,
+            "ingredients": annotated,
+            "allergens": sorted(allergens),
+            "possible": sorted(possible - allergens),
+            "traces": sorted(traces - allergens),
+            "unrecognized": unrecognized,
+        }
+
+
+ingredient_index = IngredientIndex.load(settings.INGREDIENT_INDEX_PATH or DEFAULT_INDEX_PATH)
+
+
+def analyze_ingredients(product_information: Dict[str, Any]) -> Dict[str, Any]:
+    ingredients = find_field(product_information or {}, INGREDIENT_FIELD_NAMES) or []
+    if isinstance(ingredients, str):
+        ingredients = [ingredients]
+    return ingredient_index.analyze(ingredients)
+
+
+def with_allergens(product_information: Dict[str, Any], analysis: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    # Give the model the precomputed allergens so it doesn't re-derive them every turn
+    if not analysis or not (analysis["allergens"] or analysis["traces"]):
+        return product_information
+    facts = dict(product_information)
+    if analysis["allergens"]:
+        facts["allergens"] = [ingredient_index.allergen_name(key, "en") for key in analysis["allergens"]]
+    if analysis["traces"]:
+        facts["mayContainTraces"] = [ingredient_index.allergen_name(key, "en") for key in analysis["traces"]]
+    return facts
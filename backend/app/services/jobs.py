@@ -0,0 +1,222 @@
+import logging
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from bson import Binary, ObjectId
+from pymongo import ASCENDING, ReturnDocument
+
+from app.core.config import settings
+from app.core.database import get_database
+from app.services.pipeline import run_extraction
+
+logger = logging.getLogger(__name__)
+
+JOB_COLLECTION = "extraction_jobs"
+FINISHED_STATUSES = ("succeeded", "failed")
+ABANDONED_ERROR = "Worker stopped while processing the job"
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class JobWorkers:
+    tasks: List[asyncio.Task] = []
+    wakeup: Optional[asyncio.Event] = None
+    # Tells this process's workers apart from other processes' in the jobs' workerId
+    instance: str = uuid.uuid4().hex[:12]
+
+
+workers = JobWorkers()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _collection():
+    return get_database()[JOB_COLLECTION]
+
+
+async def ensure_job_indexes():
+    collection = _collection()
+    await collection.create_index([("status", ASCENDING), ("availableAt", ASCENDING)])
+    await collection.create_index([("status", ASCENDING), ("leaseExpiresAt", ASCENDING)])
+    await collection.create_index([("finishedAt", ASCENDING)], expireAfterSeconds=settings.JOB_RETENTION)
+
+
+def serialize_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    job = {key: value for key, value in job.items() if key not in ("image", "leaseExpiresAt", "workerId")}
+    job["_id"] = str(job["_id"])
+    return job
+
+
+async def _insert_job(image: bytes, content_type: Optional[str], mode: Optional[str], backend: Optional[str]) -> Dict[str, Any]:
+    collection = _collection()
+    queued = await collection.count_documents({"status": "queued"}, limit=settings.JOB_MAX_QUEUED)
+    if queued >= settings.JOB_MAX_QUEUED:
+        raise QueueFullError("Extraction queue is full, retry later")
+
+    now = _now()
+    job = {
+        "status": "queued",
+        "image": Binary(image),
+        "contentType": content_type,
+        "mode": mode,
+        "backend": backend,
+        "attempts": 0,
+        "maxAttempts": settings.JOB_MAX_ATTEMPTS,
+        "result": None,
+        "cached": None,
+        "error": None,
+        "createdAt": now,
+        "updatedAt": now,
+        "availableAt": now,
+    }
+    result = await collection.insert_one(job)
+    job["_id"] = result.inserted_id
+    return job
+
+
+async def enqueue_job(
+    image: bytes,
+    content_type: Optional[str] = None,
+    mode: Optional[str] = None,
+    backend: Optional[str] = None,
+) -> Dict[str, Any]:
+    job = await _insert_job(image, content_type, mode, backend)
+    if workers.wakeup is not None:
+        workers.wakeup.set()
+    return serialize_job(job)
+
+
+async def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    job = await _collection().find_one({"_id": ObjectId(job_id)}, {"image": 0})
+    return serialize_job(job) if job else None
+
+
+async def _fail_abandoned_jobs():
+    # A job whose worker died on every attempt (e.g. an image that crashes it) is not taken over again
+    now = _now()
+    await _collection().update_many(
+        {"status": "running", "leaseExpiresAt": {"$lte": now}, "$expr": {"$gte": ["$attempts", "$maxAttempts"]}},
+        {
+            "$set": {"status": "failed", "error": ABANDONED_ERROR, "updatedAt": now, "finishedAt": now},
+            "$unset": {"image": "", "leaseExpiresAt": "", "workerId": ""},
+        },
+    )
+
+
+async def _claim_job(worker_id: str) -> Optional[Dict[str, Any]]:
+    now = _now()
+    # Running jobs whose lease ran out belong to a worker that died; take them over while attempts are left
+    return await _collection().find_one_and_update(
+        {"$or": [
+            {"status": "queued", "availableAt": {"$lte": now}},
+            {"status": "running", "leaseExpiresAt": {"$lte": now}, "$expr": {"$lt": ["$attempts", "$maxAttempts"]}},
+        ]},
+        {
+            "$set": {
+                "status": "running",
+                "workerId": worker_id,
+                "startedAt": now,
+                "updatedAt": now,
+                "leaseExpiresAt": now + timedelta(seconds=settings.JOB_LEASE_SECONDS),
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("createdAt", ASCENDING)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def _lease_filter(job: Dict[str, Any]) -> Dict[str, Any]:
+    # Matches only while this claim still holds the job: a worker whose lease expired and was
+    # taken over must not overwrite the new owner's job
+    return {"_id": job["_id"], "status": "running", "workerId": job["workerId"], "leaseExpiresAt": job["leaseExpiresAt"]}
+
+
+async def _update_claimed_job(job: Dict[str, Any], update: Dict[str, Any]):
+    result = await _collection().update_one(_lease_filter(job), update)
+    if not result.matched_count:
+        logger.warning("Extraction job was taken over, dropping this attempt's outcome", extra={"job_id": str(job["_id"])})
+
+
+async def _complete_job(job: Dict[str, Any], result: Dict[str, Any], cached: bool):
+    now = _now()
+    await _update_claimed_job(job, {
+        "$set": {"status": "succeeded", "result": result, "cached": cached, "error": None, "updatedAt": now, "finishedAt": now},
+        "$unset": {"image": "", "leaseExpiresAt": "", "workerId": ""},
+    })
+
+
+async def _fail_job(job: Dict[str, Any], error: str):
+    now = _now()
+    if job["attempts"] < job["maxAttempts"]:
+        delay = settings.JOB_RETRY_BACKOFF * 2 ** (job["attempts"] - 1)
+        update = {
+            "$set": {"status": "queued", "error": error, "updatedAt": now, "availableAt": now + timedelta(seconds=delay)},
+            "$unset": {"leaseExpiresAt": "", "workerId": ""},
+        }
+    else:
+        update = {
+            "$set": {"status": "failed", "error": error, "updatedAt": now, "finishedAt": now},
+            "$unset": {"image": "", "leaseExpiresAt": "", "workerId": ""},
+        }
+    await _update_claimed_job(job, update)
+
+
+async def _process_job(job: Dict[str, Any]):
+    try:
+        result, cached = await run_extraction(bytes(job["image"]), job.get("contentType"), job.get("mode"), job.get("backend"))
+    except Exception as e:
+        logger.warning("Extraction job failed: %s", e, extra={"job_id": str(job["_id"]), "attempt": job["attempts"]})
+        await _fail_job(job, str(e))
+        return
+    await _complete_job(job, result, cached)
+
+
+async def _worker_loop(worker_id: int):
+    owner = f"{workers.instance}-{worker_id}"
+    while True:
+        # Clear before claiming so an enqueue during the claim still wakes us
+        workers.wakeup.clear()
+        try:
+            await _fail_abandoned_jobs()
+            job = await _claim_job(owner)
+        except Exception as e:
+            logger.error("Job worker could not claim a job: %s", e, extra={"worker_id": worker_id})
+            job = None
+
+        if job is None:
+            try:
+                await asyncio.wait_for(workers.wakeup.wait(), timeout=settings.JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        try:
+            await _process_job(job)
+        except Exception as e:
+            # Recording the outcome failed (e.g. Mongo is down): the lease expiry hands the job to a
+            # worker again, and this one keeps serving the queue
+            logger.exception("Job worker could not finish a job: %s", e, extra={"worker_id": worker_id, "job_id": str(job["_id"])})
+
+
+async def start_job_workers():
+    if not settings.JOB_WORKERS_ENABLED or workers.tasks:
+        return
+    await ensure_job_indexes()
+    workers.wakeup = asyncio.Event()
+    workers.tasks = [asyncio.create_task(_worker_loop(i)) for i in range(settings.JOB_WORKERS)]
+    logger.info("Started %d extraction job workers", settings.JOB_WORKERS)
+
+
+async def stop_job_workers():
+    # Interrupted jobs keep their lease and are picked up again once it expires
+    for task in workers.tasks:
+        task.cancel()
+    await asyncio.gather(*workers.tasks, return_exceptions=True)
+    workers.tasks = []
@@ -0,0 +1,93 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+
+from app.core.database import get_database
+
+MESSAGE_COLLECTION = "messages"
+MESSAGE_FIELDS = {"_id": 0, "chatId": 0}
+
+
+def _collection(db=None):
+    return (db if db is not None else get_database())[MESSAGE_COLLECTION]
+
+
+async def ensure_message_indexes():
+    await _collection().create_index([("chatId", ASCENDING), ("seq", ASCENDING)], unique=True)
+
+
+def new_message(sender: str, text: str) -> Dict[str, Any]:
+    return {
+        "sender": sender,
+        "text": text,
+        "timestamp": datetime.now(timezone.utc)
+    }
+
+
+async def append_messages(db, chat_id: str, messages: List[Dict[str, Any]]) -> bool:
+    # Reserve a block of sequence numbers atomically so concurrent appends never collide
+    chat = await db.chats.find_one_and_update(
+        {"_id": ObjectId(chat_id)},
+        {"$inc": {"messageCount": len(messages)}},
+        projection={"messageCount": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not chat:
+        return False
+
+    first_seq = chat["messageCount"] - len(messages) + 1
+    docs = [
+        {**message, "chatId": ObjectId(chat_id), "seq": first_seq + i}
+        for i, message in enumerate(messages)
+    ]
+    await _collection(db).insert_many(docs)
+    for message, doc in zip(messages, docs):
+        message["seq"] = doc["seq"]
+    return True
+
+
+async def get_recent_messages(db, chat_id: str, limit: int) -> List[Dict[str, Any]]:
+    cursor = _collection(db).find({"chatId": ObjectId(chat_id)}, MESSAGE_FIELDS).sort("seq", DESCENDING).limit(limit)
+    return (await cursor.to_list())[::-1]
+
+
+async def get_first_messages(db, chat_id: str, limit: int) -> List[Dict[str, Any]]:
+    cursor = _collection(db).find({"chatId": ObjectId(chat_id)}, MESSAGE_FIELDS).sort("seq", ASCENDING).limit(limit)
+    return await cursor.to_list()
+
+
+async def get_messages_between(db, chat_id: str, after_seq: int, up_to_seq: int, limit: int = 50) -> List[Dict[str, Any]]:
+    query = {"chatId": ObjectId(chat_id), "seq": {"$gt": after_seq, "$lte": up_to_seq}}
+    cursor = _collection(db).find(query, MESSAGE_FIELDS).sort("seq", ASCENDING).limit(limit)
+    return await cursor.to_list()
+
+
+async def list_messages(db, chat_id: str, before: Optional[int], limit: int) -> Dict[str, Any]:
+    # Pages walk backwards from the newest message; each page is returned oldest first
+    query: Dict[str, Any] = {"chatId": ObjectId(chat_id)}
+    if before is not None:
+        query["seq"] = {"$lt": before}
+    cursor = _collection(db).find(query, MESSAGE_FIELDS).sort("seq", DESCENDING).limit(limit + 1)
+    page = await cursor.to_list()
+    has_more = len(page) > limit
+    page = page[:limit][::-1]
+    return {
+        "messages": page,
+        "nextCursor": page[0]["seq"] if has_more else None,
+    }
+
+
+async def delete_last_messages(db, chat_id: str, count: int) -> int:
+    # Sequence numbers are never reused, so later appends simply continue after the gap
+    tail = _collection(db).find({"chatId": ObjectId(chat_id)}, {"_id": 1}).sort("seq", DESCENDING).limit(count)
+    ids = [doc["_id"] async for doc in tail]
+    if not ids:
+        return 0
+    result = await _collection(db).delete_many({"_id": {"$in": ids}})
+    return result.deleted_count
+
+
+async def delete_chat_messages(db, chat_id: str):
+    await _collection(db).delete_many({"chatId": ObjectId(chat_id)})
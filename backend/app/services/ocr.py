@@ -0,0 +1,153 @@
+import logging
+import io
+import re
+from typing import Any, Dict, List, Optional
+
+from PIL import Image, ImageOps
+
+from app.core.config import settings
+from app.services.images import run_in_image_pool
+from app.services.text import normalize
+
+logger = logging.getLogger(__name__)
+
+# Headings that open an ingredient declaration, as unaccented word sequences
+INGREDIENT_HEADINGS = [("ingredients",), ("ingredient",), ("thanh", "phan"), ("nguyen", "lieu"), ("zutaten",), ("composition",)]
+# Headings that start the next section of the label
+SECTION_HEADINGS = [
+    ("nutrition",), ("storage",), ("directions",), ("usage",), ("allergy",), ("allergen",), ("manufactured",),
+    ("huong", "dan"), ("bao", "quan"), ("thong", "tin", "dinh", "duong"), ("nha", "san", "xuat"), ("han", "su", "dung"),
+]
+VIETNAMESE_LETTERS = re.compile(r"[ăâđêôơưạảấầẩẫậắằẳẵặẹẻẽếềểễệỉịọỏốồổỗộớờởỡợụủứừửữựỳỵỷỹ]")
+# A heading OCR glued to the first ingredient ("INGREDIENTS:Water,")
+HEADING_PREFIX = re.compile(r"^\W*(?:ingr[eé]dients?|thành phần|nguyên liệu|zutaten|composition)\s*[:：.-]?\s*", re.IGNORECASE)
+AMOUNT_PATTERN = re.compile(r"\(?\s*(\d+(?:[.,]\d+)?\s?(?:%|mg|g|kg|ml|l))\s*\)?", re.IGNORECASE)
+
+
+class OcrUnavailableError(Exception):
+    pass
+
+
+def _find_heading(words: List[str], start: int, headings) -> Optional[int]:
+    # Length of the heading that starts at this word, if any
+    for heading in headings:
+        if tuple(words[start:start + len(heading)]) == heading:
+            return len(heading)
+    return None
+
+
+def locate_ingredients(data: bytes, languages: str, padding: float, timeout: int) -> Optional[Dict[str, Any]]:
+    # Runs in a worker process: keep it free of app state
+    try:
+        import pytesseract
+    except ImportError:
+        raise OcrUnavailableError("pytesseract is not installed")
+
+    image = Image.open(io.BytesIO(data))
+    image = ImageOps.exif_transpose(image).convert("RGB")
+    gray = ImageOps.autocontrast(image.convert("L"))
+    ocr = pytesseract.image_to_data(gray, lang=languages, timeout=timeout, output_type=pytesseract.Output.DICT)
+
+    boxes = []
+    for i, text in enumerate(ocr["text"]):
+        word = normalize(text)
+        if not word or float(ocr["conf"][i]) < 0:
+            continue
+        for part in word.split():
+            boxes.append({
+                "word": part,
+                "index": i,
+                "block": (ocr["block_num"][i], ocr["par_num"][i]),
+                "conf": float(ocr["conf"][i]),
+                "box": (ocr["left"][i], ocr["top"][i], ocr["left"][i] + ocr["width"][i], ocr["top"][i] + ocr["height"][i]),
+            })
+    words = [box["word"] for box in boxes]
+
+    start = next((i for i in range(len(words)) if _find_heading(words, i, INGREDIENT_HEADINGS)), None)
+    if start is None:
+        return None
+    heading_length = _find_heading(words, start, INGREDIENT_HEADINGS)
+
+    # The declaration is the heading's paragraph, up to the next section heading
+    block = boxes[start]["block"]
+    panel = boxes[start:start + heading_length]
+    for i in range(start + heading_length, len(boxes)):
+        if boxes[i]["block"] != block or _find_heading(words, i, SECTION_HEADINGS):
+            break
+        panel.append(boxes[i])
+    body = panel[heading_length:]
+    if not body:
+        return None
+
+    left = min(box["box"][0] for box in panel)
+    top = min(box["box"][1] for box in panel)
+    right = max(box["box"][2] for box in panel)
+    bottom = max(box["box"][3] for box in panel)
+    pad_x, pad_y = int(image.width * padding), int(image.height * padding)
+    crop_box = (max(0, left - pad_x), max(0, top - pad_y), min(image.width, right + pad_x), min(image.height, bottom + pad_y))
+
+    # One OCR word can hold several normalized words ("(sữa,đường)"); keep each OCR word once
+    indices = list(dict.fromkeys(box["index"] for box in body))
+    text = " ".join(ocr["text"][i] for i in indices)
+    # Words split over a line break: "stabi- liser"
+    text = HEADING_PREFIX.sub("", re.sub(r"(\w)- (\w)", r"\1\2", text))
+
+    buffer = io.BytesIO()
+    image.crop(crop_box).save(buffer, format="JPEG", quality=90)
+    crop_area = (crop_box[2] - crop_box[0]) * (crop_box[3] - crop_box[1])
+    return {
+        "crop": buffer.getvalue(),
+        "mimeType": "image/jpeg",
+        "cropRatio": crop_area / (image.width * image.height),
+        "text": text.strip(),
+        "confidence": sum(box["conf"] for box in body) / len(body),
+    }
+
+
+def split_ingredients(text: str) -> List[str]:
+    # Commas inside parentheses belong to a compound ingredient: "chocolate (sugar, cocoa)"
+    items, depth, current = [], 0, []
+    for char in text:
+        if char in "([":
+            depth += 1
+        elif char in ")]":
+            depth = max(0, depth - 1)
+        if char in ",;" and depth == 0:
+            items.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+    items.append("".join(current))
+    return [item.strip(" .\n") for item in items if item.strip(" .\n")]
+
+
+def parse_ingredients(text: str) -> Dict[str, Any]:
+    # Same shape as IngredientsOutputFormat, so it can stand in for the model's answer
+    ingredients, amounts = [], []
+    for item in split_ingredients(HEADING_PREFIX.sub("", text)):
+        amount = AMOUNT_PATTERN.search(item)
+        amounts.append(amount.group(1).replace(" ", "") if amount else "")
+        name = AMOUNT_PATTERN.sub("", item).strip() if amount else item
+        ingredients.append(name or item)
+    language = "Vietnamese" if VIETNAMESE_LETTERS.search(text.casefold()) else "English"
+    return {"ingredients": ingredients, "amounts": amounts, "language": language}
+
+
+async def run_ocr(image: bytes) -> Optional[Dict[str, Any]]:
+    if not settings.OCR_ENABLED:
+        return None
+    try:
+        located = await run_in_image_pool(
+            locate_ingredients,
+            image,
+            settings.OCR_LANGUAGES,
+            settings.OCR_CROP_PADDING,
+            settings.OCR_TIMEOUT,
+        )
+    except Exception as e:
+        # OCR is only an optimisation: without it the model reads the whole image
+        logger.warning("OCR skipped: %s", e)
+        return None
+    if located is None or located["cropRatio"] > settings.OCR_MAX_CROP_RATIO:
+        return None
+    return located
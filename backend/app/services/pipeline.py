@@ -0,0 +1,34 @@
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.tracing import span
+from app.services.cache import extraction_cache, get_cached_extraction
+from app.services.extractor import extract_product_info
+from app.services.images import prepare_image
+from app.services.ocr import run_ocr
+
+
+async def run_extraction(
+    image: bytes,
+    content_type: Optional[str] = None,
+    mode: Optional[str] = None,
+    backend: Optional[str] = None,
+) -> Tuple[Dict[str, Any], bool]:
+    mode = mode or settings.EXTRACTION_MODE
+    with span("extraction.run", {"extraction.mode": mode, "vision.backend": backend, "image.bytes": len(image)}):
+        cached_result, cache_key, phash = await get_cached_extraction(image, mode, backend)
+        if cached_result is not None:
+            return cached_result, True
+
+        with span("image.prepare"):
+            prepared_image, mime_type = await prepare_image(image, content_type)
+        # Only the separate ingredients call can use a crop; combined mode needs the whole label
+        if mode == "parallel":
+            with span("ocr.run"):
+                ocr = await run_ocr(prepared_image)
+        else:
+            ocr = None
+        result = await extract_product_info(prepared_image, mode, mime_type, ocr, backend)
+
+        await extraction_cache.set(cache_key, result, phash)
+        return result, False
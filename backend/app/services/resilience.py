@@ -0,0 +1,349 @@
+import asyncio
+import random
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import MODEL_FIRST_CHUNK_SECONDS, record_model_call, record_model_error, record_usage
+from app.core.model_client import is_gemini_api_error
+from app.core.tracing import span, start_span
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class ModelUnavailableError(Exception):
+    def __init__(self, model: str, reason: str, retry_after: float = 1.0):
+        super().__init__(f"{model} is unavailable: {reason}")
+        self.model = model
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.max_rate = per_minute / 60.0
+        self.rate = self.max_rate
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, amount: float = 1.0):
+        # Requests larger than the bucket would never fit; let them drain it instead
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def wait_time(self, amount: float = 1.0) -> float:
+        # How long an acquire of this size would wait right now
+        self._refill()
+        return max(0.0, min(amount, self.capacity) - self.tokens) / self.rate
+
+    def adjust(self, amount: float):
+        # Settle the difference between estimated and reported usage
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+    def throttle(self):
+        # Multiplicative decrease when the API says we're over quota
+        self.rate = max(self.max_rate * settings.MODEL_RATE_FLOOR, self.rate / 2)
+
+    def recover(self):
+        # Additive increase back towards the configured rate
+        self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_in_flight:
+            # Let a single request probe whether the model has recovered
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def release_trial(self):
+        # The probe ended without a result (cancelled), so the next request probes instead
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class RetryBudget:
+    # Retries may add at most `ratio` extra load on top of first attempts
+    def __init__(self, ratio: float, capacity: float = 10.0):
+        self.ratio = ratio
+        self.capacity = capacity
+        self.balance = capacity
+
+    def deposit(self):
+        self.balance = min(self.capacity, self.balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.balance < 1:
+            return False
+        self.balance -= 1
+        return True
+
+
+class ModelGuard:
+    def __init__(self, model: str):
+        limits = settings.MODEL_RATE_LIMITS.get(model, {})
+        self.model = model
+        self.requests = TokenBucket(limits.get("rpm", settings.DEFAULT_MODEL_RPM))
+        self.tokens = TokenBucket(limits.get("tpm", settings.DEFAULT_MODEL_TPM))
+        self.breaker = CircuitBreaker(settings.CIRCUIT_FAILURE_THRESHOLD, settings.CIRCUIT_RESET_TIMEOUT)
+
+    async def acquire(self, estimated_tokens: int):
+        await self.requests.acquire(1)
+        await self.tokens.acquire(estimated_tokens)
+
+    def wait_time(self, estimated_tokens: int = 0) -> float:
+        return max(self.requests.wait_time(1), self.tokens.wait_time(estimated_tokens))
+
+    def throttle(self):
+        self.requests.throttle()
+        self.tokens.throttle()
+
+    def recover(self):
+        self.requests.recover()
+        self.tokens.recover()
+
+
+_guards: Dict[str, ModelGuard] = {}
+retry_budget = RetryBudget(settings.MODEL_RETRY_BUDGET_RATIO)
+
+
+def get_guard(model: str) -> ModelGuard:
+    if model not in _guards:
+        _guards[model] = ModelGuard(model)
+    return _guards[model]
+
+
+def status_code(error: Exception) -> Optional[int]:
+    if is_gemini_api_error(error):
+        return error.code
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code
+    if isinstance(error, httpx.TimeoutException):
+        return 408
+    if isinstance(error, httpx.TransportError):
+        return 503
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    return status_code(error) in RETRYABLE_STATUS_CODES
+
+
+def is_client_error(error: Exception) -> bool:
+    # The API answered and rejected the request itself (bad input, missing cache, no permission)
+    code = status_code(error)
+    return code is not None and 400 <= code < 500 and code not in RETRYABLE_STATUS_CODES
+
+
+def backoff_delay(attempt: int) -> float:
+    # Full jitter keeps retrying clients from synchronizing
+    ceiling = min(settings.MODEL_RETRY_MAX_DELAY, settings.MODEL_RETRY_BASE_DELAY * 2 ** attempt)
+    return random.uniform(0, ceiling)
+
+
+def _reported_tokens(response: Any) -> Optional[int]:
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "total_token_count", None) if usage else None
+
+
+def _admit(guard: ModelGuard) -> bool:
+    # True when this request is the half-open probe: it must record a result or release the trial
+    probing = guard.breaker.state == "half_open"
+    if not guard.breaker.allow():
+        raise ModelUnavailableError(guard.model, "circuit open", guard.breaker.retry_after())
+    return probing
+
+
+def _release(guard: ModelGuard, probing: bool):
+    # A probe that was cancelled (or otherwise ended without a verdict) must not hold the trial forever
+    if probing and guard.breaker.trial_in_flight:
+        guard.breaker.release_trial()
+
+
+async def _handle_failure(guard: ModelGuard, error: Exception, attempt: int, probing: bool):
+    # Re-raises when the error should reach the caller, otherwise waits before the next attempt
+    if not is_retryable(error):
+        if is_client_error(error):
+            # The request itself was bad; the model is fine
+            guard.breaker.record_success()
+        else:
+            # A parse error, a bug or a client-side failure says nothing about the model
+            _release(guard, probing)
+        raise error
+    guard.breaker.record_failure()
+    if status_code(error) == 429:
+        guard.throttle()
+    if attempt >= settings.MODEL_MAX_RETRIES or not retry_budget.withdraw():
+        raise ModelUnavailableError(guard.model, str(error), backoff_delay(attempt)) from error
+    await asyncio.sleep(backoff_delay(attempt))
+
+
+def _record_success(guard: ModelGuard, estimated_tokens: int, response: Any = None):
+    guard.breaker.record_success()
+    guard.recover()
+    retry_budget.deposit()
+    reported = _reported_tokens(response)
+    if reported is not None:
+        guard.tokens.adjust(reported - estimated_tokens)
+
+
+def _span_attributes(model: str, operation: str) -> Dict[str, Any]:
+    return {"gen_ai.request.model": model, "gen_ai.operation.name": operation}
+
+
+def _annotate(current: Any, attempts: int, tokens: Dict[str, int]):
+    if current is None:
+        return
+    current.set_attribute("model.attempts", attempts)
+    if tokens:
+        current.set_attribute("gen_ai.usage.input_tokens", tokens["input"])
+        current.set_attribute("gen_ai.usage.output_tokens", tokens["output"])
+
+
+def _outcome(error: BaseException) -> str:
+    if isinstance(error, ModelUnavailableError):
+        return "unavailable"
+    if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+        return "cancelled"
+    return "error"
+
+
+async def call_model(
+    model: str,
+    call: Callable[[], Awaitable[T]],
+    estimated_tokens: int = 0,
+    operation: str = "generate",
+) -> T:
+    guard = get_guard(model)
+    started_at = time.perf_counter()
+    with span("model.call", _span_attributes(model, operation)) as current:
+        attempt = 0
+        probing = False
+        try:
+            probing = _admit(guard)
+            while True:
+                await guard.acquire(estimated_tokens)
+                try:
+                    response = await call()
+                except Exception as e:
+                    record_model_error(model, operation, status_code(e) or type(e).__name__)
+                    was_probing, probing = probing, False
+                    await _handle_failure(guard, e, attempt, was_probing)
+                    attempt += 1
+                    probing = _admit(guard)
+                    continue
+                _record_success(guard, estimated_tokens, response)
+                break
+        except BaseException as e:
+            _release(guard, probing)
+            record_model_call(model, operation, _outcome(e), started_at)
+            raise
+        record_model_call(model, operation, "success", started_at)
+        _annotate(current, attempt + 1, record_usage(model, operation, response))
+        return response
+
+
+async def stream_model(
+    model: str,
+    open_stream: Callable[[], Awaitable[AsyncIterator[T]]],
+    estimated_tokens: int = 0,
+    operation: str = "stream",
+) -> AsyncIterator[T]:
+    guard = get_guard(model)
+    started_at = time.perf_counter()
+    current = start_span("model.stream", _span_attributes(model, operation))
+    outcome = "error"
+    attempt = 0
+    probing = False
+    try:
+        probing = _admit(guard)
+        while True:
+            await guard.acquire(estimated_tokens)
+            started = False
+            last_chunk = None
+            try:
+                async for chunk in await open_stream():
+                    if not started:
+                        MODEL_FIRST_CHUNK_SECONDS.labels(model, operation).observe(time.perf_counter() - started_at)
+                    started = True
+                    last_chunk = chunk
+                    yield chunk
+            except Exception as e:
+                record_model_error(model, operation, status_code(e) or type(e).__name__)
+                # Once tokens reached the client a retry would duplicate them
+                if started:
+                    guard.breaker.record_failure()
+                    raise
+                was_probing, probing = probing, False
+                await _handle_failure(guard, e, attempt, was_probing)
+                attempt += 1
+                probing = _admit(guard)
+                continue
+            _record_success(guard, estimated_tokens, last_chunk)
+            outcome = "success"
+            _annotate(current, attempt + 1, record_usage(model, operation, last_chunk))
+            return
+    except BaseException as e:
+        _release(guard, probing)
+        outcome = _outcome(e)
+        raise
+    finally:
+        record_model_call(model, operation, outcome, started_at)
+        if current is not None:
+            current.end()
+
+
+def estimate_tokens(*texts: str, images: int = 0) -> int:
+    # Rough pre-call estimate (~4 characters per token, ~258 tokens per image)
+    return sum(len(text) for text in texts) // 4 + images * 258
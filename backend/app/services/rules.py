@@ -0,0 +1,256 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.ingredients import analyze_ingredients, ingredient_index
+from app.services.text import find_field, normalize, strip_accents, tokenize
+
+# What a question may refer to the product as, e.g. "the expiry date of this product", "hạn sử dụng của sản phẩm này"
+EN_PRODUCT = r"(?:it|this(?: (?:product|package|pack|bottle|box|can))?|the (?:product|package|pack|bottle|box|can))"
+VI_PRODUCT = r"(?:san pham|no|cai nay|goi|hop|chai|lon|thung)(?: nay)?"
+
+# A field is asked about by name, in a question that says nothing else:
+# "what is the brand?", "brand name please", "thương hiệu là gì?", "hsd"
+NOUN_FRAMES = {
+    "en": (
+        r"(?:(?:(?:can|could|would) you (?:please )?)?(?:tell|show|give) me |i (?:want|would like|d like) to know |do you know )?"
+        r"(?:(?:what|when|where|who|which) (?:is|s|are|was|were) |whats )?(?:the |its |this product s |the product s )?",
+        rf"(?: (?:of|on) {EN_PRODUCT})?(?: please)?",
+    ),
+    "vi": (
+        rf"(?:(?:cho )?(?:toi|minh|em) (?:muon )?(?:biet|hoi) )?(?:{VI_PRODUCT} (?:co )?)?",
+        rf"(?: (?:cua )?{VI_PRODUCT})?(?: (?:la|o|vao|den|tu))?"
+        r"(?: (?:gi|bao nhieu|khi nao|luc nao|bao gio|o dau|dau|ngay nao|nao|ai|the nao|nhu the nao|ra sao))?"
+        r"(?: (?:vay|a|the|nhi|ha|nhe))?",
+    ),
+}
+
+# intent -> (product field names, {language: (field nouns, whole questions)}). Patterns run on lowercased
+# text without Vietnamese accents, so "hạn sử dụng" and "han su dung" both match, and must match the
+# whole question: "is this brand vegan?" or "who makes the packaging?" go to the model
+FIELD_INTENTS = {
+    "expiry_date": (("expiry date", "hạn sử dụng", "ngày hết hạn"), {
+        "en": ([r"expir(?:y|ation)(?: date)?", r"exp date", r"best before(?: date)?", r"use by(?: date)?", r"shelf life"],
+               [rf"when (?:does|will) {EN_PRODUCT} expire"]),
+        "vi": ([r"han su dung", r"hsd", r"han dung", r"ngay het han", r"het han"], []),
+    }),
+    "manufacturing_date": (("manufacturing date", "ngày sản xuất"), {
+        "en": ([r"manufactur(?:ing|e) date", r"date of manufacture", r"production date", r"mfg(?: date)?"],
+               [rf"when (?:was|is) {EN_PRODUCT} (?:made|produced|manufactured)"]),
+        "vi": ([r"ngay san xuat", r"nsx", r"ngay sx"],
+               [rf"(?:{VI_PRODUCT} )?(?:duoc )?san xuat (?:vao )?(?:ngay nao|khi nao|luc nao|bao gio)"]),
+    }),
+    "net_content": (("net content", "khối lượng tịnh", "trọng lượng tịnh", "thể tích thực", "khối lượng"), {
+        "en": ([r"net (?:content|contents|weight|wt|volume|quantity)", r"weight", r"volume"],
+               [rf"how (?:much|heavy|big) (?:does|is) {EN_PRODUCT}(?: weigh)?",
+                rf"how (?:many|much) (?:grams?|g|kg|ml|l|litres?|liters?|oz) (?:is|are|does|in) {EN_PRODUCT}(?: (?:have|contain|hold))?"]),
+        "vi": ([r"khoi luong(?: tinh)?", r"trong luong(?: tinh)?", r"the tich(?: thuc)?", r"dung tich"],
+               [rf"{VI_PRODUCT} (?:nang|co|duoc) bao nhieu(?: (?:gram|gam|g|kg|ml|lit))?"]),
+    }),
+    "country_of_origin": (("country of origin", "xuất xứ", "nước xuất xứ", "quốc gia xuất xứ"), {
+        "en": ([r"(?:country of )?origin"],
+               [rf"where (?:is|was|are) {EN_PRODUCT} (?:made|produced|manufactured|from)",
+                rf"where (?:does|did) {EN_PRODUCT} come from",
+                rf"(?:which|what) country (?:is|was) {EN_PRODUCT} (?:made in|produced in|from)",
+                rf"(?:(?:is|was) {EN_PRODUCT} )?made in (?:which|what) country"]),
+        "vi": ([r"(?:nuoc |quoc gia )?xuat xu", r"nguon goc"],
+               [rf"(?:{VI_PRODUCT} )?(?:duoc )?san xuat (?:o|tai) (?:dau|nuoc nao)",
+                rf"(?:{VI_PRODUCT} )?(?:cua|tu|den tu|hang) nuoc nao"]),
+    }),
+    "manufacturer": (("manufacturer", "nhà sản xuất"), {
+        "en": ([r"manufacturer", r"maker", r"producer"],
+               [rf"who (?:makes|made|produces|produced|manufactures|manufactured) {EN_PRODUCT}",
+                rf"(?:which|what) company (?:makes|made|produces|produced) {EN_PRODUCT}",
+                rf"who (?:is|was) {EN_PRODUCT} (?:made|produced|manufactured) by"]),
+        "vi": ([r"nha san xuat", r"don vi san xuat", r"cong ty san xuat"],
+               [rf"(?:cong ty nao|ai) san xuat(?: {VI_PRODUCT})?",
+                rf"{VI_PRODUCT} (?:do|cua) (?:ai|cong ty nao) san xuat"]),
+    }),
+    "brand": (("brand", "thương hiệu", "nhãn hiệu"), {
+        "en": ([r"brand(?: name)?"], [rf"(?:which|what) brand (?:is|makes) {EN_PRODUCT}", r"(?:which|what) brand"]),
+        "vi": ([r"thuong hieu", r"nhan hieu"], [rf"(?:{VI_PRODUCT} )?(?:la |cua )?hang nao"]),
+    }),
+    "storage_instructions": (("storage instructions", "hướng dẫn bảo quản", "bảo quản"), {
+        "en": ([r"storage(?: instructions| conditions| directions)?", r"how to store(?: it| this(?: product)?| the product)?"],
+               [rf"how (?:should|do|can|must) (?:i|we|you) (?:store|keep) {EN_PRODUCT}",
+                rf"how (?:is|should) {EN_PRODUCT} (?:be )?(?:stored|kept)",
+                rf"where (?:should|do|can) (?:i|we) (?:store|keep) {EN_PRODUCT}"]),
+        "vi": ([r"(?:huong dan |cach |dieu kien )?bao quan"], []),
+    }),
+    "usage_instructions": (("usage instructions", "hướng dẫn sử dụng", "cách sử dụng"), {
+        "en": ([r"(?:usage|use) instructions", r"instructions for use", r"directions(?: for use)?", r"usage",
+                r"how to use(?: it| this(?: product)?| the product)?"],
+               [rf"how (?:do|should|can) (?:i|we|you) use {EN_PRODUCT}", rf"how (?:is|should) {EN_PRODUCT} (?:be )?used"]),
+        "vi": ([r"huong dan su dung", r"cach (?:dung|su dung)"],
+               [rf"(?:{VI_PRODUCT} )?(?:su )?dung (?:nhu the nao|the nao|ra sao)"]),
+    }),
+}
+
+CONTAINS_PATTERNS = {
+    "en": [
+        r"\b(?:contain|contains|containing|include|includes|have|has)\s+(?:any\s+|some\s+)?(?P<item>.+?)(?:\s+in\s+(?:it|this|this product))?$",
+        r"^(?:is|are)\s+there\s+(?:any\s+|some\s+)?(?P<item>.+?)\s+in\s+(?:it|this|this product|the product)$",
+    ],
+    "vi": [
+        r"\bchua\s+(?P<item>.+?)(?:\s+(?:khong|ko|k|hay khong))?$",
+        r"\bco\s+thanh\s+phan\s+(?P<item>.+?)(?:\s+(?:khong|ko|k|hay khong))?$",
+    ],
+}
+
+# Questions that need judgement, not a lookup ("is it safe after the expiry date?")
+REASONING_PATTERNS = [
+    r"\bwhy\b", r"\bsafe\b", r"\b(?:should|can) i (?:eat|drink|take|give|buy)\b", r"\bok\b", r"\bgood\b", r"\bbad\b", r"\bhealthy\b",
+    r"\bfree\b", r"\bafter\b", r"\bbefore\s+(?:eating|using|drinking)\b", r"\bcompare\b", r"\bdifference\b",
+    r"\btai sao\b", r"\bvi sao\b", r"\ban toan\b", r"\bco nen\b", r"\bduoc khong\b", r"\btot\b", r"\bsau khi\b", r"\bso sanh\b",
+]
+
+ITEM_FILLER = re.compile(r"^(?:the|a|an|any|some|chat|thanh phan)\s+|\s+(?:or not|at all|khong|ko|k)$")
+
+# Values the extractor writes when the label doesn't say
+EMPTY_VALUES = {"", "n/a", "na", "none", "null", "unknown", "not specified", "not available", "not found",
+                "khong co", "khong ro", "khong xac dinh", "khong tim thay"}
+
+MAX_QUESTION_WORDS = 15
+MAX_ITEM_WORDS = 4
+
+ANSWER_TEMPLATES = {
+    "expiry_date": {"en": "The expiry date is **{value}**.", "vi": "Hạn sử dụng: **{value}**."},
+    "manufacturing_date": {"en": "The manufacturing date is **{value}**.", "vi": "Ngày sản xuất: **{value}**."},
+    "net_content": {"en": "The net content is **{value}**.", "vi": "Khối lượng tịnh: **{value}**."},
+    "country_of_origin": {"en": "The product is from **{value}**.", "vi": "Xuất xứ: **{value}**."},
+    "manufacturer": {"en": "The manufacturer is **{value}**.", "vi": "Nhà sản xuất: **{value}**."},
+    "brand": {"en": "The brand is **{value}**.", "vi": "Thương hiệu: **{value}**."},
+    "storage_instructions": {"en": "Storage instructions: {value}", "vi": "Hướng dẫn bảo quản: {value}"},
+    "usage_instructions": {"en": "Usage instructions: {value}", "vi": "Hướng dẫn sử dụng: {value}"},
+    "contains": {"en": "Yes, the ingredient list includes **{value}**.", "vi": "Có, thành phần có **{value}**."},
+    "contains_not": {"en": "No, none of the listed ingredients contain **{value}**.", "vi": "Không, thành phần không có **{value}**."},
+}
+
+
+
+def _question_pattern(language: str, nouns: List[str], questions: List[str]) -> re.Pattern:
+    before, after = NOUN_FRAMES[language]
+    alternatives = [f"{before}(?:{'|'.join(nouns)}){after}"] + questions
+    return re.compile(f"(?:{'|'.join(alternatives)})(?: (?:please|thanks))?")
+
+
+_field_patterns = {
+    intent: {language: _question_pattern(language, *patterns) for language, patterns in languages.items()}
+    for intent, (_, languages) in FIELD_INTENTS.items()
+}
+_contains_patterns = {language: [re.compile(p) for p in patterns] for language, patterns in CONTAINS_PATTERNS.items()}
+_reasoning_patterns = [re.compile(p) for p in REASONING_PATTERNS]
+
+
+_empty_values = {normalize(value) for value in EMPTY_VALUES}
+
+
+def _has_accents(text: str) -> bool:
+    return strip_accents(text) != text
+
+
+def _field_value(product_information: Dict[str, Any], names: Tuple[str, ...]) -> Optional[str]:
+    value = find_field(product_information, names)
+    if isinstance(value, list):
+        value = ", ".join(str(item) for item in value if item)
+    if not isinstance(value, str) or normalize(value) in _empty_values:
+        return None
+    return value.strip()
+
+
+def _language(question: str, matched_languages) -> str:
+    # Unaccented Vietnamese is only recognised by its keywords
+    return "vi" if _has_accents(question) or "vi" in matched_languages else "en"
+
+
+def _original_item(question: str, item: str) -> str:
+    # Matching runs without accents; give the index the words as typed ("của" is not "cua")
+    words, plain = tokenize(question), normalize(question).split()
+    item_words = item.split()
+    if len(words) == len(plain):
+        for start in range(len(plain) - len(item_words), -1, -1):
+            if plain[start:start + len(item_words)] == item_words:
+                return " ".join(words[start:start + len(item_words)])
+    return item
+
+
+def match_intent(question: str) -> Optional[Tuple[str, str, Optional[str]]]:
+    # (intent, language, item) for a question a field lookup can answer
+    text = normalize(question)
+    if not text or len(text.split()) > MAX_QUESTION_WORDS:
+        return None
+    if any(pattern.search(text) for pattern in _reasoning_patterns):
+        return None
+
+    matches = set()
+    for intent, languages in _field_patterns.items():
+        for language, pattern in languages.items():
+            if pattern.fullmatch(text):
+                matches.add((intent, language))
+    intents = {intent for intent, _ in matches}
+    if len(intents) == 1:
+        return intents.pop(), _language(question, {language for _, language in matches}), None
+    if intents:
+        # Several fields in one question: let the model answer it as a whole
+        return None
+
+    for language, patterns in _contains_patterns.items():
+        for pattern in patterns:
+            match = pattern.search(text)
+            if not match:
+                continue
+            item = ITEM_FILLER.sub("", match.group("item")).strip()
+            if item and len(item.split()) <= MAX_ITEM_WORDS:
+                return "contains", _language(question, {language}), _original_item(question, item)
+    return None
+
+
+def find_ingredients(ingredients: List[str], item: str) -> List[str]:
+    # Whole-word match, with or without a plural "s" ("peanuts" finds "peanut oil")
+    item = normalize(item)
+    stem = item[:-1] if len(item) > 3 and item.endswith("s") else item
+    pattern = re.compile(rf"\b{re.escape(stem)}s?\b")
+    return [ingredient for ingredient in ingredients if isinstance(ingredient, str) and pattern.search(normalize(ingredient))]
+
+
+def answer_contains(analysis: Dict[str, Any], item: str, language: str) -> Optional[Tuple[str, str]]:
+    resolved = ingredient_index.resolve(item)
+    if resolved and resolved[0] == "allergen":
+        allergen = resolved[1]
+        found = [i["text"] for i in analysis["ingredients"] if allergen in i["allergens"] and not i["traces"]]
+        if found:
+            return ", ".join(found), "contains"
+        # "No" only when every ingredient is known and none could hide the allergen
+        if analysis["ingredients"] and not analysis["unrecognized"] and allergen not in analysis["possible"] + analysis["traces"]:
+            return ingredient_index.allergen_name(allergen, language), "contains_not"
+        return None
+
+    if resolved:
+        found = [i["text"] for i in analysis["ingredients"] if resolved[1] in i["ids"]]
+    else:
+        found = find_ingredients([i["text"] for i in analysis["ingredients"] if not i["traces"]], item)
+    # Without an allergen to check, a missing name may still be there under another one, so only "yes" is certain
+    return (", ".join(found), "contains") if found else None
+
+
+def answer_question(
+    product_information: Dict[str, Any],
+    question: str,
+    analysis: Optional[Dict[str, Any]] = None,
+) -> Optional[Tuple[str, str]]:
+    # (answer, intent), or None when the model has to answer
+    matched = match_intent(question)
+    if not matched or not product_information:
+        return None
+    intent, language, item = matched
+
+    if intent == "contains":
+        answered = answer_contains(analysis or analyze_ingredients(product_information), item, language)
+        if answered is None:
+            return None
+        value, template = answered
+        return ANSWER_TEMPLATES[template][language].format(value=value), intent
+
+    value = _field_value(product_information, FIELD_INTENTS[intent][0])
+    if value is None:
+        return None
+    return ANSWER_TEMPLATES[intent][language].format(value=value), intent
@@ -0,0 +1,29 @@
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def strip_accents(text: str) -> str:
+    text = unicodedata.normalize("NFD", text).replace("đ", "d").replace("Đ", "D")
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def normalize(text: str) -> str:
+    # Lowercase words without Vietnamese accents, so "Hạn sử dụng" and "han su dung" compare equal
+    return " ".join(WORD_PATTERN.findall(strip_accents(text).casefold()))
+
+
+def tokenize(text: str) -> List[str]:
+    # Lowercase words that keep their accents: "của" (of) and "cua" (crab) are different words
+    return WORD_PATTERN.findall(unicodedata.normalize("NFC", text).casefold())
+
+
+def find_field(data: Dict[str, Any], names: Iterable[str]) -> Any:
+    # Extracted keys come as "Expiry date", "expiry_date" or translated ("Hạn sử dụng")
+    wanted = {normalize(name.replace("_", " ")) for name in names}
+    for key, value in data.items():
+        if isinstance(key, str) and normalize(key.replace("_", " ")) in wanted:
+            return value
+    return None
@@ -0,0 +1,130 @@
+import asyncio
+import hashlib
+import json
+import re
+from typing import Any, Dict, List
+
+from app.core.config import settings
+from app.core.metrics import register_cache_stats
+from app.core.model_client import get_gemini_client
+from app.services.cache import build_cache
+from app.services.resilience import call_model, estimate_tokens
+
+TRANSLATION_MODEL = "gemini-2.5-flash-preview-04-17"
+
+TRANSLATE_STRINGS_PROMPT = """
+You are a helpful translator for product packaging information.
+
+You receive a JSON array of strings. Translate every string into {language}.
+Instructions:
+- Return a JSON array with exactly the same number of strings, in the same order.
+- Translate human-readable text only. Keep brand names, numbers, units, dates and codes (e.g. E330) unchanged.
+- If a string is already in {language}, return it unchanged.
+- Return ONLY the JSON array, with no extra text or explanation.
+
+Example (target language Vietnamese):
+Input: ["Ingredients", "Sugar", "Store in a cool, dry place"]
+Output: ["Thành phần", "Đường", "Bảo quản nơi khô ráo, thoáng mát"]
+"""
+
+# Label units; other words after a number ("2 eggs", "10 mins") still need translating
+UNITS = r"(?:g|gr|mg|mcg|µg|μg|kg|ml|cl|dl|l|kcal|kj|cal|oz|fl\.?\s*oz|lbs?|iu)"
+
+# Amounts ("100g", "12.5 %", "500 kcal") and additive codes ("E330") read the same in every language
+UNTRANSLATABLE_PATTERN = re.compile(rf"^\s*(?:[\d.,/]+\s*{UNITS}?\s*%?|E\d{{3,4}}[a-z]?)\s*$", re.IGNORECASE)
+
+translation_cache = build_cache(
+    settings.TRANSLATION_CACHE_BACKEND,
+    "translation_cache",
+    settings.TRANSLATION_CACHE_MAX_SIZE,
+    settings.TRANSLATION_CACHE_TTL,
+    memory_size=settings.TRANSLATION_MEMORY_CACHE_SIZE,
+)
+register_cache_stats("translation", translation_cache.stats)
+
+
+def needs_translation(text: str) -> bool:
+    return any(char.isalpha() for char in text) and not UNTRANSLATABLE_PATTERN.match(text)
+
+
+def collect_strings(value: Any, strings: Dict[str, None]):
+    # Dict keyed by string keeps first-seen order and drops duplicates
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if isinstance(key, str) and needs_translation(key):
+                strings[key] = None
+            collect_strings(item, strings)
+    elif isinstance(value, list):
+        for item in value:
+            collect_strings(item, strings)
+    elif isinstance(value, str) and needs_translation(value):
+        strings[value] = None
+
+
+def rebuild(value: Any, translations: Dict[str, str]) -> Any:
+    if isinstance(value, dict):
+        return {translations.get(key, key) if isinstance(key, str) else key: rebuild(item, translations) for key, item in value.items()}
+    if isinstance(value, list):
+        return [rebuild(item, translations) for item in value]
+    if isinstance(value, str):
+        return translations.get(value, value)
+    return value
+
+
+def cache_key(text: str, language: str) -> str:
+    return hashlib.sha256(f"{language.strip().casefold()}\0{text}".encode("utf-8")).hexdigest()
+
+
+async def translate_strings(texts: List[str], language: str) -> List[str]:
+    client = get_gemini_client()
+    prompt = TRANSLATE_STRINGS_PROMPT.format(language=language)
+    payload = json.dumps(texts, ensure_ascii=False)
+
+    response = await call_model(
+        TRANSLATION_MODEL,
+        lambda: client.aio.models.generate_content(
+            model=TRANSLATION_MODEL,
+            contents=[payload],
+            config={
+                'response_mime_type': 'application/json',
+                'response_schema': list[str],
+                "temperature": 0,
+                "system_instruction": prompt
+            }
+        ),
+        estimate_tokens(prompt, payload) * 2,
+        operation="translate",
+    )
+
+    translated = json.loads(response.text)
+    if not isinstance(translated, list) or len(translated) != len(texts):
+        raise ValueError(f"Translation returned {len(translated) if isinstance(translated, list) else 'no'} strings for {len(texts)} inputs")
+    return [str(item) for item in translated]
+
+
+async def translate_info(info: Dict[str, Any], language: str) -> Dict[str, Any]:
+    strings: Dict[str, None] = {}
+    collect_strings(info, strings)
+    texts = list(strings)
+
+    keys = {text: cache_key(text, language) for text in texts}
+    cached = await translation_cache.get_many(list(keys.values()))
+    translations = {text: cached[key] for text, key in keys.items() if key in cached}
+
+    misses = [text for text in texts if text not in translations]
+    if misses:
+        size = settings.TRANSLATION_BATCH_SIZE
+        batches = [misses[i:i + size] for i in range(0, len(misses), size)]
+        results = await asyncio.gather(*(translate_strings(batch, language) for batch in batches))
+        fresh = {text: translated for batch, result in zip(batches, results) for text, translated in zip(batch, result)}
+        translations.update(fresh)
+        await translation_cache.set_many({keys[text]: translated for text, translated in fresh.items()})
+
+    return rebuild(info, translations)
+
+
+def translation_cache_stats() -> Dict[str, Any]:
+    return {
+        "backend": settings.TRANSLATION_CACHE_BACKEND,
+        **translation_cache.stats.as_dict(),
+    }
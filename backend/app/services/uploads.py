@@ -0,0 +1,269 @@
+import logging
+import asyncio
+import hashlib
+import io
+import mimetypes
+import os
+import re
+import tempfile
+from typing import Any, Dict, Optional
+
+from fastapi import UploadFile
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from PIL import Image, ImageOps
+
+from app.core.config import settings
+from app.services.images import detect_mime_type, flatten_image, run_in_image_pool
+
+logger = logging.getLogger(__name__)
+
+RENDITION_EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp"}
+# Uploads are stored as what their bytes say they are, not what the client declared
+UNKNOWN_CONTENT_TYPE = "application/octet-stream"
+# Content-addressed files never change, so clients and proxies may keep them for good
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+KEY_PATTERN = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{64}/[\w-]+\.\w+$")
+
+
+class UploadTooLargeError(Exception):
+    pass
+
+
+class StorageUnavailableError(Exception):
+    pass
+
+
+def _digest_path(digest: str, name: str) -> str:
+    # Two-level fan-out keeps directories small
+    return f"{digest[:2]}/{digest}/{name}"
+
+
+def _content_type(name: str) -> str:
+    return mimetypes.guess_type(name)[0] or UNKNOWN_CONTENT_TYPE
+
+
+def _write_atomic(target: str, data: bytes):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(target), prefix=".upload-", delete=False) as f:
+        f.write(data)
+    os.replace(f.name, target)
+
+
+class LocalStorage:
+    def __init__(self, root: str):
+        self.root = root
+        # Partial uploads are spooled here; keys never start with a dot, so they can't be requested
+        self.incoming = os.path.join(root, ".incoming")
+        os.makedirs(self.incoming, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def temp_dir(self) -> Optional[str]:
+        # Spool on the same filesystem as the final location so storing is a rename, not a copy
+        return self.incoming
+
+    async def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    async def put_file(self, key: str, path: str, content_type: str):
+        target = self._path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Atomic, so a reader never sees a half-written file
+        os.replace(path, target)
+
+    async def put_bytes(self, key: str, data: bytes, content_type: str):
+        await run_in_threadpool(_write_atomic, self._path(key), data)
+
+    async def response(self, key: str, headers: Dict[str, str]) -> Response:
+        path = self._path(key)
+        if not os.path.exists(path):
+            raise FileNotFoundError(key)
+        return FileResponse(path, media_type=_content_type(key), headers=headers)
+
+
+class S3Storage:
+    # Any S3-compatible service; UPLOAD_S3_ENDPOINT_URL points it at MinIO or another stand-in
+    def __init__(self):
+        try:
+            import boto3
+        except ImportError:
+            raise StorageUnavailableError("boto3 is not installed")
+        self.bucket = settings.UPLOAD_S3_BUCKET
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.UPLOAD_S3_ENDPOINT_URL,
+            region_name=settings.UPLOAD_S3_REGION,
+            aws_access_key_id=settings.UPLOAD_S3_ACCESS_KEY,
+            aws_secret_access_key=settings.UPLOAD_S3_SECRET_KEY,
+        )
+
+    def temp_dir(self) -> Optional[str]:
+        return None
+
+    async def exists(self, key: str) -> bool:
+        try:
+            await run_in_threadpool(self.client.head_object, Bucket=self.bucket, Key=key)
+        except self.client.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    async def put_file(self, key: str, path: str, content_type: str):
+        extra = {"ContentType": content_type, "CacheControl": IMMUTABLE_CACHE_CONTROL}
+        try:
+            await run_in_threadpool(self.client.upload_file, path, self.bucket, key, ExtraArgs=extra)
+        finally:
+            os.remove(path)
+
+    async def put_bytes(self, key: str, data: bytes, content_type: str):
+        await run_in_threadpool(
+            self.client.put_object,
+            Bucket=self.bucket,
+            Key=key,
+            Body=data,
+            ContentType=content_type,
+            CacheControl=IMMUTABLE_CACHE_CONTROL,
+        )
+
+    async def response(self, key: str, headers: Dict[str, str]) -> Response:
+        try:
+            obj = await run_in_threadpool(self.client.get_object, Bucket=self.bucket, Key=key)
+        except self.client.exceptions.NoSuchKey:
+            raise FileNotFoundError(key)
+        headers = {**headers, "Content-Length": str(obj["ContentLength"])}
+        chunks = obj["Body"].iter_chunks(settings.UPLOAD_CHUNK_SIZE)
+        return StreamingResponse(iterate_in_threadpool(chunks), media_type=_content_type(key), headers=headers)
+
+
+class UploadStorage:
+    backend: Any = None
+
+
+storage = UploadStorage()
+
+
+def get_storage():
+    if storage.backend is None:
+        if settings.UPLOAD_STORAGE_BACKEND == "s3":
+            storage.backend = S3Storage()
+        else:
+            storage.backend = LocalStorage(settings.UPLOAD_DIR)
+    return storage.backend
+
+
+def rendition_names(extension: str) -> Dict[str, str]:
+    # The size is part of the name, so changing the settings never alters a file behind an immutable URL
+    return {
+        "thumbnail": f"thumbnail-{settings.UPLOAD_THUMBNAIL_EDGE}.{extension}",
+        "preview": f"preview-{settings.UPLOAD_PREVIEW_EDGE}.{extension}",
+    }
+
+
+def render_renditions(path: str, edges: Dict[str, int], output_format: str, quality: int) -> Dict[str, bytes]:
+    # Runs in a worker process: keep it free of app state
+    with Image.open(path) as source:
+        image = flatten_image(ImageOps.exif_transpose(source))
+    renditions = {}
+    for name, edge in edges.items():
+        copy = image.copy()
+        copy.thumbnail((edge, edge), Image.LANCZOS)
+        buffer = io.BytesIO()
+        copy.save(buffer, format=output_format, quality=quality, optimize=True)
+        renditions[name] = buffer.getvalue()
+    return renditions
+
+
+def upload_url(key: str) -> str:
+    if settings.UPLOAD_PUBLIC_BASE_URL:
+        return f"{settings.UPLOAD_PUBLIC_BASE_URL.rstrip('/')}/{key}"
+    return f"{settings.HOST}:{settings.PORT}/api/extractor/uploads/{key}"
+
+
+async def _spool(file: UploadFile, directory: Optional[str]):
+    # Stream the upload to a temporary file, hashing as it goes, without holding it in memory
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    spool = tempfile.NamedTemporaryFile(dir=directory, prefix=".upload-", delete=False)
+    try:
+        with spool:
+            while True:
+                chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > settings.UPLOAD_MAX_BYTES:
+                    raise UploadTooLargeError(f"Upload is limited to {settings.UPLOAD_MAX_BYTES} bytes")
+                digest.update(chunk)
+                head = head or chunk
+                await run_in_threadpool(spool.write, chunk)
+    except BaseException:
+        os.remove(spool.name)
+        raise
+    return spool.name, digest.hexdigest(), size, head
+
+
+async def _store_renditions(backend, digest: str, path: str) -> Dict[str, str]:
+    output_format = settings.UPLOAD_RENDITION_FORMAT.upper()
+    names = rendition_names(RENDITION_EXTENSIONS[output_format])
+    edges = {"thumbnail": settings.UPLOAD_THUMBNAIL_EDGE, "preview": settings.UPLOAD_PREVIEW_EDGE}
+    try:
+        renditions = await run_in_image_pool(
+            render_renditions, path, edges, output_format, settings.UPLOAD_RENDITION_QUALITY
+        )
+    except Exception as e:
+        # Formats Pillow can't decode (e.g. HEIC) are kept without renditions
+        logger.warning("Upload renditions skipped: %s", e, extra={"sha256": digest})
+        return {}
+    content_type = _content_type(names["thumbnail"])
+    await asyncio.gather(*(
+        backend.put_bytes(_digest_path(digest, names[name]), data, content_type)
+        for name, data in renditions.items()
+    ))
+    return {name: _digest_path(digest, names[name]) for name in renditions}
+
+
+async def store_upload(file: UploadFile) -> Dict[str, Any]:
+    backend = get_storage()
+    path, digest, size, head = await _spool(file, backend.temp_dir())
+    try:
+        # The same bytes always get the same key, whatever type the client declared
+        content_type = detect_mime_type(head, UNKNOWN_CONTENT_TYPE)
+        extension = mimetypes.guess_extension(content_type) or ".bin"
+        key = _digest_path(digest, f"original{extension}")
+        deduplicated = await backend.exists(key)
+        renditions = {}
+        if not deduplicated:
+            renditions = await _store_renditions(backend, digest, path)
+            await backend.put_file(key, path, content_type)
+        else:
+            output_format = settings.UPLOAD_RENDITION_FORMAT.upper()
+            for name, rendition in rendition_names(RENDITION_EXTENSIONS[output_format]).items():
+                if await backend.exists(_digest_path(digest, rendition)):
+                    renditions[name] = _digest_path(digest, rendition)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+    return {
+        "url": upload_url(key),
+        "sha256": digest,
+        "size": size,
+        "deduplicated": deduplicated,
+        "renditions": {name: upload_url(rendition) for name, rendition in renditions.items()},
+    }
+
+
+async def upload_response(key: str, if_none_match: Optional[str]) -> Response:
+    if not KEY_PATTERN.match(key):
+        raise FileNotFoundError(key)
+    # The key holds the content hash, so it identifies the bytes
+    etag = f'"{hashlib.sha256(key.encode()).hexdigest()[:32]}"'
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    tags = {tag.strip() for tag in (if_none_match or "").split(",")}
+    if etag in tags or "*" in tags:
+        return Response(status_code=304, headers=headers)
+    return await get_storage().response(key, headers)
@@ -0,0 +1,264 @@
+import logging
+import asyncio
+import base64
+import random
+import re
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Type
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.model_client import get_gemini_client, get_openai_client
+from app.core.tracing import span
+from app.services.resilience import call_model, estimate_tokens, get_guard
+
+logger = logging.getLogger(__name__)
+
+USER_PROMPT = "Extract the information from the image."
+ROUTING_MODES = ("latency", "priority")
+# Some OpenAI-compatible models wrap their JSON in a markdown fence despite response_format
+JSON_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+
+
+class VisionBackend(ABC):
+    # A backend without extract() can't be instantiated, so the registry refuses it at startup
+    name: str = ""
+    model: str = ""
+
+    @abstractmethod
+    async def extract(
+        self,
+        image: bytes,
+        mime_type: str,
+        prompt: str,
+        output_format: Type[BaseModel],
+        operation: str = "extract",
+    ) -> Dict[str, Any]:
+        ...
+
+
+class GeminiBackend(VisionBackend):
+    name = "gemini"
+
+    def __init__(self):
+        self.model = settings.VISION_GEMINI_MODEL
+
+    async def generate(
+        self,
+        image: bytes,
+        mime_type: str,
+        prompt: str,
+        output_format: Type[BaseModel],
+        operation: str = "extract",
+    ):
+        from google.genai.types import Part
+
+        client = get_gemini_client()
+        image_part = Part.from_bytes(data=image, mime_type=mime_type)
+        return await call_model(
+            self.model,
+            lambda: client.aio.models.generate_content(
+                model=self.model,
+                contents=[USER_PROMPT, image_part],
+                config={
+                    "response_mime_type": "application/json",
+                    "response_schema": output_format,
+                    "temperature": 0,
+                    "system_instruction": prompt,
+                },
+            ),
+            estimate_tokens(prompt, images=1),
+            operation,
+        )
+
+    async def extract(
+        self,
+        image: bytes,
+        mime_type: str,
+        prompt: str,
+        output_format: Type[BaseModel],
+        operation: str = "extract",
+    ) -> Dict[str, Any]:
+        response = await self.generate(image, mime_type, prompt, output_format, operation)
+        return response.parsed.__dict__
+
+
+class OpenAICompatibleBackend(VisionBackend):
+    # OpenRouter, vLLM and other servers speaking the chat completions API
+    name = "openai"
+
+    def __init__(self):
+        self.model = settings.VISION_OPENAI_MODEL
+
+    async def extract(
+        self,
+        image: bytes,
+        mime_type: str,
+        prompt: str,
+        output_format: Type[BaseModel],
+        operation: str = "extract",
+    ) -> Dict[str, Any]:
+        encoded = base64.b64encode(image).decode("ascii")
+        body = {
+            "model": self.model,
+            "temperature": 0,
+            "messages": [
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": [
+                    {"type": "text", "text": USER_PROMPT},
+                    {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{encoded}"}},
+                ]},
+            ],
+            "response_format": {
+                "type": "json_schema",
+                "json_schema": {"name": output_format.__name__, "schema": output_format.model_json_schema()},
+            },
+        }
+        client = get_openai_client()
+
+        async def post():
+            response = await client.post("/chat/completions", json=body)
+            response.raise_for_status()
+            return response.json()
+
+        completion = await call_model(self.model, post, estimate_tokens(prompt, images=1), operation)
+        content = completion["choices"][0]["message"]["content"]
+        return output_format.model_validate_json(JSON_FENCE.sub("", content)).model_dump()
+
+
+class FakeBackend(VisionBackend):
+    # Schema-shaped placeholder values, for load tests that shouldn't reach a real model
+    name = "fake"
+    model = "fake"
+
+    async def extract(
+        self,
+        image: bytes,
+        mime_type: str,
+        prompt: str,
+        output_format: Type[BaseModel],
+        operation: str = "extract",
+    ) -> Dict[str, Any]:
+        await asyncio.sleep(settings.VISION_FAKE_LATENCY_MS / 1000)
+        return {
+            field: ["fake"] if getattr(info.annotation, "__origin__", None) is list else "fake"
+            for field, info in output_format.model_fields.items()
+        }
+
+
+BACKEND_TYPES = {backend.name: backend for backend in (GeminiBackend, OpenAICompatibleBackend, FakeBackend)}
+
+
+class BackendStats:
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.latency: Optional[float] = None  # seconds, exponentially weighted
+        self.last_error: Optional[str] = None
+
+    def _observe(self, seconds: float):
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency += settings.VISION_LATENCY_ALPHA * (seconds - self.latency)
+
+    def record_success(self, seconds: float):
+        self.calls += 1
+        self._observe(seconds)
+
+    def record_failure(self, error: Exception, seconds: float):
+        # A backend that fails fast must not look fast: count the attempt as twice its usual latency
+        self.calls += 1
+        self.failures += 1
+        self.last_error = str(error)
+        self._observe(2 * max(seconds, self.latency or 0.0))
+
+
+class VisionRegistry:
+    def __init__(self, names: List[str], routing: str):
+        unknown = [name for name in names if name not in BACKEND_TYPES]
+        if unknown or not names:
+            raise ValueError(f"VISION_BACKENDS must be a non-empty list of: {', '.join(BACKEND_TYPES)}")
+        if routing not in ROUTING_MODES:
+            raise ValueError(f"VISION_ROUTING must be one of: {', '.join(ROUTING_MODES)}")
+        self.routing = routing
+        self.backends = {name: BACKEND_TYPES[name]() for name in dict.fromkeys(names)}
+        self.stats = {name: BackendStats() for name in self.backends}
+
+    def get(self, name: str) -> VisionBackend:
+        if name not in self.backends:
+            raise ValueError(f"Backend must be one of: {', '.join(self.backends)}")
+        return self.backends[name]
+
+    def score(self, name: str, estimated_tokens: int = 0) -> float:
+        # Expected seconds until a result: recent latency plus the wait for rate-limit headroom
+        latency = self.stats[name].latency
+        if latency is None:
+            # Untried backends go first so they get a latency
+            return 0.0
+        return latency + get_guard(self.backends[name].model).wait_time(estimated_tokens)
+
+    def route(self, estimated_tokens: int = 0, explore: bool = True) -> List[VisionBackend]:
+        names = list(self.backends)
+        if self.routing == "latency":
+            names.sort(key=lambda name: self.score(name, estimated_tokens))
+            if explore and len(names) > 1 and random.random() < settings.VISION_EXPLORE_RATIO:
+                # Latencies only update when used; send an occasional request to a slower backend
+                names.insert(0, names.pop(random.randrange(1, len(names))))
+        # Backends with an open circuit would fail fast; keep them as a last resort
+        names.sort(key=lambda name: get_guard(self.backends[name].model).breaker.state == "open")
+        return [self.backends[name] for name in names]
+
+    async def extract(
+        self,
+        image: bytes,
+        mime_type: str,
+        prompt: str,
+        output_format: Type[BaseModel],
+        backend: Optional[str] = None,
+        operation: str = "extract",
+    ) -> Dict[str, Any]:
+        # A backend chosen by the caller is used alone; otherwise fail over down the routing order
+        candidates = [self.get(backend)] if backend else self.route(estimate_tokens(prompt, images=1))
+        error: Optional[Exception] = None
+        for candidate in candidates:
+            stats = self.stats[candidate.name]
+            started = time.monotonic()
+            try:
+                with span("vision.backend", {"vision.backend": candidate.name, "gen_ai.request.model": candidate.model}):
+                    result = await candidate.extract(image, mime_type, prompt, output_format, operation)
+            except Exception as e:
+                stats.record_failure(e, time.monotonic() - started)
+                logger.warning("Vision backend failed: %s", e, extra={"backend": candidate.name, "model": candidate.model})
+                error = e
+                continue
+            stats.record_success(time.monotonic() - started)
+            return result
+        raise error
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "routing": self.routing,
+            "order": [backend.name for backend in self.route(explore=False)],
+            "backends": [
+                {
+                    "name": name,
+                    "model": backend.model,
+                    "calls": self.stats[name].calls,
+                    "failures": self.stats[name].failures,
+                    "latencyMs": round(self.stats[name].latency * 1000, 1) if self.stats[name].latency is not None else None,
+                    "circuit": get_guard(backend.model).breaker.state,
+                    "lastError": self.stats[name].last_error,
+                }
+                for name, backend in self.backends.items()
+            ],
+        }
+
+
+vision_registry = VisionRegistry(settings.VISION_BACKENDS, settings.VISION_ROUTING)
+
+
+def vision_backend_stats() -> Dict[str, Any]:
+    return vision_registry.describe()
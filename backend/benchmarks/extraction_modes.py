@@ -0,0 +1,130 @@
+"""
+Compare the "parallel" and "combined" extraction modes on real product photos.
+
+Reports per-mode latency, prompt/output tokens and field accuracy. Accuracy is
+measured against a ground-truth JSON file (image filename -> expected combined
+result, same keys as /api/extractor/extract) when one is given; otherwise the
+combined mode is scored against the parallel mode's output.
+
+Usage (from the backend directory, with GEMINI_API_KEY set):
+    python -m benchmarks.extraction_modes --images ../extractor/images --runs 3
+    python -m benchmarks.extraction_modes --images ./photos --truth ./photos/truth.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+from app.services.extractor import EXTRACTION_MODES, combine_results, generate_extraction
+from app.services.images import detect_mime_type
+
+MODE_REQUESTS = {
+    "parallel": ["ingredients", "other_info"],
+    "combined": ["combined"],
+}
+
+
+def normalize(value: Any) -> str:
+    text = unicodedata.normalize("NFKC", str(value)).casefold()
+    return " ".join(text.split())
+
+
+def field_accuracy(result: Dict[str, Any], expected: Dict[str, Any]) -> float:
+    scores = []
+    for key, expected_value in expected.items():
+        actual_value = result.get(key, "")
+        if isinstance(expected_value, list):
+            # Jaccard similarity on ingredient names, order does not matter
+            actual_set = {normalize(v) for v in actual_value or []}
+            expected_set = {normalize(v) for v in expected_value}
+            union = actual_set | expected_set
+            scores.append(len(actual_set & expected_set) / len(union) if union else 1.0)
+        else:
+            scores.append(1.0 if normalize(actual_value) == normalize(expected_value) else 0.0)
+    return sum(scores) / len(scores) if scores else 0.0
+
+
+async def run_mode(image: bytes, mode: str) -> Dict[str, Any]:
+    # The photos may be PNG or WebP as well as JPEG
+    mime_type = detect_mime_type(image)
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(generate_extraction(image, info_type, mime_type) for info_type in MODE_REQUESTS[mode]))
+    latency = time.perf_counter() - start
+
+    parsed = [response.parsed.__dict__ for response in responses]
+    result = combine_results(parsed[0], parsed[-1])
+    usage = [response.usage_metadata for response in responses]
+    return {
+        "latency": latency,
+        "prompt_tokens": sum((u.prompt_token_count or 0) for u in usage if u),
+        "output_tokens": sum((u.candidates_token_count or 0) for u in usage if u),
+        "result": result,
+    }
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def benchmark(image_dir: str, runs: int, truth: Optional[Dict[str, Dict[str, Any]]]):
+    filenames = sorted(
+        name for name in os.listdir(image_dir)
+        if name.lower().endswith((".jpg", ".jpeg", ".png", ".webp"))
+    )
+    samples = {mode: [] for mode in EXTRACTION_MODES}
+
+    for filename in filenames:
+        with open(os.path.join(image_dir, filename), "rb") as f:
+            image = f.read()
+        for _ in range(runs):
+            outputs = {mode: await run_mode(image, mode) for mode in EXTRACTION_MODES}
+            for mode, output in outputs.items():
+                if truth and filename in truth:
+                    expected = truth[filename]
+                elif mode == "combined":
+                    expected = outputs["parallel"]["result"]
+                else:
+                    expected = None
+                output["accuracy"] = field_accuracy(output["result"], expected) if expected else None
+                samples[mode].append(output)
+        print(f"  {filename}: done")
+
+    print()
+    print(f"{'mode':<10}{'p50 s':>8}{'p95 s':>8}{'prompt tok':>12}{'output tok':>12}{'accuracy':>10}")
+    for mode, outputs in samples.items():
+        latencies = [o["latency"] for o in outputs]
+        accuracies = [o["accuracy"] for o in outputs if o["accuracy"] is not None]
+        accuracy = f"{statistics.mean(accuracies):.3f}" if accuracies else "ref"
+        print(
+            f"{mode:<10}"
+            f"{percentile(latencies, 50):>8.2f}"
+            f"{percentile(latencies, 95):>8.2f}"
+            f"{statistics.mean(o['prompt_tokens'] for o in outputs):>12.0f}"
+            f"{statistics.mean(o['output_tokens'] for o in outputs):>12.0f}"
+            f"{accuracy:>10}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default="../extractor/images", help="Directory of product photos")
+    parser.add_argument("--runs", type=int, default=1, help="Runs per image and mode")
+    parser.add_argument("--truth", help="Ground-truth JSON file keyed by image filename")
+    args = parser.parse_args()
+
+    truth = None
+    if args.truth:
+        with open(args.truth, encoding="utf-8") as f:
+            truth = json.load(f)
+
+    asyncio.run(benchmark(args.images, args.runs, truth))
+
+
+if __name__ == "__main__":
+    main()
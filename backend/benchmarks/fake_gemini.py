@@ -0,0 +1,329 @@
+"""
+A local stand-in for the Gemini API, for exercising the backend without real quota.
+
+Implements generateContent and streamGenerateContent (SSE) for any model name,
+and cachedContents (create/get/update/delete) for explicit context caching.
+POST /v1/chat/completions answers like an OpenAI-compatible server, for the
+"openai" vision backend (VISION_OPENAI_BASE_URL=http://127.0.0.1:9000/v1).
+Responses follow the request's responseSchema when one is given, so structured
+extraction calls parse. Latency and failure injection are configurable:
+
+    python -m benchmarks.fake_gemini --port 9000 --latency-ms 800 --error-rate 0.05 --rate-limit-rate 0.1
+
+Then run the backend against it:
+
+    GEMINI_BASE_URL=http://127.0.0.1:9000 GEMINI_API_KEY=fake uvicorn main:app
+
+GET /stats returns request and injected-failure counters; POST /stats/reset clears them.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class FakeConfig:
+    latency_ms: float = 500.0
+    latency_dist: str = "lognormal"  # fixed | uniform | lognormal
+    latency_sigma: float = 0.5
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    stream_chunks: int = 8
+    chunk_delay_ms: float = 50.0
+    reply_text: str = "This is a fake answer from the local model server."
+    cache_min_tokens: int = 0
+
+
+config = FakeConfig()
+stats: Counter = Counter()
+# cachedContents/<id> -> {"model", "systemInstruction", "tokens", "expiresAt", ...}
+cached_contents: Dict[str, Dict[str, Any]] = {}
+app = FastAPI(title="Fake Gemini API")
+
+
+def sample_latency() -> float:
+    median = config.latency_ms / 1000
+    if config.latency_dist == "fixed":
+        return median
+    if config.latency_dist == "uniform":
+        return random.uniform(0, 2 * median)
+    # Long right tail, like real model latency
+    return median * math.exp(random.gauss(0, config.latency_sigma))
+
+
+def sample_from_schema(schema: Dict[str, Any]) -> Any:
+    kind = (schema.get("type") or "STRING").upper()
+    if kind == "OBJECT":
+        return {name: sample_from_schema(prop) for name, prop in (schema.get("properties") or {}).items()}
+    if kind == "ARRAY":
+        return [sample_from_schema(schema.get("items") or {}) for _ in range(3)]
+    if kind in ("NUMBER", "INTEGER"):
+        return 1
+    if kind == "BOOLEAN":
+        return False
+    return "fake"
+
+
+def error_response(code: int, status: str, message: str) -> JSONResponse:
+    return JSONResponse(status_code=code, content={"error": {"code": code, "message": message, "status": status}})
+
+
+def count_tokens(body: Dict[str, Any]) -> int:
+    # Same rough heuristic as the backend: ~4 characters per token, 258 per image
+    tokens = 0
+    for content in body.get("contents", []):
+        for part in content.get("parts", []):
+            tokens += len(part.get("text", "")) // 4
+            if "inlineData" in part:
+                tokens += 258
+    instruction = body.get("systemInstruction") or {}
+    for part in instruction.get("parts", []):
+        tokens += len(part.get("text", "")) // 4
+    return tokens
+
+
+def prompt_text(body: Dict[str, Any]) -> str:
+    contents = body.get("contents") or [{}]
+    return "".join(part.get("text", "") for part in contents[-1].get("parts", []))
+
+
+def reply_text(body: Dict[str, Any]) -> str:
+    generation_config = body.get("generationConfig") or {}
+    schema = generation_config.get("responseSchema") or {}
+    if (schema.get("type") or "").upper() == "ARRAY":
+        # Batched string translation: answer with one item per input item
+        try:
+            items = json.loads(prompt_text(body))
+        except ValueError:
+            items = None
+        if isinstance(items, list):
+            return json.dumps(items, ensure_ascii=False)
+    if schema:
+        return json.dumps(sample_from_schema(schema))
+    if generation_config.get("responseMimeType") == "application/json":
+        return "{}"
+    return config.reply_text
+
+
+def candidate(text: str, finished: bool = True) -> Dict[str, Any]:
+    result = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+    if finished:
+        result["finishReason"] = "STOP"
+    return result
+
+
+def usage(prompt_tokens: int, output_tokens: int, cached_tokens: int = 0) -> Dict[str, int]:
+    result = {
+        "promptTokenCount": prompt_tokens + cached_tokens,
+        "candidatesTokenCount": output_tokens,
+        "totalTokenCount": prompt_tokens + cached_tokens + output_tokens,
+    }
+    if cached_tokens:
+        result["cachedContentTokenCount"] = cached_tokens
+    return result
+
+
+def live_cache(name: str) -> Optional[Dict[str, Any]]:
+    cache = cached_contents.get(name)
+    if cache is None or cache["expiresAt"] <= time.time():
+        cached_contents.pop(name, None)
+        return None
+    return cache
+
+
+def expiry_fields(body: Dict[str, Any]) -> float:
+    if body.get("expireTime"):
+        return datetime.fromisoformat(body["expireTime"].replace("Z", "+00:00")).timestamp()
+    return time.time() + float(str(body.get("ttl", "3600s")).rstrip("s"))
+
+
+def cache_resource(name: str, cache: Dict[str, Any]) -> Dict[str, Any]:
+    expire_time = datetime.fromtimestamp(cache["expiresAt"], tz=timezone.utc)
+    return {
+        "name": name,
+        "model": cache["model"],
+        "displayName": cache.get("displayName", ""),
+        "createTime": cache["createTime"],
+        "updateTime": cache["createTime"],
+        "expireTime": expire_time.isoformat().replace("+00:00", "Z"),
+        "usageMetadata": {"totalTokenCount": cache["tokens"]},
+    }
+
+
+def injected_failure():
+    roll = random.random()
+    if roll < config.rate_limit_rate:
+        stats["rate_limited"] += 1
+        return error_response(429, "RESOURCE_EXHAUSTED", "Resource has been exhausted (fake).")
+    if roll < config.rate_limit_rate + config.error_rate:
+        stats["errors"] += 1
+        return error_response(503, "UNAVAILABLE", "The model is overloaded (fake).")
+    return None
+
+
+@app.post("/{version}/models/{target}")
+async def models_action(version: str, target: str, request: Request):
+    model, _, action = target.partition(":")
+    body = await request.json()
+    stats["requests"] += 1
+    stats[f"{action}:{model}"] += 1
+
+    await asyncio.sleep(sample_latency())
+    failure = injected_failure()
+    if failure is not None:
+        return failure
+
+    cached_tokens = 0
+    if body.get("cachedContent"):
+        cache = live_cache(body["cachedContent"])
+        if cache is None:
+            stats["cache_misses"] += 1
+            return error_response(403, "PERMISSION_DENIED", "CachedContent not found (or permission denied) (fake).")
+        if body.get("systemInstruction"):
+            return error_response(400, "INVALID_ARGUMENT", "systemInstruction can not be set when using cachedContent (fake).")
+        stats["cache_hits"] += 1
+        cached_tokens = cache["tokens"]
+
+    text = reply_text(body)
+    prompt_tokens = count_tokens(body)
+    output_tokens = max(1, len(text) // 4)
+
+    if action == "generateContent":
+        return {
+            "candidates": [candidate(text)],
+            "usageMetadata": usage(prompt_tokens, output_tokens, cached_tokens),
+            "modelVersion": model,
+        }
+
+    if action == "streamGenerateContent":
+        async def events():
+            size = max(1, math.ceil(len(text) / config.stream_chunks))
+            pieces = [text[i:i + size] for i in range(0, len(text), size)]
+            for i, piece in enumerate(pieces):
+                last = i == len(pieces) - 1
+                chunk = {"candidates": [candidate(piece, finished=last)], "modelVersion": model}
+                if last:
+                    chunk["usageMetadata"] = usage(prompt_tokens, output_tokens, cached_tokens)
+                yield f"data: {json.dumps(chunk)}\r\n\r\n"
+                await asyncio.sleep(config.chunk_delay_ms / 1000)
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return error_response(404, "NOT_FOUND", f"Unknown action {action}")
+
+
+@app.post("/{version}/chat/completions")
+async def chat_completions(version: str, request: Request):
+    body = await request.json()
+    model = body.get("model", "")
+    stats["requests"] += 1
+    stats[f"chat.completions:{model}"] += 1
+
+    await asyncio.sleep(sample_latency())
+    failure = injected_failure()
+    if failure is not None:
+        return failure
+
+    response_format = body.get("response_format") or {}
+    schema = (response_format.get("json_schema") or {}).get("schema")
+    text = json.dumps(sample_from_schema(schema)) if schema else config.reply_text
+    prompt_tokens = sum(len(json.dumps(message.get("content", ""))) // 4 for message in body.get("messages", []))
+    output_tokens = max(1, len(text) // 4)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:16]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": output_tokens, "total_tokens": prompt_tokens + output_tokens},
+    }
+
+
+@app.post("/{version}/cachedContents")
+async def create_cached_content(version: str, request: Request):
+    body = await request.json()
+    stats["cache_creates"] += 1
+    tokens = count_tokens(body)
+    if tokens < config.cache_min_tokens:
+        return error_response(400, "INVALID_ARGUMENT", f"Cached content is too small. total_token_count={tokens}, min_total_token_count={config.cache_min_tokens} (fake).")
+
+    name = f"cachedContents/{uuid.uuid4().hex[:16]}"
+    cached_contents[name] = {
+        "model": body.get("model", ""),
+        "displayName": body.get("displayName", ""),
+        "tokens": tokens,
+        "createTime": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+        "expiresAt": expiry_fields(body),
+    }
+    return cache_resource(name, cached_contents[name])
+
+
+@app.get("/{version}/cachedContents/{cache_id}")
+def get_cached_content(version: str, cache_id: str):
+    name = f"cachedContents/{cache_id}"
+    cache = live_cache(name)
+    if cache is None:
+        return error_response(403, "PERMISSION_DENIED", "CachedContent not found (or permission denied) (fake).")
+    return cache_resource(name, cache)
+
+
+@app.patch("/{version}/cachedContents/{cache_id}")
+async def update_cached_content(version: str, cache_id: str, request: Request):
+    name = f"cachedContents/{cache_id}"
+    cache = live_cache(name)
+    if cache is None:
+        return error_response(403, "PERMISSION_DENIED", "CachedContent not found (or permission denied) (fake).")
+    cache["expiresAt"] = expiry_fields(await request.json())
+    return cache_resource(name, cache)
+
+
+@app.delete("/{version}/cachedContents/{cache_id}")
+def delete_cached_content(version: str, cache_id: str):
+    stats["cache_deletes"] += 1
+    cached_contents.pop(f"cachedContents/{cache_id}", None)
+    return {}
+
+
+@app.get("/stats")
+def get_stats():
+    return dict(stats)
+
+
+@app.post("/stats/reset")
+def reset_stats():
+    stats.clear()
+    return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=config.latency_ms, help="Median response latency")
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "lognormal"], default=config.latency_dist)
+    parser.add_argument("--latency-sigma", type=float, default=config.latency_sigma, help="Spread of the lognormal distribution")
+    parser.add_argument("--error-rate", type=float, default=config.error_rate, help="Fraction of requests answered with 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=config.rate_limit_rate, help="Fraction of requests answered with 429")
+    parser.add_argument("--stream-chunks", type=int, default=config.stream_chunks)
+    parser.add_argument("--chunk-delay-ms", type=float, default=config.chunk_delay_ms)
+    parser.add_argument("--cache-min-tokens", type=int, default=config.cache_min_tokens, help="Reject smaller cachedContents, like the real API")
+    args = parser.parse_args()
+
+    for name in ("latency_ms", "latency_dist", "latency_sigma", "error_rate", "rate_limit_rate", "stream_chunks", "chunk_delay_ms", "cache_min_tokens"):
+        setattr(config, name, getattr(args, name))
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+"""
+Load test the API against the local fake model server.
+
+Starts benchmarks.fake_gemini and the API (benchmarks.serve, which adds an
+event-loop lag probe) as subprocesses, with a throwaway MongoDB database, seeds
+some chats and drives a weighted mix of requests:
+
+    extract  POST /api/extractor/extract
+    send     POST /api/messages/send
+    stream   POST /api/messages/send/stream (also reports time to first token)
+    chats    GET /api/chats and GET /api/chats/{id}/messages
+
+With --rps requests arrive open-loop (Poisson) and latency is measured from the
+scheduled start, so a slow server can't hide its queueing. Without it,
+--concurrency workers send requests back to back. Reports throughput,
+p50/p95/p99 per operation and event-loop lag.
+
+MongoDB: --mongo-url uses an existing server with a fresh database that is
+dropped afterwards; otherwise a temporary mongod is started if one is on PATH.
+
+Usage (from the backend directory):
+    python -m benchmarks.load_test --duration 30 --rps 40 --mix extract=1,send=6,stream=1,chats=2
+    python -m benchmarks.load_test --concurrency 32 --latency-ms 800 --error-rate 0.02 --env EXTRACTION_MODE=combined
+    python -m benchmarks.load_test --save-baseline benchmarks/baselines/default.json
+    python -m benchmarks.load_test --compare benchmarks/baselines/default.json --tolerance 0.2
+
+--compare exits with status 1 when throughput drops or p95/p99 grow by more
+than the tolerance, or the error rate rises by more than one point.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import httpx
+from PIL import Image
+from pymongo import MongoClient
+
+OPERATIONS = ("extract", "send", "stream", "chats")
+# Label-field questions are answered by rules, the rest go to the (fake) model
+QUESTIONS = [
+    "What is the expiry date?",
+    "Where is this product made?",
+    "Does it contain milk?",
+    "Is this suitable for someone on a low-sugar diet?",
+    "How should I store it after opening?",
+    "Can you summarize the nutritional information?",
+    "Is it safe for children under three?",
+    "What does the E471 in the ingredients do?",
+]
+PRODUCT_INFORMATION = {
+    "Ingredients": ["Sugar", "Wheat flour", "Palm oil", "Skimmed milk powder", "Emulsifier (E471)", "Salt"],
+    "Product name": "Butter Cookies",
+    "Brand": "Loadtest",
+    "Net content": "200g",
+    "Manufacturing date": "2025-01-10",
+    "Expiry date": "2026-01-10",
+    "Country of origin": "Vietnam",
+    "Manufacturer": "Loadtest Foods",
+    "Usage instructions": "Ready to eat.",
+    "Storage instructions": "Store in a cool, dry place.",
+    "Nutritional info": "Energy 480kcal per 100g",
+}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))]
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in OPERATIONS:
+            raise SystemExit(f"Unknown operation {name!r}, expected one of: {', '.join(OPERATIONS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def make_image(seed: int) -> bytes:
+    # Noise, so every image has a different content and perceptual hash
+    rng = random.Random(seed)
+    image = Image.frombytes("RGB", (64, 48), bytes(rng.getrandbits(8) for _ in range(64 * 48 * 3)))
+    buffer = io.BytesIO()
+    image.resize((960, 720), Image.NEAREST).save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+@contextmanager
+def process(args: List[str], env: Dict[str, str], log_path: str):
+    with open(log_path, "wb") as log:
+        proc = subprocess.Popen(args, env=env, stdout=log, stderr=subprocess.STDOUT)
+        try:
+            yield proc
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+def wait_until_ready(url: str, proc: subprocess.Popen, log_path: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"{url} exited during startup, see {log_path}")
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"{url} did not become ready, see {log_path}")
+
+
+@contextmanager
+def throwaway_mongo(mongo_url: Optional[str], workdir: str):
+    # (url, database name); the database is dropped or the server removed afterwards
+    database = f"loadtest_{uuid.uuid4().hex[:8]}"
+    if mongo_url:
+        try:
+            yield mongo_url, database
+        finally:
+            with MongoClient(mongo_url, serverSelectionTimeoutMS=5000) as client:
+                client.drop_database(database)
+        return
+
+    mongod = shutil.which("mongod")
+    if mongod is None:
+        raise SystemExit("No MongoDB available: pass --mongo-url or put mongod on PATH")
+    port = free_port()
+    dbpath = os.path.join(workdir, "mongo")
+    os.makedirs(dbpath)
+    log_path = os.path.join(workdir, "mongod.log")
+    args = [mongod, "--dbpath", dbpath, "--port", str(port), "--bind_ip", "127.0.0.1", "--quiet"]
+    with process(args, dict(os.environ), log_path) as proc:
+        url = f"mongodb://127.0.0.1:{port}"
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                with MongoClient(url, serverSelectionTimeoutMS=1000) as client:
+                    client.admin.command("ping")
+                break
+            except Exception:
+                if proc.poll() is not None or time.monotonic() > deadline:
+                    raise SystemExit(f"mongod did not start, see {log_path}")
+                time.sleep(0.2)
+        yield url, database
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.first_token: List[float] = []
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.dropped = 0
+
+    def record(self, operation: str, started: float, status: int):
+        self.statuses[operation][status] += 1
+        if status >= 400:
+            self.errors[operation] += 1
+        else:
+            self.latencies[operation].append(time.perf_counter() - started)
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, chat_ids: List[str], images: List[bytes], unique_images: bool):
+        self.client = client
+        self.chat_ids = chat_ids
+        self.images = images
+        self.unique_images = unique_images
+        self.recorder = Recorder()
+
+    async def extract(self, started: float):
+        image = make_image(random.getrandbits(32)) if self.unique_images else random.choice(self.images)
+        response = await self.client.post("/api/extractor/extract", files={"file": ("image.jpg", image, "image/jpeg")})
+        self.recorder.record("extract", started, response.status_code)
+
+    async def send(self, started: float):
+        body = {"chat_id": random.choice(self.chat_ids), "content": random.choice(QUESTIONS)}
+        response = await self.client.post("/api/messages/send", json=body)
+        self.recorder.record("send", started, response.status_code)
+
+    async def stream(self, started: float):
+        body = {"chat_id": random.choice(self.chat_ids), "content": random.choice(QUESTIONS)}
+        status = 200
+        first_token = None
+        async with self.client.stream("POST", "/api/messages/send/stream", json=body) as response:
+            status = response.status_code
+            async for line in response.aiter_lines():
+                if line.startswith("event: token") and first_token is None:
+                    first_token = time.perf_counter() - started
+                elif line.startswith("event: error"):
+                    status = 500
+        if first_token is not None:
+            self.recorder.first_token.append(first_token)
+        self.recorder.record("stream", started, status)
+
+    async def chats(self, started: float):
+        if random.random() < 0.5:
+            response = await self.client.get("/api/chats")
+        else:
+            response = await self.client.get(f"/api/chats/{random.choice(self.chat_ids)}/messages")
+        self.recorder.record("chats", started, response.status_code)
+
+    async def run_one(self, operation: str, started: float):
+        try:
+            await getattr(self, operation)(started)
+        except httpx.HTTPError:
+            self.recorder.record(operation, started, 599)
+
+    async def open_loop(self, mix: Dict[str, float], rps: float, duration: float, max_in_flight: int):
+        operations, weights = list(mix), list(mix.values())
+        in_flight = set()
+        scheduled = time.perf_counter()
+        deadline = scheduled + duration
+        while True:
+            scheduled += random.expovariate(rps)
+            if scheduled >= deadline:
+                break
+            await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+            if len(in_flight) >= max_in_flight:
+                self.recorder.dropped += 1
+                continue
+            operation = random.choices(operations, weights)[0]
+            task = asyncio.create_task(self.run_one(operation, scheduled))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        if in_flight:
+            await asyncio.wait(in_flight)
+
+    async def closed_loop(self, mix: Dict[str, float], concurrency: int, duration: float):
+        operations, weights = list(mix), list(mix.values())
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                await self.run_one(random.choices(operations, weights)[0], time.perf_counter())
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+def summarize(recorder: Recorder, elapsed: float, loop_lag: Dict[str, Any], model_stats: Dict[str, Any]) -> Dict[str, Any]:
+    operations = {}
+    for operation in sorted(set(recorder.latencies) | set(recorder.errors)):
+        latencies = recorder.latencies[operation]
+        total = len(latencies) + recorder.errors[operation]
+        operations[operation] = {
+            "requests": total,
+            "errors": recorder.errors[operation],
+            "errorRate": recorder.errors[operation] / total if total else 0.0,
+            "rps": len(latencies) / elapsed,
+            "p50Ms": percentile(latencies, 50) * 1000,
+            "p95Ms": percentile(latencies, 95) * 1000,
+            "p99Ms": percentile(latencies, 99) * 1000,
+            "maxMs": max(latencies, default=0.0) * 1000,
+            "statuses": {str(code): count for code, count in sorted(recorder.statuses[operation].items())},
+        }
+    if recorder.first_token:
+        operations["stream"]["firstTokenP50Ms"] = percentile(recorder.first_token, 50) * 1000
+        operations["stream"]["firstTokenP95Ms"] = percentile(recorder.first_token, 95) * 1000
+    completed = sum(len(latencies) for latencies in recorder.latencies.values())
+    return {
+        "elapsed": elapsed,
+        "rps": completed / elapsed,
+        "dropped": recorder.dropped,
+        "operations": operations,
+        "loopLag": loop_lag,
+        "modelServer": model_stats,
+    }
+
+
+def print_report(summary: Dict[str, Any]):
+    print(f"\n{'operation':<10}{'requests':>10}{'errors':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, op in summary["operations"].items():
+        print(f"{name:<10}{op['requests']:>10}{op['errors']:>8}{op['rps']:>9.1f}{op['p50Ms']:>10.1f}{op['p95Ms']:>10.1f}{op['p99Ms']:>10.1f}{op['maxMs']:>10.1f}")
+    if "firstTokenP50Ms" in summary["operations"].get("stream", {}):
+        stream = summary["operations"]["stream"]
+        print(f"stream first token: p50 {stream['firstTokenP50Ms']:.1f} ms, p95 {stream['firstTokenP95Ms']:.1f} ms")
+    print(f"\ntotal: {summary['rps']:.1f} req/s over {summary['elapsed']:.1f}s, {summary['dropped']} dropped (client in-flight limit)")
+    lag = summary["loopLag"]
+    print(f"event-loop lag: p50 {lag.get('p50Ms', 0):.2f} ms, p99 {lag.get('p99Ms', 0):.2f} ms, max {lag.get('maxMs', 0):.2f} ms ({lag.get('samples', 0)} samples)")
+    print(f"model server: {json.dumps(summary['modelServer'])}")
+
+
+def compare(summary: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    regressions = []
+    if summary["rps"] < baseline["rps"] * (1 - tolerance):
+        regressions.append(f"total rps {summary['rps']:.1f} < baseline {baseline['rps']:.1f}")
+    for name, base in baseline["operations"].items():
+        current = summary["operations"].get(name)
+        if current is None:
+            continue
+        for key in ("p95Ms", "p99Ms"):
+            if current[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{name} {key} {current[key]:.1f} > baseline {base[key]:.1f}")
+        if current["errorRate"] > base["errorRate"] + 0.01:
+            regressions.append(f"{name} error rate {current['errorRate']:.3f} > baseline {base['errorRate']:.3f}")
+    base_lag, lag = baseline.get("loopLag", {}), summary["loopLag"]
+    if base_lag and lag.get("p99Ms", 0) > max(base_lag["p99Ms"] * (1 + tolerance), base_lag["p99Ms"] + 1):
+        regressions.append(f"loop lag p99 {lag['p99Ms']:.2f} ms > baseline {base_lag['p99Ms']:.2f} ms")
+    return regressions
+
+
+async def drive(args, api_url: str, fake_url: str) -> Dict[str, Any]:
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+    async with httpx.AsyncClient(base_url=api_url, timeout=args.timeout, limits=limits) as client:
+        chat_ids = []
+        for _ in range(args.chats):
+            response = await client.post("/api/chat", json={"productInformation": PRODUCT_INFORMATION})
+            response.raise_for_status()
+            chat_ids.append(response.json()["data"]["_id"])
+        images = [make_image(seed) for seed in range(args.images)]
+        test = LoadTest(client, chat_ids, images, args.unique_images)
+        mix = parse_mix(args.mix)
+
+        if args.warmup:
+            warmup = LoadTest(client, chat_ids, images, args.unique_images)
+            await warmup.closed_loop(mix, min(args.concurrency, 4), args.warmup)
+        await client.post("/__bench/loop-lag/reset")
+        await client.post(f"{fake_url}/stats/reset")
+
+        started = time.perf_counter()
+        if args.rps:
+            await test.open_loop(mix, args.rps, args.duration, args.max_in_flight)
+        else:
+            await test.closed_loop(mix, args.concurrency, args.duration)
+        elapsed = time.perf_counter() - started
+
+        loop_lag = (await client.get("/__bench/loop-lag")).json()
+        model_stats = (await client.get(f"{fake_url}/stats")).json()
+    return summarize(test.recorder, elapsed, loop_lag, model_stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of measured load")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Seconds of unmeasured load first")
+    parser.add_argument("--rps", type=float, default=0.0, help="Open-loop arrival rate; 0 runs closed-loop workers")
+    parser.add_argument("--concurrency", type=int, default=16, help="Closed-loop workers")
+    parser.add_argument("--max-in-flight", type=int, default=512, help="Open-loop requests beyond this are dropped")
+    parser.add_argument("--mix", default="extract=1,send=6,stream=1,chats=2", help="Operation weights")
+    parser.add_argument("--chats", type=int, default=20, help="Chats seeded before the run")
+    parser.add_argument("--images", type=int, default=20, help="Distinct images; repeats hit the extraction cache")
+    parser.add_argument("--unique-images", action="store_true", help="A new image for every extract request")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--mongo-url", default=None)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="Extra backend setting")
+    parser.add_argument("--latency-ms", type=float, default=500.0, help="Fake model median latency")
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--stream-chunks", type=int, default=8)
+    parser.add_argument("--chunk-delay-ms", type=float, default=50.0)
+    parser.add_argument("--json", dest="json_path", default=None, help="Write the summary here")
+    parser.add_argument("--save-baseline", default=None, help="Store the summary as a baseline")
+    parser.add_argument("--compare", default=None, help="Baseline to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative change against the baseline")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    api_port, fake_port = free_port(), free_port()
+    api_url, fake_url = f"http://127.0.0.1:{api_port}", f"http://127.0.0.1:{fake_port}"
+    fake_args = [
+        sys.executable, "-m", "benchmarks.fake_gemini", "--port", str(fake_port),
+        "--latency-ms", str(args.latency_ms), "--latency-dist", args.latency_dist,
+        "--error-rate", str(args.error_rate), "--rate-limit-rate", str(args.rate_limit_rate),
+        "--stream-chunks", str(args.stream_chunks), "--chunk-delay-ms", str(args.chunk_delay_ms),
+    ]
+
+    try:
+        with throwaway_mongo(args.mongo_url, workdir) as (mongo_url, database):
+            env = {
+                **os.environ,
+                "GEMINI_API_KEY": "fake",
+                "GEMINI_BASE_URL": fake_url,
+                "MONGODB_URL": mongo_url,
+                "DATABASE_NAME": database,
+                "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+            }
+            env.update(item.split("=", 1) for item in args.env)
+            fake_log, api_log = os.path.join(workdir, "fake_gemini.log"), os.path.join(workdir, "api.log")
+            with process(fake_args, env, fake_log) as fake, process(
+                [sys.executable, "-m", "benchmarks.serve", "--port", str(api_port)], env, api_log
+            ) as api:
+                wait_until_ready(f"{fake_url}/stats", fake, fake_log)
+                wait_until_ready(f"{api_url}/", api, api_log)
+                summary = asyncio.run(drive(args, api_url, fake_url))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    summary["config"] = {key: value for key, value in vars(args).items() if key not in ("json_path", "save_baseline", "compare")}
+    print_report(summary)
+
+    for path in (args.json_path, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "w") as f:
+                json.dump(summary, f, indent=2)
+            print(f"Wrote {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("config", {}).get("mix") != args.mix:
+            print("Warning: the baseline was recorded with a different --mix")
+        regressions = compare(summary, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions against the baseline:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print("\nNo regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Run the API with an event-loop lag probe, for load tests.
+
+The probe sleeps for a fixed interval in a loop and records how late it wakes
+up: time the loop spent on other work without yielding. GET /__bench/loop-lag
+returns percentiles of those delays; POST /__bench/loop-lag/reset clears them.
+
+    python -m benchmarks.serve --port 8100
+"""
+import argparse
+import asyncio
+from collections import deque
+
+import uvicorn
+
+from main import app
+
+
+class LoopLagProbe:
+    interval: float = 0.02  # seconds
+    samples: deque = deque(maxlen=100_000)
+    task: asyncio.Task = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - started - self.interval))
+
+
+probe = LoopLagProbe()
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))]
+
+
+async def start_probe():
+    probe.task = asyncio.create_task(probe.run())
+
+
+async def stop_probe():
+    if probe.task is not None:
+        probe.task.cancel()
+
+
+app.add_event_handler("startup", start_probe)
+app.add_event_handler("shutdown", stop_probe)
+
+
+@app.get("/__bench/loop-lag")
+def get_loop_lag():
+    samples = list(probe.samples)
+    return {
+        "samples": len(samples),
+        "intervalMs": probe.interval * 1000,
+        "p50Ms": percentile(samples, 50) * 1000,
+        "p99Ms": percentile(samples, 99) * 1000,
+        "maxMs": max(samples, default=0.0) * 1000,
+    }
+
+
+@app.post("/__bench/loop-lag/reset")
+def reset_loop_lag():
+    probe.samples.clear()
+    return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--probe-interval-ms", type=float, default=probe.interval * 1000)
+    args = parser.parse_args()
+    probe.interval = args.probe_interval_ms / 1000
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Measure import and startup time of the API.
+
+Each run starts fresh processes, so nothing is cached between runs except the
+OS page cache:
+
+    import     python -X importtime -c "import main": total, and self time per top-level package
+    live       process spawn until GET /health/live answers
+    ready      process spawn until GET /health/ready answers 200
+    first call the first POST /api/messages/send after ready, which pays for
+               lazy model client creation unless PREWARM_ENABLED is set
+
+The server runs under uvicorn against the local fake model server, with a
+throwaway MongoDB database (see benchmarks.load_test).
+
+Usage (from the backend directory):
+    python -m benchmarks.startup_time --runs 5
+    python -m benchmarks.startup_time --runs 5 --prewarm
+    python -m benchmarks.startup_time --save-baseline benchmarks/baselines/startup.json
+    python -m benchmarks.startup_time --compare benchmarks/baselines/startup.json --tolerance 0.2
+
+--compare exits with status 1 when the median import, ready or first-call time
+grows by more than the tolerance.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks.load_test import PRODUCT_INFORMATION, free_port, process, throwaway_mongo, wait_until_ready
+
+POLL_INTERVAL = 0.01  # seconds
+COMPARED_KEYS = ("importMs", "readyMs", "firstCallMs")
+
+
+def measure_import(env: Dict[str, str]) -> Dict[str, Any]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    # Lines look like "import time:  self [us] | cumulative | <indent>module"
+    packages: Counter = Counter()
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        packages[module.strip().split(".")[0]] += int(self_us)
+        if module.strip() == "main":
+            total = int(cumulative_us)
+    return {"importMs": total / 1000, "packagesMs": {name: us / 1000 for name, us in packages.most_common()}}
+
+
+def wait_for(url: str, proc: subprocess.Popen, started: float, timeout: float) -> float:
+    # Milliseconds since the process was spawned until the URL answered 200
+    while time.perf_counter() - started < timeout:
+        if proc.poll() is not None:
+            raise SystemExit(f"The API exited during startup (waiting for {url})")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return (time.perf_counter() - started) * 1000
+        except httpx.TransportError:
+            pass
+        time.sleep(POLL_INTERVAL)
+    raise SystemExit(f"{url} did not answer within {timeout}s")
+
+
+def measure_startup(env: Dict[str, str], log_path: str, timeout: float) -> Dict[str, float]:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    args = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"]
+    started = time.perf_counter()
+    with process(args, env, log_path) as proc:
+        live = wait_for(f"{url}/health/live", proc, started, timeout)
+        ready = wait_for(f"{url}/health/ready", proc, started, timeout)
+        with httpx.Client(base_url=url, timeout=timeout) as client:
+            chat_id = client.post("/api/chat", json={"productInformation": PRODUCT_INFORMATION}).json()["data"]["_id"]
+            call_started = time.perf_counter()
+            client.post("/api/messages/send", json={"chat_id": chat_id, "content": "What is this product?"}).raise_for_status()
+            first_call = (time.perf_counter() - call_started) * 1000
+    return {"liveMs": live, "readyMs": ready, "firstCallMs": first_call}
+
+
+def summarize(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    summary = {key: statistics.median(run[key] for run in runs) for key in ("importMs", "liveMs", "readyMs", "firstCallMs")}
+    packages = Counter()
+    for run in runs:
+        packages.update(run["packagesMs"])
+    summary["packagesMs"] = {name: total / len(runs) for name, total in packages.most_common(10)}
+    summary["runs"] = len(runs)
+    return summary
+
+
+def print_report(summary: Dict[str, Any]):
+    print(f"\nmedian of {summary['runs']} runs")
+    print(f"  import main   {summary['importMs']:>8.1f} ms")
+    print(f"  live          {summary['liveMs']:>8.1f} ms")
+    print(f"  ready         {summary['readyMs']:>8.1f} ms")
+    print(f"  first call    {summary['firstCallMs']:>8.1f} ms")
+    print("\nimport self time by package (mean):")
+    for name, ms in summary["packagesMs"].items():
+        print(f"  {name:<20}{ms:>8.1f} ms")
+
+
+def compare(summary: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    regressions = []
+    for key in COMPARED_KEYS:
+        # A few milliseconds of slack, so tiny baselines don't flag noise
+        if summary[key] > max(baseline[key] * (1 + tolerance), baseline[key] + 5):
+            regressions.append(f"{key} {summary[key]:.1f} > baseline {baseline[key]:.1f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--prewarm", action="store_true", help="Start the API with PREWARM_ENABLED=true")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for the API to become ready")
+    parser.add_argument("--mongo-url", default=None)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="Extra backend setting")
+    parser.add_argument("--json", dest="json_path", default=None, help="Write the summary here")
+    parser.add_argument("--save-baseline", default=None, help="Store the summary as a baseline")
+    parser.add_argument("--compare", default=None, help="Baseline to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative change against the baseline")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="startup-")
+    fake_port = free_port()
+    fake_url = f"http://127.0.0.1:{fake_port}"
+    fake_args = [sys.executable, "-m", "benchmarks.fake_gemini", "--port", str(fake_port), "--latency-ms", "50", "--latency-dist", "fixed"]
+
+    runs = []
+    try:
+        with throwaway_mongo(args.mongo_url, workdir) as (mongo_url, database):
+            env = {
+                **os.environ,
+                "GEMINI_API_KEY": "fake",
+                "GEMINI_BASE_URL": fake_url,
+                "MONGODB_URL": mongo_url,
+                "DATABASE_NAME": database,
+                "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+                "PREWARM_ENABLED": "true" if args.prewarm else "false",
+                # Rule and cache answers would skip the model call the first-call timing is about
+                "ANSWER_RULES_ENABLED": "false",
+                "ANSWER_CACHE_ENABLED": "false",
+            }
+            env.update(item.split("=", 1) for item in args.env)
+            fake_log = os.path.join(workdir, "fake_gemini.log")
+            with process(fake_args, env, fake_log) as fake:
+                wait_until_ready(f"{fake_url}/stats", fake, fake_log)
+                for run in range(args.runs):
+                    result = measure_import(env)
+                    result.update(measure_startup(env, os.path.join(workdir, f"api-{run}.log"), args.timeout))
+                    print(f"run {run + 1}: import {result['importMs']:.0f} ms, live {result['liveMs']:.0f} ms, "
+                          f"ready {result['readyMs']:.0f} ms, first call {result['firstCallMs']:.0f} ms")
+                    runs.append(result)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    summary = summarize(runs)
+    summary["config"] = {key: value for key, value in vars(args).items() if key not in ("json_path", "save_baseline", "compare")}
+    print_report(summary)
+
+    for path in (args.json_path, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "w") as f:
+                json.dump(summary, f, indent=2)
+            print(f"Wrote {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("config", {}).get("prewarm") != args.prewarm:
+            print("Warning: the baseline was recorded with a different --prewarm")
+        regressions = compare(summary, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions against the baseline:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print("\nNo regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
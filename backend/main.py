@@ -1,18 +1,30 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from app.routers import chat, extractor, messages
+from app.routers import chat, extractor, health, jobs, messages
 from app.core.config import settings
-from app.core.database import connect_to_mongo
+from app.core.database import connect_to_mongo, close_mongo_connection
+from app.core.health import start_prewarm, stop_prewarm
+from app.core.logs import configure_logging
+from app.core.metrics import metrics_response, record_request_metrics
+from app.core.model_client import close_gemini, close_openai
+from app.core.tracing import setup_tracing, shutdown_tracing, trace_requests
+from app.services.chats import ensure_chat_indexes
+from app.services.images import shutdown_image_pool
+from app.services.jobs import start_job_workers, stop_job_workers
+from app.services.messages import ensure_message_indexes
+from app.services.resilience import ModelUnavailableError
 import uvicorn
 import os
 
-app = FastAPI(title="Chatbot API")
+configure_logging()
 
-# Create uploads directory if it doesn't exist
-os.makedirs("static/uploads", exist_ok=True)
+app = FastAPI(title="Chatbot API")
 
-# Mount static files directory
+# Mount static files directory. It still serves photos uploaded before content-addressed storage;
+# new uploads live in UPLOAD_DIR and are only served by /api/extractor/uploads, with their cache headers
+os.makedirs("static", exist_ok=True)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # Configure CORS
@@ -24,18 +36,49 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Connect to MongoDB
+# Request metrics and tracing; the tracing middleware is added last so its span wraps the whole request
+if settings.METRICS_ENABLED:
+    app.middleware("http")(record_request_metrics)
+app.middleware("http")(trace_requests)
+
+# Connect to MongoDB; model clients are created on first use, or prewarmed in the background
+app.add_event_handler("startup", setup_tracing)
 app.add_event_handler("startup", connect_to_mongo)
+app.add_event_handler("startup", ensure_chat_indexes)
+app.add_event_handler("startup", ensure_message_indexes)
+app.add_event_handler("startup", start_prewarm)
+app.add_event_handler("startup", start_job_workers)
+app.add_event_handler("shutdown", stop_job_workers)
+app.add_event_handler("shutdown", stop_prewarm)
+app.add_event_handler("shutdown", close_gemini)
+app.add_event_handler("shutdown", close_openai)
+app.add_event_handler("shutdown", close_mongo_connection)
+app.add_event_handler("shutdown", shutdown_image_pool)
+app.add_event_handler("shutdown", shutdown_tracing)
+
+@app.exception_handler(ModelUnavailableError)
+async def model_unavailable_handler(request: Request, exc: ModelUnavailableError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))},
+    )
 
 # Include routers
+app.include_router(health.router, tags=["health"])
 app.include_router(chat.router, prefix="/api", tags=["chat"])
 app.include_router(extractor.router, prefix="/api", tags=["extractor"])
+app.include_router(jobs.router, prefix="/api", tags=["jobs"])
 app.include_router(messages.router, prefix="/api", tags=["messages"])
 
 @app.get("/")
 def root():
     return {"message": "Welcome to Chatbot API"}
 
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return metrics_response()
+
 if __name__ == "__main__":
-    print("\n🚀 Starting FastAPI server...")
     uvicorn.run("main:app", host="0.0.0.0", port=settings.PORT, reload=True)
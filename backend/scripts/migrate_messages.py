@@ -0,0 +1,92 @@
+"""
+Move chat messages from the embedded `messages` array into the `messages` collection.
+
+Each message becomes one document keyed by (chatId, seq), and the array is removed
+from the chat. Chats that already have messages in the collection, e.g. because
+they were used after the new API was deployed, keep those messages after the
+migrated ones. Run it with the API stopped. Chats that were fully migrated
+are skipped when the script is run again, and a chat interrupted halfway is
+picked up where it stopped: `migrationShiftedBelow` on the chat records which
+of the API's messages were already moved.
+
+Usage (from the backend directory):
+    python -m scripts.migrate_messages --dry-run
+    python -m scripts.migrate_messages --batch-size 500
+"""
+import argparse
+import asyncio
+
+from pymongo import DESCENDING, UpdateOne
+
+from app.core.database import close_mongo_connection, connect_to_mongo, get_database
+from app.services.messages import MESSAGE_COLLECTION, ensure_message_indexes
+
+
+async def migrate_chat(db, chat, batch_size: int) -> int:
+    chat_id = chat["_id"]
+    embedded = chat.get("messages") or []
+    messages = db[MESSAGE_COLLECTION]
+    count = len(embedded)
+
+    # Make room in front of messages written by the new API, highest first to respect the unique index.
+    # Messages at or above the marker were already moved by an interrupted run and must not move again
+    if count:
+        shifted_below = chat.get("migrationShiftedBelow", chat.get("messageCount", 0) + 1)
+        pending = await messages.find(
+            {"chatId": chat_id, "seq": {"$lt": shifted_below}}, {"_id": 1, "seq": 1}
+        ).sort("seq", DESCENDING).to_list()
+        for doc in pending:
+            await messages.update_one({"_id": doc["_id"]}, {"$inc": {"seq": count}})
+            await db.chats.update_one({"_id": chat_id}, {"$set": {"migrationShiftedBelow": doc["seq"]}})
+        # Done shifting: from here on nothing may move, even if the API's messages had gaps in seq
+        await db.chats.update_one({"_id": chat_id}, {"$set": {"migrationShiftedBelow": 1}})
+
+    for start in range(0, count, batch_size):
+        operations = [
+            UpdateOne(
+                {"chatId": chat_id, "seq": seq},
+                {"$setOnInsert": {**message, "chatId": chat_id, "seq": seq}},
+                upsert=True,
+            )
+            for seq, message in enumerate(embedded[start:start + batch_size], start=start + 1)
+        ]
+        await messages.bulk_write(operations, ordered=False)
+
+    await db.chats.update_one(
+        {"_id": chat_id},
+        {"$unset": {"messages": "", "migrationShiftedBelow": ""}, "$set": {"messageCount": count + chat.get("messageCount", 0)}},
+    )
+    return count
+
+
+async def migrate(batch_size: int, dry_run: bool):
+    await connect_to_mongo()
+    db = get_database()
+    await ensure_message_indexes()
+
+    chats = moved = 0
+    async for chat in db.chats.find({"messages": {"$exists": True}}, {"messages": 1, "messageCount": 1, "migrationShiftedBelow": 1}):
+        chats += 1
+        if dry_run:
+            moved += len(chat.get("messages") or [])
+            continue
+        moved += await migrate_chat(db, chat, batch_size)
+        if chats % 100 == 0:
+            print(f"   {chats} chats, {moved} messages migrated")
+
+    verb = "Would migrate" if dry_run else "Migrated"
+    print(f"✅ {verb} {moved} messages from {chats} chats")
+    await close_mongo_connection()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=1000, help="Messages written per bulk operation")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be migrated")
+    args = parser.parse_args()
+
+    asyncio.run(migrate(args.batch_size, args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import pytest
+
+from app.services.rules import answer_question, match_intent
+
+
+@pytest.mark.parametrize("question, intent", [
+    # Net content of the product as a whole
+    ("What is the net weight?", "net_content"),
+    ("net content?", "net_content"),
+    ("How much does it weigh?", "net_content"),
+    ("How heavy is this package?", "net_content"),
+    ("How many grams is this?", "net_content"),
+    ("How many ml in the bottle?", "net_content"),
+    ("What's the weight of the product?", "net_content"),
+    ("What is its volume?", "net_content"),
+    ("What is the weight?", "net_content"),
+    ("Khối lượng tịnh là bao nhiêu?", "net_content"),
+    ("khoi luong bao nhieu", "net_content"),
+    ("Dung tích của chai là bao nhiêu?", "net_content"),
+    ("Gói này nặng bao nhiêu gram?", "net_content"),
+    ("Sản phẩm này nặng bao nhiêu?", "net_content"),
+    # Nutrition questions are for the model, not the net content field
+    ("How many grams of sugar does it have?", None),
+    ("How many grams of protein?", None),
+    ("How much salt is in this?", None),
+    ("What is the weight of one serving?", None),
+    ("bao nhiêu gram đường", None),
+    ("Khối lượng đường là bao nhiêu?", None),
+    ("Mỗi khẩu phần có bao nhiêu gram chất béo?", None),
+    ("Hàm lượng muối bao nhiêu?", None),
+    # Other fields
+    ("When does it expire?", "expiry_date"),
+    ("Hạn sử dụng đến khi nào?", "expiry_date"),
+    ("hsd", "expiry_date"),
+    ("What is the manufacturing date?", "manufacturing_date"),
+    ("Ngày sản xuất là ngày nào?", "manufacturing_date"),
+    ("Where is it made?", "country_of_origin"),
+    ("Xuất xứ ở đâu?", "country_of_origin"),
+    ("Who is the manufacturer?", "manufacturer"),
+    ("Nhà sản xuất là ai?", "manufacturer"),
+    ("Does it contain peanuts?", "contains"),
+    ("Có chứa sữa không?", "contains"),
+    # Reasoning and mixed questions
+    ("Is it safe for kids?", None),
+    ("Tại sao hạn sử dụng ngắn vậy?", None),
+    ("What are the expiry date and the net weight?", None),
+])
+def test_match_intent(question, intent):
+    match = match_intent(question)
+    assert (match[0] if match else None) == intent
+
+
+@pytest.mark.parametrize("question, language", [
+    ("What is the net weight?", "en"),
+    ("Khối lượng tịnh là bao nhiêu?", "vi"),
+    ("khoi luong tinh", "vi"),
+])
+def test_match_intent_language(question, language):
+    assert match_intent(question)[1] == language
+
+
+@pytest.mark.parametrize("ingredients, question, answer", [
+    (["Sugar", "Peanuts"], "Does it contain peanuts?", "Yes, the ingredient list includes **Peanuts**."),
+    (["Sugar", "Almonds"], "Does it contain tree nuts?", "Yes, the ingredient list includes **Almonds**."),
+    (["Sugar", "Peanuts"], "Does it contain tree nuts?", "No, none of the listed ingredients contain **tree nuts**."),
+    # "Nuts" may mean peanuts or tree nuts: a "no" for tree nuts would be wrong for a peanut product
+    (["Sugar", "Peanuts"], "Does it contain nuts?", None),
+    (["Sugar", "Almonds"], "Does it contain nuts?", None),
+    (["Đường", "Đậu phộng"], "Có chứa các loại hạt không?", None),
+])
+def test_answer_contains(ingredients, question, answer):
+    answered = answer_question({"ingredients": ingredients}, question)
+    assert (answered[0] if answered else None) == answer
+
+
+PRODUCT = {
+    "Brand": "ABC",
+    "Manufacturer": "XYZ Foods",
+    "Storage instructions": "Store in a cool, dry place.",
+    "Usage instructions": "Dissolve one sachet in 200 ml of water.",
+    "Expiry date": "01/12/2026",
+    "Net content": "500 g",
+    "Ingredients": ["Wheat flour", "Sugar"],
+}
+
+
+@pytest.mark.parametrize("question, answer", [
+    ("What is the brand?", "The brand is **ABC**."),
+    ("Which brand is this?", "The brand is **ABC**."),
+    ("Thương hiệu là gì?", "Thương hiệu: **ABC**."),
+    ("Who makes it?", "The manufacturer is **XYZ Foods**."),
+    ("Nhà sản xuất là ai?", "Nhà sản xuất: **XYZ Foods**."),
+    ("How should I store it?", "Storage instructions: Store in a cool, dry place."),
+    ("Bảo quản như thế nào?", "Hướng dẫn bảo quản: Store in a cool, dry place."),
+    ("How do I use this product?", "Usage instructions: Dissolve one sachet in 200 ml of water."),
+    ("Can you tell me the expiry date?", "The expiry date is **01/12/2026**."),
+    ("Net weight?", "The net content is **500 g**."),
+    # The field is mentioned, but the question is about something else
+    ("Is this brand vegan?", None),
+    ("What is the brand of flour used?", None),
+    ("Is it stored in the fridge?", None),
+    ("Can you translate the storage instructions?", None),
+    ("Who makes the packaging?", None),
+    ("How many grams of sugar does it have?", None),
+    ("Sản phẩm có bảo quản lạnh không?", None),
+    ("Hạn sử dụng còn bao lâu?", None),
+    # The field is not on the label
+    ("Where is it made?", None),
+])
+def test_answer_question(question, answer):
+    answered = answer_question(PRODUCT, question)
+    assert (answered[0] if answered else None) == answer
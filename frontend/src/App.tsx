@@ -36,6 +36,7 @@ function App() {
   const [isSidebarOpen, setIsSidebarOpen] = useState(true)
   const [resetKey, setResetKey] = useState(0)
   const [chatList, setChatList] = useState<Chat[]>([])
+  const [nextChatCursor, setNextChatCursor] = useState<string | null>(null)
   const [selectedChat, setSelectedChat] = useState<Chat | null>(null)
 
   // Fetch chat list when component mounts
@@ -48,7 +49,22 @@ function App() {
       const response = await fetch('http://localhost:8000/api/chats')
       const data = await response.json()
       if (data.status === 'success') {
-        setChatList(data.data)
+        setChatList(data.data.chats)
+        setNextChatCursor(data.data.nextCursor)
+      }
+    } catch (error) {
+      console.error('Error fetching chats:', error)
+    }
+  }
+
+  const loadMoreChats = async () => {
+    if (!nextChatCursor) return
+    try {
+      const response = await fetch(`http://localhost:8000/api/chats?before=${encodeURIComponent(nextChatCursor)}`)
+      const data = await response.json()
+      if (data.status === 'success') {
+        setChatList(prev => [...prev, ...data.data.chats])
+        setNextChatCursor(data.data.nextCursor)
       }
     } catch (error) {
       console.error('Error fetching chats:', error)
@@ -64,8 +80,16 @@ function App() {
     setSelectedChat(null)
   }
 
-  const handleSelectChat = (chat: Chat) => {
-    setSelectedChat(chat)
+  const handleSelectChat = async (chat: Chat) => {
+    // The chat list only has summaries; load the latest messages for the selected chat
+    try {
+      const response = await fetch(`http://localhost:8000/api/chats/${chat._id}`)
+      const data = await response.json()
+      setSelectedChat(data.status === 'success' ? data.data : { ...chat, messages: [] })
+    } catch (error) {
+      console.error('Error fetching chat:', error)
+      setSelectedChat({ ...chat, messages: [] })
+    }
     setResetKey(prev => prev + 1)
   }
 
@@ -116,6 +140,20 @@ function App() {
     }
   };
 
+  const handleChatNamed = (chatId: string, name: string) => {
+    // New chats may not be in the list yet; reload it in that case
+    if (!chatList.some(chat => chat._id === chatId)) {
+      fetchChats();
+      return;
+    }
+    setChatList(prev => prev.map(chat =>
+      chat._id === chatId ? { ...chat, name } : chat
+    ));
+    if (selectedChat?._id === chatId) {
+      setSelectedChat(prev => prev ? { ...prev, name } : null);
+    }
+  };
+
   const handleDeleteChat = async (chatId: string) => {
     try {
       // Call API to delete chat
@@ -165,7 +203,7 @@ function App() {
         if (chat._id === selectedChat._id) {
           return {
             ...chat,
-            messages: [...chat.messages, userMessage]
+            messages: [...(chat.messages || []), userMessage]
           };
         }
         return chat;
@@ -201,7 +239,7 @@ function App() {
         return prevChats.map(chat => {
           if (chat._id === selectedChat._id) {
             // Remove the temporary user message and add both messages
-            const messages = chat.messages.filter(m => m.id !== userMessage.id);
+            const messages = (chat.messages || []).filter(m => m.id !== userMessage.id);
             return {
               ...chat,
               messages: [...messages, userMessage, botMessage]
@@ -229,7 +267,7 @@ function App() {
           if (chat._id === selectedChat._id) {
             return {
               ...chat,
-              messages: chat.messages.filter(m => m.id !== userMessage.id)
+              messages: (chat.messages || []).filter(m => m.id !== userMessage.id)
             };
           }
           return chat;
@@ -270,7 +308,7 @@ function App() {
         return prevChats.map(chat => {
           if (chat._id === chatId) {
             // Find the index of the message to replace
-            const messageIndex = chat.messages.findIndex(m => m.id === messageId);
+            const messageIndex = (chat.messages || []).findIndex(m => m.id === messageId);
             if (messageIndex !== -1) {
               const newMessages = [...chat.messages];
               newMessages[messageIndex] = newBotMessage;
@@ -311,12 +349,14 @@ function App() {
           onSelectChat={handleSelectChat}
           onRenameChat={handleRenameChat}
           onDeleteChat={handleDeleteChat}
+          onLoadMoreChats={nextChatCursor ? loadMoreChats : undefined}
         />
         <MainContent 
           key={resetKey} 
           selectedChat={selectedChat}
           onSendMessage={handleSendMessage}
           onResendMessage={handleResendMessage}
+          onChatNamed={handleChatNamed}
         />
       </Box>
     </ThemeProvider>
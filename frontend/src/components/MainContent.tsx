@@ -27,9 +27,10 @@ interface MainContentProps {
   selectedChat: Chat | null;
   onSendMessage?: (content: string) => Promise<void>;
   onResendMessage?: (messageId: string, chatId: string, content: string) => Promise<void>;
+  onChatNamed?: (chatId: string, name: string) => void;
 }
 
-const MainContent = ({ selectedChat, onSendMessage, onResendMessage }: MainContentProps) => {
+const MainContent = ({ selectedChat, onSendMessage, onResendMessage, onChatNamed }: MainContentProps) => {
   const [step, setStep] = useState(1); // 1: Intro, 2: Upload, 3: Loading, 4: Review, 5: Chatbot
   const [language, setLanguage] = useState('English');
   const [image, setImage] = useState<string | null>(null);
@@ -37,7 +38,6 @@ const MainContent = ({ selectedChat, onSendMessage, onResendMessage }: MainConte
   const [loadingStep, setLoadingStep] = useState<1 | 2 | 3>(1);
   const [showProductDetails, setShowProductDetails] = useState(false);
   const [chatId, setChatId] = useState<string | null>(null);
-  const [isFirstMessage, setIsFirstMessage] = useState(true);
   const [messages, setMessages] = useState<Message[]>([]);
   const [message, setMessage] = useState('');
   const [isLoading, setIsLoading] = useState(false);
@@ -51,7 +51,6 @@ const MainContent = ({ selectedChat, onSendMessage, onResendMessage }: MainConte
       setChatId(selectedChat._id);
       setMessages(selectedChat.messages || []);
       setExtractedData(selectedChat.productInformation);
-      setIsFirstMessage(false);
       setHasSentMessage(selectedChat.messages && selectedChat.messages.length > 0);
       // Set step to 5 last to avoid flashing step 1
       requestAnimationFrame(() => {
@@ -63,7 +62,6 @@ const MainContent = ({ selectedChat, onSendMessage, onResendMessage }: MainConte
       setChatId(null);
       setMessages([]);
       setExtractedData(null);
-      setIsFirstMessage(true);
       setHasSentMessage(false);
     }
   }, [selectedChat]);
@@ -150,32 +148,6 @@ const MainContent = ({ selectedChat, onSendMessage, onResendMessage }: MainConte
     }
   }, [step, image]);
 
-  // Function to generate and update chat title
-  const generateChatTitle = async (chatId: string) => {
-    try {
-      // Call API to generate title
-      const titleResponse = await fetch(`http://localhost:8000/api/chats/${chatId}/get-name`);
-      const titleData = await titleResponse.json();
-      
-      if (titleData.status === 'success' && titleData.data && titleData.data.chatName) {
-        // Update chat title using new rename endpoint
-        await fetch(`http://localhost:8000/api/chats/${chatId}/rename`, {
-          method: 'PATCH',
-          headers: {
-            'Content-Type': 'application/json'
-          },
-          body: JSON.stringify({
-            name: titleData.data.chatName
-          })
-        });
-      }
-    } catch (error) {
-      console.error('Error generating chat title:', error);
-      // Silently fail - don't affect user experience
-    }
-  };
-
-  // Update handleSend to include title generation for first message
   const handleSend = async () => {
     if (message.trim() !== '' && chatId) {
       setHasSentMessage(true);
@@ -189,8 +161,8 @@ const MainContent = ({ selectedChat, onSendMessage, onResendMessage }: MainConte
       setIsLoading(true);
       
       try {
-        // Call chat API to send message
-        const response = await fetch('http://localhost:8000/api/messages/send', {
+        // Call chat API to stream the bot response
+        const response = await fetch('http://localhost:8000/api/messages/send/stream', {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json'
@@ -201,24 +173,52 @@ const MainContent = ({ selectedChat, onSendMessage, onResendMessage }: MainConte
           })
         });
 
-        const data = await response.json();
-        
-        if (data.status === 'success') {
-          const botMessage: Message = {
-            id: (Date.now() + 1).toString(),
-            text: data.data.content,
-            sender: 'bot'
-          };
-          setMessages(prev => [...prev, botMessage]);
+        if (!response.ok || !response.body) {
+          throw new Error('Failed to get response from chat API');
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let botText = '';
+        let started = false;
 
-          // Generate title for first message
-          if (isFirstMessage) {
-            setIsFirstMessage(false);
-            // Generate title asynchronously without waiting
-            generateChatTitle(chatId).catch(console.error);
+        // Parse Server-Sent Events: blocks separated by a blank line
+        while (true) {
+          const { done, value } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+
+          let boundary = buffer.indexOf('\n\n');
+          while (boundary !== -1) {
+            const block = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            boundary = buffer.indexOf('\n\n');
+
+            const event = block.match(/^event: (.*)$/m)?.[1];
+            const data = block.match(/^data: (.*)$/m)?.[1];
+            if (!event || !data) continue;
+            const payload = JSON.parse(data);
+
+            if (event === 'error') {
+              throw new Error(payload.detail || 'Failed to get response from chat API');
+            }
+            // The backend names the chat after the first exchange and sends the name after 'done'
+            if (event === 'name') {
+              onChatNamed?.(chatId, payload.chatName);
+              continue;
+            }
+            botText = event === 'done' ? payload.content : botText + payload.content;
+
+            if (!started) {
+              started = true;
+              setIsLoading(false);
+              setMessages(prev => [...prev, { text: botText, sender: 'bot' }]);
+            } else {
+              const text = botText;
+              setMessages(prev => [...prev.slice(0, -1), { ...prev[prev.length - 1], text }]);
+            }
           }
-        } else {
-          throw new Error('Failed to get response from chat API');
         }
       } catch (error) {
         console.error('Error getting response:', error);
@@ -278,7 +278,8 @@ const MainContent = ({ selectedChat, onSendMessage, onResendMessage }: MainConte
       
           const updatedData = {
             ...extractedData,
-            image: imageData.data,
+            // The resized preview is enough for the chat; fall back to the original when there is none
+            image: imageData.renditions?.preview || imageData.data,
           };
 
           // API 2: Create chat with updated information
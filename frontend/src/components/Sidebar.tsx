@@ -30,9 +30,10 @@ interface SidebarProps {
   onSelectChat: (chat: Chat) => void;
   onRenameChat: (chatId: string, newName: string) => Promise<void>;
   onDeleteChat: (chatId: string) => Promise<void>;
+  onLoadMoreChats?: () => Promise<void>;
 }
 
-const Sidebar = ({ isOpen, onToggle, onNewChat, chatList, onSelectChat, onRenameChat, onDeleteChat }: SidebarProps) => {
+const Sidebar = ({ isOpen, onToggle, onNewChat, chatList, onSelectChat, onRenameChat, onDeleteChat, onLoadMoreChats }: SidebarProps) => {
   const [anchorEl, setAnchorEl] = useState<null | HTMLElement>(null);
   const [selectedChatId, setSelectedChatId] = useState<string | null>(null);
   const [isRenaming, setIsRenaming] = useState(false);
@@ -300,6 +301,16 @@ const Sidebar = ({ isOpen, onToggle, onNewChat, chatList, onSelectChat, onRename
               </ListItemButton>
             </ListItem>
           ))}
+          {onLoadMoreChats && isOpen && (
+            <ListItem disablePadding>
+              <ListItemButton onClick={onLoadMoreChats} sx={{ pt: "0" }}>
+                <ListItemText
+                  primary="Load more"
+                  sx={{ '& .MuiTypography-root': { fontSize: '14px', color: 'text.secondary' } }}
+                />
+              </ListItemButton>
+            </ListItem>
+          )}
         </List>
       </Box>
 